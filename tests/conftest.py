@@ -0,0 +1,9 @@
+# conftest.py
+# tests run against the source tree; the support_tools modules also import each other as top-level 'support_tools'
+import os
+import sys
+
+REALPATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+for p in [REALPATH, os.path.join(REALPATH,'wsuconnect')]:
+    if not p in sys.path:
+        sys.path.insert(0,p)
@@ -0,0 +1,108 @@
+# test_catalog.py
+import os
+import pytest
+
+from wsuconnect.support_tools import catalog
+
+
+def _touch(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path,'w') as f:
+        f.write('x')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / 'rawdata')
+    for f in ['sub-01/ses-01/anat/sub-01_ses-01_T1w.nii.gz',
+              'sub-01/ses-01/anat/sub-01_ses-01_T1w.json',
+              'sub-02/ses-01/func/sub-02_ses-01_task-rest_bold.nii.gz',
+              'participants.tsv']:
+        _touch(os.path.join(root,f))
+    return root
+
+
+# ******************* scan_tree ********************
+def test_scan_tree_lists_every_file(tree):
+    files, checkpoint, nRescanned = catalog.scan_tree(tree)
+    assert len(files) == 4
+    assert nRescanned == len(checkpoint) == 7
+
+
+def test_scan_tree_reuses_unchanged_directories(tree):
+    files, checkpoint, _ = catalog.scan_tree(tree)
+    files2, checkpoint2, nRescanned = catalog.scan_tree(tree, checkpoint)
+    assert sorted(files2) == sorted(files)
+    assert checkpoint2 == checkpoint
+    assert nRescanned == 0
+
+
+def test_scan_tree_relists_modified_directory(tree):
+    _, checkpoint, _ = catalog.scan_tree(tree)
+    newFile = os.path.join(tree,'sub-01','ses-01','anat','sub-01_ses-01_run-2_T1w.nii.gz')
+    _touch(newFile)
+    files, _, nRescanned = catalog.scan_tree(tree, checkpoint)
+    assert newFile in files
+    assert nRescanned == 1
+
+
+def test_scan_tree_survives_checkpoint_roundtrip(tree, tmp_path):
+    _, checkpoint, _ = catalog.scan_tree(tree)
+    checkpointFile = str(tmp_path / 'logs' / 'checkpoint.json')
+    catalog.save_checkpoint(checkpointFile, checkpoint)
+    assert catalog.load_checkpoint(checkpointFile) == checkpoint
+    assert catalog.load_checkpoint(str(tmp_path / 'missing.json')) == {}
+
+
+def test_scan_tree_drops_removed_directory(tree):
+    import shutil
+    _, checkpoint, _ = catalog.scan_tree(tree)
+    shutil.rmtree(os.path.join(tree,'sub-02'))
+    files, checkpoint2, _ = catalog.scan_tree(tree, checkpoint)
+    assert not any('sub-02' in f for f in files)
+    assert not any('sub-02' in d for d in checkpoint2)
+
+
+def _fail_listing(monkeypatch, failDir: str):
+    scandir = os.scandir
+    def fake_scandir(path='.'):
+        if os.path.realpath(path) == os.path.realpath(failDir):
+            raise PermissionError(13, 'Permission denied', path)
+        return scandir(path)
+    monkeypatch.setattr(os, 'scandir', fake_scandir)
+
+
+def test_scan_tree_keeps_checkpoint_of_unlistable_directory(tree, monkeypatch):
+    files, checkpoint, _ = catalog.scan_tree(tree)
+    subDir = os.path.join(tree,'sub-01','ses-01','anat')
+    _touch(os.path.join(subDir,'new.nii.gz'))
+    _fail_listing(monkeypatch, subDir)
+
+    files2, checkpoint2, _ = catalog.scan_tree(tree, checkpoint)
+    assert sorted(files2) == sorted(files)
+    assert checkpoint2[subDir] == checkpoint[subDir]
+
+
+def test_scan_tree_raises_without_checkpoint(tree, monkeypatch):
+    _fail_listing(monkeypatch, os.path.join(tree,'sub-02'))
+    with pytest.raises(OSError):
+        catalog.scan_tree(tree)
+
+
+# ******************* walk_tree ********************
+def test_walk_tree_matches_scan_tree(tree):
+    files, _, _ = catalog.scan_tree(tree)
+    assert sorted(catalog.walk_tree([tree, os.path.join(tree,'participants.tsv')], max_workers=4)) == sorted(files)
+
+
+def test_walk_tree_fails_when_a_directory_cannot_be_listed(tree, monkeypatch):
+    _fail_listing(monkeypatch, os.path.join(tree,'sub-02'))
+    with pytest.raises(OSError):
+        list(catalog.walk_tree(tree))
+
+
+def test_walk_tree_lenient_skips_unlistable_directory(tree, monkeypatch, capsys):
+    _fail_listing(monkeypatch, os.path.join(tree,'sub-02'))
+    files = list(catalog.walk_tree(tree, strict=False))
+    assert len(files) == 3
+    assert 'cannot list' in capsys.readouterr().out
@@ -0,0 +1,126 @@
+# test_get_scan_id.py
+# the compiled ScanIdRules matcher must pick the same image type as the original linear search of scan_id.json
+import json
+import random
+import importlib
+
+import pytest
+
+get_scan_id = importlib.import_module('wsuconnect.support_tools.get_scan_id')
+
+
+def linear_match(scanId: dict, jsonHeader: dict, dims: list):
+    """
+    The image type search of get_scan_id before ScanIdRules.
+    """
+    for imageType in scanId.keys():
+        stopFlag = True
+        if not isinstance(scanId[imageType],dict):
+            continue
+        if not 'json_header' in scanId[imageType].keys():
+            continue
+
+        for headerKey in scanId[imageType]['json_header'].keys():
+            tmp_stopFlag = False
+            if 'Not' in headerKey:
+                if headerKey.replace('Not','') in jsonHeader.keys():
+                    if all([k not in str(jsonHeader[headerKey.replace('Not','')]) for k in scanId[imageType]['json_header'][headerKey]]):
+                        tmp_stopFlag = True
+            else:
+                if headerKey in jsonHeader.keys():
+                    if type(scanId[imageType]['json_header'][headerKey]) is int:
+                        if jsonHeader[headerKey] == scanId[imageType]['json_header'][headerKey] and dims == scanId[imageType]['dims']:
+                            tmp_stopFlag = True
+                    elif type(scanId[imageType]['json_header'][headerKey]) is list:
+                        if all([k in str(jsonHeader[headerKey]) for k in scanId[imageType]['json_header'][headerKey]]) and dims == scanId[imageType]['dims']:
+                            tmp_stopFlag = True
+                    elif type(scanId[imageType]['json_header'][headerKey]) is str:
+                        if scanId[imageType]['json_header'][headerKey] in str(jsonHeader[headerKey]) and dims == scanId[imageType]['dims']:
+                            tmp_stopFlag = True
+
+            if not tmp_stopFlag and stopFlag:
+                stopFlag = False
+                continue
+
+        if stopFlag:
+            return imageType
+    return None
+
+
+DESCRIPTIONS = ['T1_MPRAGE', 'T1_MPRAGE_ND', 'rest_bold', 'task_nback_bold', 'B0_map', 'DTI_64dir', 'FLAIR', 'ASL_pcasl', 'SWI']
+IMAGE_TYPES = [['ORIGINAL', 'PRIMARY', 'M', 'ND'], ['ORIGINAL', 'PRIMARY', 'M', 'NORM'], ['DERIVED', 'PRIMARY', 'MIP'], ['ORIGINAL', 'PRIMARY', 'P']]
+DIMS = [[256, 256, 176, 1], [64, 64, 36, 200], [96, 96, 60, 65], [80, 80, 40, 2]]
+
+
+def _random_rule(rng: random.Random) -> dict:
+    d_header = {}
+    for _ in range(rng.randint(1, 3)):
+        kind = rng.choice(['str', 'list', 'int', 'not_list', 'not_str'])
+        if kind == 'str':
+            d_header[rng.choice(['SeriesDescription', 'ProtocolName'])] = rng.choice(['T1', 'bold', 'rest', 'B0', 'DTI', 'MPRAGE', 'nback'])
+        elif kind == 'list':
+            d_header['ImageType'] = rng.sample(['ORIGINAL', 'PRIMARY', 'M', 'ND', 'NORM', 'DERIVED'], rng.randint(1, 3))
+        elif kind == 'int':
+            d_header['EchoNumber'] = rng.randint(1, 2)
+        elif kind == 'not_list':
+            d_header['NotImageType'] = rng.sample(['ND', 'NORM', 'DERIVED', 'P'], rng.randint(1, 2))
+        else:
+            d_header['NotSeriesDescription'] = rng.choice(['ND', 'MIP', 'nback'])
+    return {'json_header': d_header, 'dims': rng.choice(DIMS), 'BidsDir': 'anat', 'bids_labels': {'suffix': 'T1w'}}
+
+
+def _random_sidecar(rng: random.Random) -> dict:
+    description = rng.choice(DESCRIPTIONS)
+    d_sidecar = {'SeriesDescription': description, 'ProtocolName': description.lower() if rng.random() < 0.3 else description,
+                 'ImageType': rng.choice(IMAGE_TYPES), 'EchoNumber': rng.randint(1, 2)}
+    for key in rng.sample(list(d_sidecar), rng.randint(0, 1)):
+        del d_sidecar[key]
+    return d_sidecar
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_rules_match_linear_search(seed):
+    rng = random.Random(seed)
+    scanId = {f"type{i}": _random_rule(rng) for i in range(rng.randint(5, 25))}
+    if seed % 2:
+        scanId['catch_all'] = {'json_header': {}}
+    scanId['comment'] = 'entries that are not rules are ignored'
+    scanId['no_header'] = {'BidsDir': 'anat'}
+    rules = get_scan_id.ScanIdRules(scanId)
+
+    for _ in range(200):
+        jsonHeader = _random_sidecar(rng)
+        dims = rng.choice(DIMS)
+        imageType, explanation = rules.match(jsonHeader, dims)
+        assert imageType == linear_match(scanId, jsonHeader, dims), explanation
+
+
+def test_rules_explain_decisions():
+    scanId = {'T1w': {'json_header': {'SeriesDescription': 'MPRAGE', 'NotImageType': ['ND']}, 'dims': [256, 256, 176, 1]},
+              'bold': {'json_header': {'SeriesDescription': 'bold', 'ImageType': ['ORIGINAL', 'M']}, 'dims': [64, 64, 36, 200]},
+              'any': {'json_header': {'NotSeriesDescription': ['SWI', 'MIP']}}}
+    rules = get_scan_id.ScanIdRules(scanId)
+
+    imageType, explanation = rules.match({'SeriesDescription': 'T1_MPRAGE', 'ImageType': ['ORIGINAL', 'PRIMARY', 'M']}, [256, 256, 176, 1])
+    assert imageType == 'T1w'
+    assert explanation.startswith("matched 'T1w': dims [256, 256, 176, 1]")
+
+    imageType, explanation = rules.match({'SeriesDescription': 'T1_MPRAGE', 'ImageType': ['ORIGINAL', 'PRIMARY', 'M', 'ND']}, [256, 256, 176, 1])
+    assert imageType == 'any'
+
+    imageType, explanation = rules.match({'SeriesDescription': 'SWI_MIP'}, [64, 64, 36, 200])
+    assert imageType is None
+    assert "'bold' SeriesDescription does not contain ['bold']" in explanation
+    assert "'any' SeriesDescription contains excluded ['SWI', 'MIP']" in explanation
+
+
+def test_load_scan_id_rules_recompiles_changed_file(tmp_path):
+    scanIdFile = tmp_path / 'PROJ_scan_id.json'
+    scanIdFile.write_text(json.dumps({'a': {'json_header': {}}}))
+    rules = get_scan_id.load_scan_id_rules(str(scanIdFile))
+    assert get_scan_id.load_scan_id_rules(str(scanIdFile)) is rules
+
+    scanIdFile.write_text(json.dumps({'a': {'json_header': {}}, 'b': {'json_header': {}}}))
+    rules2 = get_scan_id.load_scan_id_rules(str(scanIdFile))
+    assert rules2 is not rules
+    assert [r[1] for r in rules2.rules] == ['a', 'b']
@@ -0,0 +1,87 @@
+# test_mysql.py
+# the query builder's LIKE/equality rewrites must select exactly what MySQL REGEXP would, checked on a local catalog snapshot
+import re
+
+import pytest
+
+from wsuconnect.support_tools import catalog
+from wsuconnect.support_tools.mysql import _mysql
+
+
+PATHS = ['/resshare/projects/PROJ/rawdata/sub-1001/ses-1/anat/sub-1001_ses-1_T1w.nii.gz',
+         '/resshare/projects/PROJ/rawdata/sub-1001/ses-1/anat/sub-1001_ses-1_T1w.json',
+         '/resshare/projects/PROJ/rawdata/sub-1001/ses-1/func/sub-1001_ses-1_task-rest_bold.nii.gz',
+         '/resshare/projects/PROJ/rawdata/sub-1002/ses-2/dwi/sub-1002_ses-2_dwi.bval',
+         '/resshare/projects/PROJ/sourcedata/sub-1001/ses-1/acq-01_123456_T1_MPRAGE/IM_0001.dcm',
+         '/resshare/projects/PROJ/sourcedata/sub-1001/ses-1/acq-02_123500_rest/IM_0001.dcm',
+         '/resshare/projects/PROJ/sourcedata/sub-1001/ses-1/acq-03_124000_B0 map/IM_0001.dcm',
+         '/resshare/projects/PROJ/derivatives/qc/100%_done.txt',
+         '/resshare/projects/PROJ/derivatives/qc/100x_done.txt',
+         '/resshare/projects/PROJ/derivatives/qc/a+b.txt',
+         '/resshare/projects/OTHER/rawdata/sub-1001/ses-1/anat/SUB-1001_ses-1_T1w.nii.gz',
+         '/resshare/projects/OTHER/rawdata/participants.tsv',
+         '/resshare/projects/OTHER/rawdata/participants_tsv']
+
+#literal, substring, anchored, '.' wildcard, escaped metacharacter, LIKE wildcards in the pattern, and real regular expressions
+PATTERNS = ['nii.gz', 'T1w', 't1w', '^/resshare/projects/PROJ/', '/resshare/projects/proj/rawdata', 'bold.nii.gz$',
+            r'\.json$', r'nii\.gz', '^/resshare/projects/OTHER/rawdata/participants.tsv$',
+            r'^/resshare/projects/OTHER/rawdata/participants\.tsv$', '100%', '100._done', r'a\+b', 'a+b',
+            'participants_tsv', 'acq-0[12]', 'sub-100(1|2)', r'ses-\d/anat', 'B0 map', '^sub-', 'dcm$', '']
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    snapshotFile = str(tmp_path_factory.mktemp('catalog') / 'catalog.sqlite')
+    catalog.write_snapshot(snapshotFile, {'searchTable': (['fullpath', 'filename'], [(p, p.rsplit('/', 1)[1]) for p in PATHS])})
+    return catalog.open_snapshot(snapshotFile)
+
+
+def _select(snapshot, ls_where, values):
+    sqlQuery = _mysql._to_sqlite(_mysql._build_select('searchTable', 'fullpath', ls_where))
+    return sorted(r[0] for r in snapshot.execute(sqlQuery, values).fetchall())
+
+
+def _regexp(pattern):
+    return [p for p in PATHS if re.search(pattern, p, re.IGNORECASE)]
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_compile_pattern_matches_regexp(snapshot, pattern):
+    predicate, value = _mysql._compile_pattern('fullpath', pattern)
+    assert _select(snapshot, [predicate], [value]) == sorted(_regexp(pattern))
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_compile_pattern_negated_matches_not_regexp(snapshot, pattern):
+    predicate, value = _mysql._compile_pattern('fullpath', pattern, negate=True)
+    assert _select(snapshot, [predicate], [value]) == sorted(set(PATHS) - set(_regexp(pattern)))
+
+
+@pytest.mark.parametrize('pattern, expected', [('nii.gz', ('fullpath LIKE %s', '%nii_gz%')),
+                                               ('^/resshare/', ('fullpath LIKE %s', '/resshare/%')),
+                                               (r'\.json$', ('fullpath LIKE %s', '%.json')),
+                                               (r'^/a/b\.txt$', ('fullpath = %s', '/a/b.txt')),
+                                               ('100%', ('fullpath LIKE %s', '%100\\%%')),
+                                               ('acq-0[12]', ('fullpath REGEXP %s', 'acq-0[12]'))])
+def test_compile_pattern_picks_cheapest_predicate(pattern, expected):
+    assert _mysql._compile_pattern('fullpath', pattern) == expected
+
+
+def test_build_where_combines_like_sql_query(snapshot):
+    regex = 'nii.gz'
+    inclusion = ['rawdata', 'sub-1001']
+    exclusion = ['OTHER', r'task-\w+']
+    orinclusion = ['anat', 'func']
+    ls_where, values = _mysql._build_where('fullpath', regex, inclusion, exclusion, orinclusion)
+
+    expected = [p for p in _regexp(regex)
+                if all(re.search(i, p, re.I) for i in inclusion)
+                and not any(re.search(e, p, re.I) for e in exclusion)
+                and any(re.search(o, p, re.I) for o in orinclusion)]
+    assert expected == ['/resshare/projects/PROJ/rawdata/sub-1001/ses-1/anat/sub-1001_ses-1_T1w.nii.gz']
+    assert _select(snapshot, ls_where, values) == expected
+
+
+def test_build_where_without_patterns(snapshot):
+    assert _mysql._build_where('fullpath') == ([], [])
+    assert _select(snapshot, [], []) == sorted(PATHS)
@@ -0,0 +1,108 @@
+# test_nifti.py
+# synthetic NIfTI-1/NIfTI-2 images of both byte orders, plain and gzip compressed
+import os
+import gzip
+import struct
+
+import pytest
+
+from wsuconnect.support_tools import nifti
+
+
+def _nifti1_header(endian: str, dim: list, pixdim: list, datatype: int, bitpix: int, xyzt_units: int) -> bytes:
+    buf = bytearray(348)
+    struct.pack_into(endian + 'i', buf, 0, 348)
+    struct.pack_into(endian + '8h', buf, 40, *dim)
+    struct.pack_into(endian + '2h', buf, 70, datatype, bitpix)
+    struct.pack_into(endian + '8f', buf, 76, *pixdim)
+    struct.pack_into(endian + 'f', buf, 108, 352.0)
+    buf[123] = xyzt_units
+    buf[344:348] = b'n+1\x00'
+    return bytes(buf) + b'\x00' * 4
+
+
+def _nifti2_header(endian: str, dim: list, pixdim: list, datatype: int, bitpix: int, xyzt_units: int) -> bytes:
+    buf = bytearray(540)
+    struct.pack_into(endian + 'i', buf, 0, 540)
+    buf[4:12] = b'n+2\x00\r\n\x1a\n'
+    struct.pack_into(endian + '2h', buf, 12, datatype, bitpix)
+    struct.pack_into(endian + '8q', buf, 16, *dim)
+    struct.pack_into(endian + '8d', buf, 104, *pixdim)
+    struct.pack_into(endian + 'q', buf, 168, 544)
+    struct.pack_into(endian + 'i', buf, 500, xyzt_units)
+    return bytes(buf) + b'\x00' * 4
+
+
+def _write(path, header: bytes, gz: bool):
+    data = header + b'\x00' * 4096
+    if gz:
+        with gzip.open(path, 'wb') as f:
+            f.write(data)
+    else:
+        with open(path, 'wb') as f:
+            f.write(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('version', [1, 2])
+@pytest.mark.parametrize('endian', ['<', '>'])
+@pytest.mark.parametrize('gz', [True, False])
+def test_read_4d_header(tmp_path, version, endian, gz):
+    makeHeader = _nifti1_header if version == 1 else _nifti2_header
+    niiFile = _write(tmp_path / ('bold.nii.gz' if gz else 'bold.nii'),
+                     makeHeader(endian, [4, 64, 64, 36, 200, 0, 0, 0], [1.0, 3.0, 3.0, 3.5, 2000.0, 0, 0, 0], 4, 16, 2 | 16), gz)
+
+    d_hdr = nifti.read_nifti_header(niiFile)
+    assert d_hdr['version'] == version
+    assert d_hdr['byteorder'] == endian
+    assert d_hdr['magic'] == ('n+1' if version == 1 else 'n+2')
+    assert d_hdr['ndim'] == 4
+    assert d_hdr['dims'] == [64, 64, 36, 200, 1, 1, 1]
+    assert d_hdr['pixdims'][:4] == [3.0, 3.0, 3.5, 2000.0]
+    assert d_hdr['tr'] == pytest.approx(2.0)
+    assert (d_hdr['datatype'], d_hdr['datatype_name'], d_hdr['bitpix']) == (4, 'int16', 16)
+    assert (d_hdr['space_units'], d_hdr['time_units']) == ('mm', 'msec')
+    assert d_hdr['vox_offset'] == (352 if version == 1 else 544)
+    assert nifti.get_dims(niiFile) == [64, 64, 36, 200]
+    assert nifti.get_dims(niiFile, 3) == [64, 64, 36]
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_read_3d_header_reports_unused_dims_as_1(tmp_path, version):
+    makeHeader = _nifti1_header if version == 1 else _nifti2_header
+    niiFile = _write(tmp_path / 'T1w.nii.gz', makeHeader('<', [3, 256, 256, 176, 7, 7, 7, 7], [1.0, 1.0, 1.0, 1.2, 5.0, 5.0, 5.0, 5.0], 16, 32, 2 | 8), True)
+
+    d_hdr = nifti.read_nifti_header(niiFile)
+    assert d_hdr['dims'] == [256, 256, 176, 1, 1, 1, 1]
+    assert d_hdr['pixdims'] == pytest.approx([1.0, 1.0, 1.2, 1.0, 1.0, 1.0, 1.0])
+    assert d_hdr['tr'] is None
+    assert d_hdr['datatype_name'] == 'float32'
+    assert nifti.get_dims(niiFile) == [256, 256, 176, 1]
+
+
+def test_header_is_reread_when_file_changes(tmp_path):
+    niiFile = _write(tmp_path / 'bold.nii', _nifti1_header('<', [4, 64, 64, 36, 100, 0, 0, 0], [1.0, 3.0, 3.0, 3.0, 2.0, 0, 0, 0], 4, 16, 2 | 8), False)
+    assert nifti.get_dims(niiFile) == [64, 64, 36, 100]
+
+    #returned dicts are copies
+    nifti.read_nifti_header(niiFile)['dims'].append(0)
+    assert nifti.read_nifti_header(niiFile)['dims'] == [64, 64, 36, 100, 1, 1, 1]
+
+    s = os.stat(niiFile)
+    _write(niiFile, _nifti1_header('<', [4, 64, 64, 36, 150, 0, 0, 0], [1.0, 3.0, 3.0, 3.0, 2.0, 0, 0, 0], 4, 16, 2 | 8), False)
+    os.utime(niiFile, ns=(s.st_atime_ns, s.st_mtime_ns + 1000000))
+    assert nifti.get_dims(niiFile) == [64, 64, 36, 150]
+
+
+def test_tr_in_seconds(tmp_path):
+    niiFile = _write(tmp_path / 'asl.nii', _nifti1_header('<', [4, 80, 80, 40, 2, 0, 0, 0], [1.0, 3.0, 3.0, 5.0, 4.5, 0, 0, 0], 16, 32, 2 | 8), False)
+    d_hdr = nifti.read_nifti_header(niiFile)
+    assert (d_hdr['tr'], d_hdr['time_units']) == (pytest.approx(4.5), 'sec')
+
+
+@pytest.mark.parametrize('content', [b'', b'not a nifti image' * 40, struct.pack('<i', 123) + b'\x00' * 600])
+def test_not_a_nifti_header(tmp_path, content):
+    niiFile = tmp_path / 'bad.nii'
+    niiFile.write_bytes(content)
+    with pytest.raises(ValueError):
+        nifti.read_nifti_header(str(niiFile))
@@ -0,0 +1,185 @@
+# test_pacs.py
+import os
+import socket
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from wsuconnect.support_tools import pacs
+from wsuconnect.support_tools.pacs import _pacs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(_pacs, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def series(tmp_path):
+    srcDir = tmp_path / 'PACS_m2'
+    srcDir.mkdir()
+    ls_files = []
+    for i in range(5):
+        f = srcDir / f"IM {i:04d}"
+        f.write_bytes(os.urandom(256))
+        ls_files.append(str(f))
+    return ls_files
+
+
+# ******************* SeriesTracker ********************
+def test_series_tracker_completes_after_quiet_period(clock):
+    tracker = pacs.SeriesTracker(quiet_period=30)
+    tracker.update('1.2.1', 'PROJ 1001', 'PROJ', n=3)
+    clock[0] += 20
+    tracker.update('1.2.1', 'PROJ 1001', 'PROJ')
+    clock[0] += 29
+    assert tracker.complete() == []
+    assert tracker.has_patient('PROJ 1001')
+
+    clock[0] += 1
+    ls_complete = tracker.complete()
+    assert [uid for uid, _ in ls_complete] == ['1.2.1']
+    assert ls_complete[0][1]['nFiles'] == 4
+    assert len(tracker) == 0
+    assert not tracker.has_patient('PROJ 1001')
+
+
+def test_series_tracker_quiet_period_overrides(clock):
+    tracker = pacs.SeriesTracker(quiet_period=30, d_quietPeriods={'PROJ 1001': 5, 'SLOW': 120})
+    assert tracker.get_quiet_period('PROJ 1001', 'PROJ') == 5
+    assert tracker.get_quiet_period('SLOW 2001', 'SLOW') == 120
+    assert tracker.get_quiet_period('PROJ 1002', 'PROJ') == 30
+
+    tracker.update('a', 'PROJ 1001', 'PROJ')
+    tracker.update('b', 'SLOW 2001', 'SLOW')
+    tracker.update('c', 'PROJ 1002', 'PROJ')
+    clock[0] += 30
+    assert sorted(uid for uid, _ in tracker.complete()) == ['a', 'c']
+    clock[0] += 90
+    assert [uid for uid, _ in tracker.complete()] == ['b']
+
+
+def test_series_tracker_patient_idle(clock):
+    tracker = pacs.SeriesTracker(quiet_period=30)
+    assert tracker.patient_idle('PROJ 1001') is None
+    tracker.update('a', 'PROJ 1001')
+    clock[0] += 100
+    tracker.update('b', 'PROJ 1001')
+    clock[0] += 40
+    tracker.complete()
+    assert not tracker.has_patient('PROJ 1001')
+    assert tracker.patient_idle('PROJ 1001') == 40
+    tracker.forget_patient('PROJ 1001')
+    assert tracker.patient_idle('PROJ 1001') is None
+
+
+# ******************* IngestJournal ********************
+def test_journal_file_states(tmp_path):
+    journal = pacs.IngestJournal(str(tmp_path / 'journal.sqlite'))
+    journal.set_file_states(['/PACS_m2/a', '/PACS_m2/b'], 'seen', '1.2.1')
+    journal.set_file_states(['/PACS_m2/a'], 'staged')
+    assert journal.get_file_states(['/PACS_m2/a', '/PACS_m2/b', '/PACS_m2/c']) == {'/PACS_m2/a': 'staged', '/PACS_m2/b': 'seen'}
+
+
+def test_journal_series_lifecycle_and_resume(tmp_path):
+    journalFile = str(tmp_path / 'journal.sqlite')
+    journal = pacs.IngestJournal(journalFile)
+    d_info = {'family_name': 'PROJ 1001', 'project': 'PROJ', 'dcmDir': '/data/sourcedata/sub-1001/ses-1/acq-01', 'ls_files': ['/PACS_m2/a', '/PACS_m2/b']}
+    journal.start_series('1.2.1', d_info)
+    journal.start_series('1.2.2', dict(d_info, dcmDir='/data/sourcedata/sub-1001/ses-1/acq-02'))
+    journal.set_series_state('1.2.1', 'staged', seconds=1.0)
+    journal.set_series_state('1.2.1', 'bids', seconds=2.0, outputs=['/data/rawdata/sub-1001/ses-1/anat/x.nii.gz'])
+    journal.set_series_state('1.2.2', 'staged', error='disk full')
+
+    # a restarted daemon sees the same state through a new connection
+    journal = pacs.IngestJournal(journalFile)
+    d_series = journal.get_series('1.2.1')
+    assert d_series['state'] == 'bids'
+    assert d_series['n_files'] == 2
+    assert d_series['outputs'] == ['/data/rawdata/sub-1001/ses-1/anat/x.nii.gz']
+    assert d_series['info'] == d_info
+    assert journal.get_series('9.9.9') is None
+
+    assert [uid for uid, _ in journal.unfinished_series()] == ['1.2.1']
+    assert [uid for uid, _ in journal.unfinished_series(include_failed=True)] == ['1.2.1', '1.2.2']
+    journal.set_series_state('1.2.1', 'done')
+    assert journal.unfinished_series() == []
+
+    assert journal.open_patients() == {'PROJ 1001': {'project': 'PROJ', 'sourcedataDir': '/data/sourcedata/sub-1001/ses-1'}}
+    journal.finalize_patient('PROJ 1001')
+    assert journal.open_patients() == {}
+
+
+def test_journal_restart_resets_reprocessed_series(tmp_path):
+    journal = pacs.IngestJournal(str(tmp_path / 'journal.sqlite'))
+    d_info = {'family_name': 'PROJ 1001', 'project': 'PROJ', 'dcmDir': '/data/sourcedata/sub-1001/ses-1/acq-01', 'ls_files': ['/PACS_m2/a']}
+    journal.start_series('1.2.1', d_info)
+    journal.set_series_state('1.2.1', 'done', outputs=['/x.nii.gz'])
+    journal.start_series('1.2.1', dict(d_info, ls_files=['/PACS_m2/a', '/PACS_m2/b']))
+    d_series = journal.get_series('1.2.1')
+    assert (d_series['state'], d_series['n_files'], d_series['outputs']) == ('complete', 2, [])
+
+
+def test_journal_meta(tmp_path):
+    journal = pacs.IngestJournal(str(tmp_path / 'journal.sqlite'))
+    assert journal.get_meta('orthanc_since', 0) == 0
+    journal.set_meta('orthanc_since', 42)
+    journal.set_meta('orthanc_since', 43)
+    assert journal.get_meta('orthanc_since') == 43
+
+
+# ******************* stage_files ********************
+@pytest.mark.parametrize('mode', ['link', 'copy', 'move'])
+def test_stage_files_publishes_whole_series(series, tmp_path, mode):
+    d_content = {os.path.basename(f).replace(' ', '_'): open(f, 'rb').read() for f in series}
+    destDir = str(tmp_path / 'sourcedata' / 'sub-1001' / 'ses-1' / 'acq-01')
+    ls_dest, used = pacs.stage_files(series, destDir, mode=mode)
+
+    assert used == mode
+    assert sorted(os.listdir(destDir)) == sorted(d_content)
+    assert sorted(ls_dest) == sorted(os.path.join(destDir, n) for n in d_content)
+    for f in ls_dest:
+        assert open(f, 'rb').read() == d_content[os.path.basename(f)]
+    assert [n for n in os.listdir(os.path.dirname(destDir)) if '.partial-' in n] == []
+    assert all(os.path.isfile(f) for f in series) == (mode != 'move')
+
+
+def test_stage_files_adds_late_files_to_existing_series(series, tmp_path):
+    destDir = str(tmp_path / 'sourcedata' / 'acq-01')
+    pacs.stage_files(series[:3], destDir, mode='copy')
+    pacs.stage_files(series[3:], destDir, mode='copy')
+    assert len(os.listdir(destDir)) == 5
+
+
+def test_stage_files_removes_only_stale_partials(series, tmp_path):
+    destDir = str(tmp_path / 'sourcedata' / 'acq-01')
+    parentDir = os.path.dirname(destDir)
+    host = socket.gethostname()
+    live = subprocess.Popen(['sleep', '60'])
+    try:
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        d_partials = {'live': f".acq-01.partial-{host}-{live.pid}",
+                      'dead': f".acq-01.partial-{host}-{dead.pid}",
+                      'legacy': f".acq-01.partial-{dead.pid}",
+                      'other_host': '.acq-01.partial-other-host-12',
+                      'other_host_old': '.acq-01.partial-other-host-13'}
+        for name in d_partials.values():
+            os.makedirs(os.path.join(parentDir, name))
+        os.utime(os.path.join(parentDir, d_partials['other_host_old']), (0, 0))
+
+        pacs.stage_files(series, destDir, mode='copy')
+        ls_left = os.listdir(parentDir)
+    finally:
+        live.kill()
+        live.wait()
+
+    assert sorted(ls_left) == sorted(['acq-01', d_partials['live'], d_partials['other_host']])
+
+
+def test_stage_files_rejects_unknown_mode(series, tmp_path):
+    with pytest.raises(ValueError):
+        pacs.stage_files(series, str(tmp_path / 'acq-01'), mode='rsync')
@@ -0,0 +1,193 @@
+# test_pacs_changes.py
+# Orthanc /changes consumer (connect_pacs_dicom_grabber.py --source changes) against a stub Orthanc server
+import os
+import json
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import connect_pacs_dicom_grabber as grabber
+from support_tools.RestToolbox import OrthancClient
+
+
+PATIENT = 'PROJ 1001'
+STUDY_KEY = ('PROJ', 'sub-1001', 'ses-1', '2026-10-18')
+
+
+class StubOrthanc(ThreadingHTTPServer):
+    """
+    Minimal Orthanc REST server: /changes plus static JSON resources, anything else is a 404.
+    """
+
+    def __init__(self):
+        self.ls_changes = []
+        self.d_resources = {}
+        self.d_hits = {}
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self.server_address[1])
+
+    def add_change(self, changeType, resourceId):
+        self.ls_changes.append({'Seq': len(self.ls_changes) + 1,
+                                'ChangeType': changeType,
+                                'ID': resourceId,
+                                'ResourceType': 'Series' if changeType.endswith('Series') else 'Study',
+                                'Path': '/' + resourceId,
+                                'Date': '20261018T120000'})
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        self.server.d_hits[u.path] = self.server.d_hits.get(u.path, 0) + 1
+        if u.path == '/changes':
+            q = parse_qs(u.query)
+            since = int(q.get('since', ['0'])[0])
+            limit = int(q.get('limit', ['100'])[0])
+            ls_after = [c for c in self.server.ls_changes if c['Seq'] > since]
+            ls_page = ls_after[:limit]
+            self._reply(200, {'Changes': ls_page,
+                              'Done': len(ls_after) <= limit,
+                              'Last': ls_page[-1]['Seq'] if ls_page else since})
+        elif u.path in self.server.d_resources.keys():
+            status, body = self.server.d_resources[u.path]
+            self._reply(status, body)
+        else:
+            self._reply(404, {'Message': 'Unknown resource'})
+
+
+@pytest.fixture
+def orthanc():
+    server = StubOrthanc()
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakePool:
+    """
+    WorkerPool stand-in: fetch_series futures are resolved by the test, everything else runs inline.
+    """
+
+    def __init__(self):
+        self.d_fetches = {}
+        self.ls_finalized = []
+
+    def submit(self, fn, *args):
+        f = Future()
+        if fn is grabber.fetch_series:
+            self.d_fetches[args[0]] = f
+        else:
+            self.ls_finalized.append(args[0])
+            f.set_result(None)
+        return f
+
+    def stats(self):
+        return {}
+
+
+class StopLoop(Exception):
+    pass
+
+
+def _run(orthanc, journal, pool, monkeypatch, ls_steps, max_retries=5):
+    """
+    Run consume_changes until it has idled once per step, calling each step while it sleeps.
+    """
+    ls_tracking = []
+    monkeypatch.setattr(grabber, 'write_log', lambda s: None)
+    monkeypatch.setattr(grabber, 'update_mri_tracking', lambda d: ls_tracking.append(dict(d)))
+    monkeypatch.setattr(grabber, 'log_stage_timing', lambda pool: None)
+
+    steps = iter(ls_steps)
+    def sleep(seconds):
+        try:
+            next(steps)()
+        except StopIteration:
+            raise StopLoop()
+    monkeypatch.setattr(grabber, 'tm', SimpleNamespace(sleep=sleep, time=grabber.tm.time))
+
+    options = SimpleNamespace(STAGING='auto', CHANGES_INTERVAL=0, CHANGES_MAX_RETRIES=max_retries)
+    with pytest.raises(StopLoop):
+        grabber.consume_changes(options, journal, pool, {'PROJ': {'dataDir': os.path.dirname(journal.journalFile)}}, orthanc.url)
+    return ls_tracking
+
+
+def _series_result(start, end):
+    return {'d_studies': {STUDY_KEY: {'scan_start_time': start, 'scan_end_time': end}}}
+
+
+def test_iter_changes_pages_through_the_feed(orthanc):
+    for i in range(5):
+        orthanc.add_change('StableSeries', 's' + str(i))
+
+    client = OrthancClient(orthanc.url)
+    assert [c['Seq'] for c in client.iter_changes(since=0, limit=2)] == [1, 2, 3, 4, 5]
+    assert orthanc.d_hits['/changes'] == 3
+    assert [c['ID'] for c in client.iter_changes(since=3, limit=2)] == ['s3', 's4']
+    assert list(client.iter_changes(since=5)) == []
+    client.close()
+
+
+def test_consume_changes_cursor_and_study_completion(orthanc, tmp_path, monkeypatch):
+    orthanc.d_resources['/series/s1'] = (200, {'ID': 's1', 'ParentStudy': 'st1'})
+    orthanc.d_resources['/studies/st1'] = (200, {'ID': 'st1', 'PatientMainDicomTags': {'PatientName': PATIENT + '^X'}})
+    orthanc.d_resources['/studies/st1/series'] = (200, [{'ID': 's1'}, {'ID': 's3'}])
+    orthanc.add_change('StableSeries', 's1')
+    orthanc.add_change('StableSeries', 's2')       # deleted from Orthanc (404), skipped
+    orthanc.add_change('StableStudy', 'st1')       # queues s3, which was never reported on its own
+
+    journal = grabber.st.pacs.IngestJournal(str(tmp_path / 'journal.sqlite'))
+    pool = FakePool()
+    def first_idle():
+        # every change is queued, none is processed: the persisted cursor has not moved
+        assert sorted(pool.d_fetches) == ['s1', 's3']
+        assert journal.get_meta('orthanc_since', 0) == 0
+        pool.d_fetches['s1'].set_result(_series_result('08:00:00', '08:10:00'))
+    def second_idle():
+        # s1 is done and the 404 is skipped, the StableStudy change waits for s3
+        assert journal.get_meta('orthanc_since', 0) == 2
+        assert pool.ls_finalized == []
+        pool.d_fetches['s3'].set_result(_series_result('08:15:00', '08:30:00'))
+    def third_idle():
+        assert journal.get_meta('orthanc_since', 0) == 3
+
+    ls_tracking = _run(orthanc, journal, pool, monkeypatch, [first_idle, second_idle, third_idle])
+
+    # mri_tracking gets the earliest start and latest end of the study, then the patient is finalized
+    assert ls_tracking == [{STUDY_KEY: {'scan_start_time': '08:00:00', 'scan_end_time': '08:30:00'}}]
+    assert pool.ls_finalized == [PATIENT]
+    assert orthanc.d_hits['/series/s2'] == 1
+
+
+def test_consume_changes_gives_up_after_max_retries(orthanc, tmp_path, monkeypatch):
+    orthanc.d_resources['/series/bad'] = (500, {'Message': 'Internal error'})
+    orthanc.add_change('StableSeries', 'bad')
+
+    journal = grabber.st.pacs.IngestJournal(str(tmp_path / 'journal.sqlite'))
+    pool = FakePool()
+    _run(orthanc, journal, pool, monkeypatch, [lambda: None, lambda: None], max_retries=3)
+
+    assert orthanc.d_hits['/series/bad'] == 3
+    assert journal.get_meta('orthanc_since', 0) == 1
+    assert pool.d_fetches == {}
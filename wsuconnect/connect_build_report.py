@@ -4,6 +4,7 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 10 Mar 2025
 #
+# v1.1.0 on 18 Oct 2026 - look up every participant's images with a single batched catalog query
 # v1.0.0 on 10 Mar 2025 - add utilization of instance_ids.json
 
 import datetime
@@ -37,8 +38,8 @@ import support_tools as st
 
 # GLOBAL INFO
 #versioning
-VERSION = '1.0.0'
-DATE = '10 Mar 2025'
+VERSION = '1.1.0'
+DATE = '18 Oct 2026'
 
 
 # Get the default style sheet
@@ -60,6 +61,7 @@ parser.add_argument('--progress', help="Show progress (default FALSE)", action="
 
 
 #set some parameters
+figTypes = ['basil'] #['basil','basilGM','cbf','score','scrub']
 left_margin = 0.5 * inch
 right_margin = 0.5 * inch
 
@@ -188,8 +190,45 @@ def get_scaled_image(image_path, max_width):
 
     return Image(image_path, width=new_width, height=new_height)
 
-def create_pdf(output_filename, subName):
-    """Creates a PDF with SVG images and headers/footers."""
+def get_report_files(subNames: list, figTypes: list=figTypes) -> dict:
+    """
+    Find the CBF, preprocessed T1w and brain mask images of every participant with one batched catalog query.
+
+    :param subNames: participant identifiers (sub-XXX)
+    :type subNames: list
+
+    :param figTypes: CBF algorithms to report, defaults to figTypes
+    :type figTypes: list, optional
+
+    :return: {(subName, figType|'T1w'|'mask'): list of fullpaths}
+    :rtype: dict
+    """
+    d_specs = {}
+    for subName in subNames:
+        for figType in figTypes:
+            if figType == 'cbf':
+                d_specs[(subName,figType)] = {'regex': 'space-MNI152NLin2009cAsym_res-2_cbf.nii.gz', 'exclusion': ['bak','desc'], 'inclusion': ['derivatives',subName,'perf']}
+            else:
+                d_specs[(subName,figType)] = {'regex': f'space-MNI152NLin2009cAsym_res-2_desc-{figType}_cbf.nii.gz', 'exclusion': ['bak'], 'inclusion': ['derivatives',subName,'perf']}
+        d_specs[(subName,'T1w')] = {'regex': 'space-MNI152NLin2009cAsym_res-2_desc-preproc_T1w.nii.gz', 'exclusion': ['bak'], 'inclusion': ['derivatives',subName,'anat']}
+        d_specs[(subName,'mask')] = {'regex': 'space-MNI152NLin2009cAsym_res-2_desc-brain_mask.nii.gz', 'exclusion': ['bak'], 'inclusion': ['derivatives',subName,'anat']}
+
+    return st.mysql.sql_query_batch(st.creds.searchTable,d_specs,database=st.creds.database,searchcol='fullpath')
+
+
+def create_pdf(output_filename, subName, d_files: dict=None):
+    """
+    Creates a PDF with SVG images and headers/footers.
+
+    :param output_filename: fullpath to the output pdf
+    :type output_filename: str
+
+    :param subName: participant identifier (sub-XXX)
+    :type subName: str
+
+    :param d_files: images found by get_report_files, defaults to None (query for this participant)
+    :type d_files: dict, optional
+    """
     # Set the left and right margins (in inches)
     
     # Create a SimpleDocTemplate with custom margins
@@ -204,8 +243,9 @@ def create_pdf(output_filename, subName):
     
 
     # for subName in subNames:
+    if d_files is None:
+        d_files = get_report_files([subName])
 
-    figTypes = ['basil'] #['basil','basilGM','cbf','score','scrub']
     for figType in figTypes:
 
     
@@ -220,10 +260,7 @@ def create_pdf(output_filename, subName):
         # elements_neg.append(Paragraph(f"CBF units are mL/100 g/min.", style=small_style))
         elements_neg.append(Spacer(1, 0.1 * inch))
         
-        if figType == 'cbf':
-            niiFiles = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,searchcol='fullpath',regex=f'space-MNI152NLin2009cAsym_res-2_cbf.nii.gz',exclusion=['bak','desc'],inclusion=['derivatives',f'{subName}','perf'])
-        else:
-            niiFiles = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,searchcol='fullpath',regex=f'space-MNI152NLin2009cAsym_res-2_desc-{figType}_cbf.nii.gz',exclusion=['bak'],inclusion=['derivatives',f'{subName}','perf'])
+        niiFiles = d_files.get((subName,figType),[])
         
 
 
@@ -239,10 +276,8 @@ def create_pdf(output_filename, subName):
                     d_baseCbfImg = np.where(d_baseCbfImg > 1, d_baseCbfImg, np.nan)
 
                     #get anatomical image and mask
-                    anatFiles = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,searchcol='fullpath',regex=f'space-MNI152NLin2009cAsym_res-2_desc-preproc_T1w.nii.gz',exclusion=['bak'],inclusion=['derivatives',f'{subName}','anat'])
-                    bgImg =nib.load(anatFiles[0])
-                    anatFiles = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,searchcol='fullpath',regex=f'space-MNI152NLin2009cAsym_res-2_desc-brain_mask.nii.gz',exclusion=['bak'],inclusion=['derivatives',f'{subName}','anat'])
-                    bgImgMask = nib.load(anatFiles[0])
+                    bgImg =nib.load(d_files[(subName,'T1w')][0])
+                    bgImgMask = nib.load(d_files[(subName,'mask')][0])
                     d_bgImgMask = np.squeeze(bgImgMask.get_fdata())
 
                     # mask baseline CBF image with brain and create an image mask
@@ -418,7 +453,8 @@ if __name__ == '__main__':
 
     #extract relevant columns
     df_data = df_participants
+    d_files = get_report_files(df_data['participant_id'].tolist())
     for index, row in df_data.iterrows():
         subName = row['participant_id']
         # subName = 'sub-351303'
-        create_pdf(os.path.join(st.creds.dataDir,'derivatives',f"output_{subName}.pdf"), subName)
+        create_pdf(os.path.join(st.creds.dataDir,'derivatives',f"output_{subName}.pdf"), subName, d_files)
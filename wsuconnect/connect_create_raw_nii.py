@@ -4,6 +4,8 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 23 Dec 2020
 #
+# Modified on 18 Oct 2026 - queue T1w brain extraction (support_tools.spool) instead of a blocking docker run per image
+# Modified on 18 Oct 2026 - plan/execute sessions separately, organise many sessions across a process pool with one participants.tsv and catalog update
 # Modified on 25 October 2024 - update to new session formats and use of helper_functions
 # Modified on 17 April 2023 - update to WSU format
 # Modified on 24 Nov 2021 - improve efficiency based on processed_data_check output
@@ -38,8 +40,11 @@ import support_tools as st
 
 # GLOBAL INFO
 #versioning
-VERSION = '5.0.0'
-DATE = '25 October 2024'
+VERSION = '5.2.0'
+DATE = '18 Oct 2026'
+
+#spool queue for deferred brain extraction of T1w images
+BET_QUEUE = 'bet'
 
 #input argument parser
 
@@ -48,6 +53,8 @@ parser = argparse.ArgumentParser('connect_create_raw_nii.py: copy raw nifti imag
 
 parser.add_argument('-p','--project', required=True, action="store", dest="PROJECT", help="select a project from the credentials.json file", default=None)
 parser.add_argument('-i','--in-dir', action="store", dest="IN_DIR", help="path to individual subject/session to search for raw nifti images", default=None)
+parser.add_argument('-n','--workers', action="store", type=int, dest="WORKERS", help="number of sessions organised in parallel when --in-dir is not given (default: number of CPUs)", default=None)
+parser.add_argument('--no-catalog', action="store_false", dest="CATALOG", help="do not add the moved files to the project's catalog tables when --in-dir is not given", default=True)
 parser.add_argument('--overwrite', action="store_true", dest="OVERWRITE", help="Force copy by skipping file checking", default=False)
 parser.add_argument('--progress', help="Show progress (default FALSE)", action="store_true", dest="progress", default=False)
 parser.add_argument('-v', '--version', help="Display the current version", action="store_true", dest="version")
@@ -101,334 +108,343 @@ def ext_check(filename):
 
 
 
-# ******************* EVALUATE INPUT ARGUMENTS ********************
-def process_single_dir(inDir,progress,override):
-    #get time info for verbose option
-    t = time.time()
-    now = datetime.datetime.now()
+# ******************* PARTICIPANTS ********************
+def update_participants(ls_subjects: list):
+    """
+    Add missing subjects to the project's rawdata/participants.tsv file, reading and writing the file once.
 
-    #update progress
-    if progress:
-        print("Searching " + inDir + " @" + now.strftime("%m-%d-%Y %H:%M:%S"))
+    :param ls_subjects: subject identifiers (without the sub- prefix)
+    :type ls_subjects: list
+    """
+    inputTsv = os.path.join(st.creds.dataDir,'rawdata','participants.tsv')
+    if not os.path.isfile(inputTsv):
+        return
 
+    with open(inputTsv) as f:
+        df_participants = pd.read_csv(f,delimiter='\t')
 
-    ls_updatedFiles = []
-    ls_existingFiles = []
+    existing = set(df_participants['participant_id'].astype(str))
+    ls_new = sorted(set(f"sub-{s}" for s in ls_subjects if s) - existing)
+    if not ls_new:
+        return
 
+    if 'discard' in df_participants.columns:
+        df_new = pd.DataFrame([[p,False] for p in ls_new],columns=["participant_id","discard"])
+    else:
+        df_new = pd.DataFrame([[p] for p in ls_new],columns=["participant_id"])
+    df_participants = pd.concat([df_participants,df_new], ignore_index=True)
+    df_participants.to_csv(inputTsv,sep='\t',index=False)
 
-    #get subject name from filename
-    # print(inDir)
-    st.subject.get_id(inDir)
-    # subjectName,sessionNum = get_dir_identifiers(inDir)
 
-    if not st.subject.id:
-        return ls_updatedFiles,ls_existingFiles
-    
-    inputTsv = os.path.join(st.creds.dataDir,'rawdata','participants.tsv')
-    if os.path.isfile(inputTsv):
-        with open(inputTsv) as f:
-            df_participants = pd.read_csv(f,delimiter='\t')
-        if not df_participants['participant_id'].str.contains(f"sub-{st.subject.id}").any():
-            if 'discard' in df_participants.columns:
-                df_participants = pd.concat([df_participants,pd.DataFrame([[f"sub-{st.subject.id}",False]],columns=["participant_id","discard"])], ignore_index=True)
-            else:
-                df_participants = pd.concat([df_participants,pd.DataFrame([[f"sub-{st.subject.id}"]],columns=["participant_id"])], ignore_index=True)
-            df_participants.to_csv(inputTsv,sep='\t',index=False)
+# ******************* SIDECAR MODIFIERS ********************
+def update_sidecar(jsonFile: str, scanKeys: dict, sesNum: str) -> bool:
+    """
+    Add the keys specified in the project's scan_id.json file to a rawdata JSON sidecar and rename
+    dcm2niix's estimated keys to their BIDS names.
+
+    :param jsonFile: fullpath to the rawdata JSON sidecar
+    :type jsonFile: str
+
+    :param scanKeys: scan identifier keys from the scan_id.json control file
+    :type scanKeys: dict
 
+    :param sesNum: session identifier
+    :type sesNum: str
 
-        if 'discard' in df_participants.columns:
-            df_participants = df_participants[~df_participants['discard']]
+    :return: True if the sidecar was modified
+    :rtype: bool
+    """
+    baseOutput = jsonFile[:-len('.json')]
+
+    #check if additional keys are needed
+    b_mod = False
+    with open(jsonFile, 'r') as j:
+        imgHeader = json.load(j)
+
+
+    #fMRI modifiers
+    for k in ['SliceTiming',
+              'TaskName',
+              'Units']:
+        if k in scanKeys.keys():
+            imgHeader[k] = scanKeys[k]
+            b_mod = True
+
+    #general modifiers
+    if 'PhaseEncodingDirection' in scanKeys.keys():
+        imgHeader['PhaseEncodingDirection'] = scanKeys['PhaseEncodingDirection']
+        b_mod = True
+    elif 'PhaseEncodingAxis' in imgHeader.keys():
+        imgHeader['PhaseEncodingDirection'] = imgHeader.pop('PhaseEncodingAxis')
+        b_mod = True
+
+    if 'EstimatedEffectiveEchoSpacing' in imgHeader.keys():
+        imgHeader['EffectiveEchoSpacing'] = imgHeader.pop('EstimatedEffectiveEchoSpacing')
+        b_mod = True
+
+    if 'EstimatedTotalReadoutTime' in imgHeader.keys():
+        imgHeader['TotalReadoutTime'] = imgHeader.pop('EstimatedTotalReadoutTime')
+        b_mod = True
+        
+
+    #B0 map modifiers
+    if 'B0FieldSource' in scanKeys.keys():
+        imgHeader['B0FieldSource'] = f"{scanKeys['B0FieldSource']}_{sesNum}"
+        b_mod = True
+
+    if 'B0FieldIdentifier' in scanKeys.keys():
+        imgHeader['B0FieldIdentifier'] = f"{scanKeys['B0FieldIdentifier']}_{sesNum}"
+        b_mod = True
+
+    #ASL modifiers
+    for k in ["ArterialSpinLabelingType",
+              "M0Type",
+              "TotalAcquisitionPairs",
+              "LabelingDuration",
+              "PostLabelingDelay",
+              "RepetitionTimePreparation",
+              "BackgroundSuppression",
+              "BackgroundSuppressionNumberPulses",
+              "BackgroundSuppressionPulseTime",
+              "VascularCrushing",
+              "LabelingEfficiency",
+              "LabelingPulseAverageGradient",
+              "LabelingPulseMaximumGradient",
+              "LabelingPulseAverageB1",
+              "LabelingPulseDuration",
+              "LabelingPulseInterval"
+              ]:
+        if k in scanKeys.keys():
+            imgHeader[k] = scanKeys[k]
+            b_mod = True
+
+        if b_mod and os.path.isfile(os.path.join(st.creds.dataDir,'code','aslcontext.tsv')) and 'asl.json' in f"{baseOutput}.json":
+            shutil.copyfile(os.path.join(st.creds.dataDir,'code','aslcontext.tsv'),baseOutput.replace('_asl','_aslcontext.tsv'))
+
+
+    #write modified JSON sidecar
+    if b_mod:
+        with open(jsonFile, 'w') as j:
+            json.dump(imgHeader, j, indent='\t', sort_keys=True)
+
+    return b_mod
+
+
+# ******************* PLAN SESSION ********************
+def plan_session(inDir: str, progress: bool=False, override: bool=False) -> dict:
+    """
+    Plan every move, sidecar edit and brain extraction request needed to organise one sourcedata session
+    directory into rawdata, without touching any files. All NIfTI images of the session are classified
+    with a single support_tools.classify_scans call.
+
+    :param inDir: fullpath to a sourcedata sub-*/ses-* directory
+    :type inDir: str
+
+    :param progress: flag to display command line output providing additional details on the processing status, defaults to False
+    :type progress: bool, optional
 
+    :param override: move files even if the rawdata file already exists, defaults to False
+    :type override: bool, optional
+
+    :return: plan with keys inDir, subject, session, items (one dict per source image/file with keys source, dirs, moves, sidecar and bet) and ls_existingFiles; None if inDir has no subject identifier
+    :rtype: dict
+    """
+    st.subject.get_id(inDir)
+    if not st.subject.id:
+        return None
+
+    d_plan = {'inDir': inDir,
+              'subject': st.subject.id,
+              'session': st.subject.sesNum,
+              'items': [],
+              'ls_existingFiles': []}
 
     #output if requested
     if progress:
         print('\t SUBJECT: ' + st.subject.id + ' SESSION: ' + st.subject.sesNum)
 
     #get all files in directory
-    #source_fileList = sql_query(database=creds.database,searchtable=creds.searchSourceTable,searchcol='fullpath',regex=inDir,exclusion=['IMA','BMP','MRDC','REPORT'])#orinclusion=['.nii','.7','.log','.txt','.rda','.json'])
-    source_fileList = glob(os.path.join(inDir,'*.*'))
-    source_fileList.sort()
+    source_fileList = sorted(glob(os.path.join(inDir,'*.*')))
+    source_files = set(source_fileList)
+    outDir = os.path.dirname(inDir).split('sourcedata')[0] + 'rawdata'
+
+    #classify every image with a sidecar in one call
+    ls_nii = [f for f in source_fileList if f.endswith('.nii.gz') and f[:-len('.nii.gz')] + '.json' in source_files]
+    d_scans = {d['file']: d for d in st.classify_scans(ls_nii)} if ls_nii else {}
+
+    #destinations planned so far: two images classified to the same BIDS name (e.g. a repeated T1w without a
+    #run label) must not both be moved, the first one wins as it did when files were moved one at a time
+    plannedDsts = set()
+    def _plan_move(d_item: dict, src: str, dst: str) -> bool:
+        if dst in plannedDsts:
+            if progress:
+                print('			skipping file ' + src + ': ' + dst + ' is already planned for another image')
+            d_plan['ls_existingFiles'].append(src)
+            return False
+        if not override and os.path.isfile(dst):
+            return False
+        plannedDsts.add(dst)
+        d_item['moves'].append((src, dst))
+        return True
+
     for filepath in source_fileList:
+        sourceDir = os.path.dirname(filepath)
+        filename = os.path.basename(filepath)
+        ext, basename = ext_check(filename)
+        source = os.path.join(sourceDir,basename)
+
+        #file has an extension
+        if ext == '0':
+            continue
+
+        #check if associated json exists
+        if ext == 'nifti' and source + '.json' in source_files:
+            d_scan = d_scans.get(filepath)
+            if not d_scan or d_scan['scan_name'] == '0':
+                if progress:
+                    print('\t\tskipping: ' + source + '\tscan type: NOT DEFINED' + (f" ({d_scan['explanation']})" if d_scan else ''))
+                continue
+
+            scanName = d_scan['scan_name']
+            scanKeys = d_scan['scan_keys']
+            if progress:
+                print('\t\tprocessing: ' + source + '\tscan type: ' + scanName)
+
+            #create base path and filename for move
+            baseOutput = os.path.join(outDir,'sub-' + st.subject.id,'ses-' + st.subject.sesNum,d_scan['bids_dir'],
+                                      'sub-' + st.subject.id + '_ses-' + st.subject.sesNum + scanName)
+            d_item = {'source': source, 'dirs': [os.path.dirname(baseOutput)], 'moves': [], 'sidecar': None, 'bet': None}
+
+            #move associated json, txt, and nii.gz files
+            if source + '.nii.gz' in source_files:
+                _plan_move(d_item, source + '.nii.gz', baseOutput + '.nii.gz')
+
+                #perform antspynet BET if T1w image
+                if 'T1w' in baseOutput:
+                    sKeys = st.bids.get_bids_labels(baseOutput)
+                    sKeys['desc'] = 'brain'
+                    sKeys['extension'] = 'nii.gz'
+                    sKeys['suffix'] = 'T1w'
+                    main_file_brain = st.bids.get_bids_filename(subject=st.subject.id,session=st.subject.sesNum,**sKeys)
+                    d_item['bet'] = (baseOutput + '.nii.gz', os.path.join(os.path.dirname(baseOutput),main_file_brain))
+
+            if source + '.json' in source_files:
+                if _plan_move(d_item, source + '.json', baseOutput + '.json'):
+                    d_item['sidecar'] = (baseOutput + '.json', scanKeys)
+
+            if source + '.txt' in source_files:
+                _plan_move(d_item, source + '.txt', baseOutput + '.txt')
+
+                #also copy bval and bvec files for DWI
+                if 'dwi' in scanName and not 'FA' in scanName:
+                    if source + '.bval' in source_files:
+                        if _plan_move(d_item, source + '.bval', baseOutput + '.bval'):
+                            _plan_move(d_item, source + '.bvec', baseOutput + '.bvec')
+
+            d_plan['items'].append(d_item)
+
+
+        # elif ext == 'rda' or ext == '7':
+        #     tmp_outDir = os.path.join(outDir,'sub-' + subjectName,'sess-' + sessionNum)
+        #     if not os.path.isdir(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir)):
+        #         os.makedirs(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
+        #         if progress:
+        #             print('\t\t\tcreating output directory ' + tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
+
+        #     tmp_outDir = os.path.join(tmp_outDir,'svs')
+        #     if not os.path.isdir(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir)):
+        #         os.makedirs(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
+        #         if progress:
+        #             print('\t\t\tcreating output directory ' + tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
+
+        #     #move associated rda, log, or .7 file file
+        #     if progress:
+        #         print('\t\tprocessing: ' + os.path.join(inDir,basename) + ' scan type: ' + ext)
+
+        #     get_spec_base(os.path.join(inDir,basename + '.' + ext),creds)
+        #     # os.rename(os.path.join(inDir,basename + '.' + ext),os.path.join(outDir,subjectName,'SESSION_' + sessionNum,basename + '.' + ext))
+        #     outFile = os.path.join(tmp_outDir,subjectName + '_SESS' + sessionNum + '_acq-' + specBase.spectraType + '-' + specBase.spectraName + '_svs.' + ext)
+        #     if override or not os.path.isfile(outFile.replace('s3://' + creds.bucket,creds.s3_dir)):
+        #         os.system('aws s3 cp ' + os.path.join(inDir.replace(creds.s3_dir,'s3://' + creds.bucket),basename + '.' + ext) + ' ' + outFile)
+        #         # os.system("cp " + os.path.join(inDir,basename + '.' + ext) + " " + outFile)
+        #         ls_updatedFiles.append(outFile)
+        #         if progress:
+        #             print('\t\t\tcopying ' + ext + ' file ' + outFile)
+        #     else:
+        #         if progress:
+        #             print('\t\t\tskipping file ' + os.path.join(inDir,basename + '.' + ext))
+        #         ls_existingFiles.append(os.path.join(inDir,basename + '.' + ext))
+
+        elif ext in ['log','xdf'] or (ext == 'txt' and not source + '.json' in source_files):
+            tmp_outDir = os.path.join(outDir,'sub-' + st.subject.id,'ses-' + st.subject.sesNum,'beh')
+            outFile = os.path.join(tmp_outDir,basename + '.' + ext)
+            d_item = {'source': source, 'dirs': [tmp_outDir], 'moves': [], 'sidecar': None, 'bet': None}
+            if _plan_move(d_item, source + '.' + ext, outFile):
+                if progress:
+                    print('\t\tprocessing: ' + source + ' scan type: ' + ext)
+                d_plan['items'].append(d_item)
+            else:
+                if progress:
+                    print('\t\t\tskipping file ' + source + '.' + ext)
+                d_plan['ls_existingFiles'].append(source + '.' + ext)
+
+    return d_plan
+
+
+# ******************* EXECUTE SESSION PLAN ********************
+def execute_session_plan(d_plan: dict, progress: bool=False) -> tuple:
+    """
+    Carry out a plan from plan_session(): create directories, move files, edit sidecars and queue brain extraction.
+    Errors are logged per source image and do not stop the remaining items.
+
+    :param d_plan: session plan from plan_session()
+    :type d_plan: dict
+
+    :param progress: flag to display command line output providing additional details on the processing status, defaults to False
+    :type progress: bool, optional
+
+    :return: list of created rawdata files, list of skipped existing files, list of moved sourcedata files
+    :rtype: tuple
+    """
+    now = datetime.datetime.now()
+    ls_updatedFiles = []
+    ls_movedFiles = []
+
+    for d_item in d_plan['items']:
         try:
-            # splitFilename = os.path.splitext(os.path.join(inDir,filename))
-
-            #only progress if nifti
-            sourceDir = os.path.dirname(filepath)
-            filename = os.path.basename(filepath)
-            ext, basename = ext_check(filename)
-
-            #file has an extension
-            if ext != '0':
-                
-                #formulate output directory
-                outDir = os.path.dirname(inDir)
-                outDir = outDir.split('sourcedata')[0] + 'rawdata'
-
-                #check if associated json exists
-                if ext == 'nifti' and os.path.join(sourceDir,basename + '.json') in source_fileList:
-
-                    #get scan identifier
-                    scanName, bidsDir, scanKeys = st.get_scan_id(sourceDir,basename)
-                    
-
-                    if scanName == '0':
-                        if progress:
-                            print('\t\tskipping: ' + os.path.join(sourceDir,basename) + '\tscan type: NOT DEFINED')
-
-                    else:
-                        if progress:#this is just a nother test
-                            print('\t\tprocessing: ' + os.path.join(sourceDir,basename) + '\tscan type: ' + scanName)
-                        
-                        #create base path and filename for move
-                        baseOutput = os.path.join(outDir,'sub-' + st.subject.id,'ses-' + st.subject.sesNum,bidsDir,
-                                                  'sub-' + st.subject.id + '_ses-' + st.subject.sesNum + scanName)
-                        
-                        #create directory if is does not exist
-                        outDir = os.path.dirname(baseOutput)
-                        if not os.path.isdir(outDir):
-                            os.makedirs(outDir)
-                            if progress:
-                                print('\t\t\tcreating output directory ' + outDir)
-
-                        # if not os.path.isdir(os.path.dirname(baseOutput.replace('s3://' + creds.bucket,creds.s3_dir))):
-                        #     os.makedirs(os.path.dirname(baseOutput.replace('s3://' + creds.bucket,creds.s3_dir)))
-                        #     if progress:
-                        #         print('\t\t\tcreating output directory ' + os.path.dirname(baseOutput.replace('s3://' + creds.bucket,creds.s3_dir)))
-
-                        #move associated json, txt, and nii.gz files
-                        if os.path.join(sourceDir,basename + '.nii.gz') in source_fileList:
-                            if override or not os.path.isfile(baseOutput + '.nii.gz'):
-                                shutil.move(os.path.join(sourceDir,basename + '.nii.gz'), baseOutput + '.nii.gz')
-                                d={}
-                                d['fullpath'] = os.path.join(sourceDir,basename + '.nii.gz')
-                                # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                                
-                                ls_updatedFiles.append(baseOutput + '.nii.gz')
-                                if progress:
-                                    print('\t\t\tcopying ' + os.path.join(sourceDir,basename + '.nii.gz') + ' to ' + baseOutput + '.nii.gz')
-
-
-                            #perform antspynet BET if T1w image
-                            # if 'suffix' in scanKeys.keys():
-                            if 'T1w' in baseOutput:
-                                try:
-
-                                    # bet = fsl.BET(frac=0.6, robust=True)
-                                    # bet.inputs.in_file = f"{baseOutput}.nii.gz"
-                                    # inImg = ants.image_read(f"{baseOutput}.nii.gz")
-                                    #brainSeg = antspynet.brain_extraction(inImg, modality="t1", antsxnet_cache_directory=os.path.join(REALPATH,'support_tools','antsxnet_cache'), verbose=True)
-                                    # brainSeg = antspynet.brain_extraction(inImg, modality="t1", verbose=True)
-                                    sKeys = st.bids.get_bids_labels(baseOutput)
-                                    sKeys['desc'] = 'brain'
-                                    sKeys['extension'] = 'nii.gz'
-                                    sKeys['suffix'] = 'T1w'
-                                    main_file_brain = st.bids.get_bids_filename(subject=st.subject.id,session=st.subject.sesNum,**sKeys)
-
-                                    argStr = f"{os.path.join(REALPATH,'support_tools','run_antspynet_bet.py')} -i {baseOutput}.nii.gz -o {os.path.join(outDir,main_file_brain)}"
-                                    os.system(f"docker run -it --rm -v /resshare:/resshare:ro -v {outDir}:{outDir}:rw wsuconnect/neuro {argStr}")
-
-                                    # bet.inputs.out_file = main_file_brain
-                                    # bet.run()
-                                    # os.system('fslmaths ' + baseOutput + ' -mas ' + os.path.join(os.path.dirname(baseOutput),main_file_brainmask) + ' ' + os.path.join(os.path.dirname(baseOutput),main_file_brain))
-                                    if progress:
-                                        print(f'\tCreated brain-extracted image: ' + os.path.join(outDir,main_file_brain))
-                                except Exception as e:
-                                    traceback.print_exc()
-                                    print('\tERROR: Failed to create brain-extracted image')
-
-                                
-                        if os.path.join(sourceDir,basename + '.json') in source_fileList:
-                            if override or not os.path.isfile(baseOutput + '.json'):
-                                shutil.move(os.path.join(sourceDir,basename + '.json'), baseOutput + '.json')
-                                d={}
-                                d['fullpath'] = os.path.join(sourceDir,basename + '.json')
-                                # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                                ls_updatedFiles.append(baseOutput + '.json')
-                                if progress:
-                                    print('\t\t\tcopying ' + os.path.join(sourceDir,basename + '.json') + ' to ' + baseOutput + '.json')
-
-                                #check if additional keys are needed
-                                b_mod = False
-                                with open(baseOutput + '.json', 'r') as j:
-                                    imgHeader = json.load(j)
-
-
-                                #fMRI modifiers
-                                for k in ['SliceTiming',
-                                          'TaskName',
-                                          'Units']:
-                                    if k in scanKeys.keys():
-                                        imgHeader[k] = scanKeys[k]
-                                        b_mod = True
-
-                                #general modifiers
-                                if 'PhaseEncodingDirection' in scanKeys.keys():
-                                    imgHeader['PhaseEncodingDirection'] = scanKeys['PhaseEncodingDirection']
-                                    b_mod = True
-                                elif 'PhaseEncodingAxis' in imgHeader.keys():
-                                    imgHeader['PhaseEncodingDirection'] = imgHeader.pop('PhaseEncodingAxis')
-                                    b_mod = True
-
-                                if 'EstimatedEffectiveEchoSpacing' in imgHeader.keys():
-                                    imgHeader['EffectiveEchoSpacing'] = imgHeader.pop('EstimatedEffectiveEchoSpacing')
-                                    b_mod = True
-
-                                if 'EstimatedTotalReadoutTime' in imgHeader.keys():
-                                    imgHeader['TotalReadoutTime'] = imgHeader.pop('EstimatedTotalReadoutTime')
-                                    b_mod = True
-                                    
-
-                                #B0 map modifiers
-                                if 'B0FieldSource' in scanKeys.keys():
-                                    imgHeader['B0FieldSource'] = f"{scanKeys['B0FieldSource']}_{st.subject.sesNum}"
-                                    b_mod = True
-
-                                if 'B0FieldIdentifier' in scanKeys.keys():
-                                    imgHeader['B0FieldIdentifier'] = f"{scanKeys['B0FieldIdentifier']}_{st.subject.sesNum}"
-                                    b_mod = True
-
-                                #ASL modifiers
-                                for k in ["ArterialSpinLabelingType",
-                                          "M0Type",
-                                          "TotalAcquisitionPairs",
-                                          "LabelingDuration",
-                                          "PostLabelingDelay",
-                                          "RepetitionTimePreparation",
-                                          "BackgroundSuppression",
-                                          "BackgroundSuppressionNumberPulses",
-                                          "BackgroundSuppressionPulseTime",
-                                          "VascularCrushing",
-                                          "LabelingEfficiency",
-                                          "LabelingPulseAverageGradient",
-                                          "LabelingPulseMaximumGradient",
-                                          "LabelingPulseAverageB1",
-                                          "LabelingPulseDuration",
-                                          "LabelingPulseInterval"
-                                          ]:
-                                    if k in scanKeys.keys():
-                                        imgHeader[k] = scanKeys[k]
-                                        b_mod = True
-
-                                    if b_mod and os.path.isfile(os.path.join(st.creds.dataDir,'code','aslcontext.tsv')) and 'asl.json' in f"{baseOutput}.json":
-                                        shutil.copyfile(os.path.join(st.creds.dataDir,'code','aslcontext.tsv'),baseOutput.replace('_asl','_aslcontext.tsv'))
-                            
-
-                                #write modified JSON sidecar
-                                if b_mod:
-                                    with open(baseOutput + '.json', 'w') as j:
-                                        json.dump(imgHeader, j, indent='\t', sort_keys=True)
-                                
-                        if os.path.join(sourceDir,basename + '.txt') in source_fileList:
-                            if override or not os.path.isfile(baseOutput + '.txt'):
-                                shutil.move(os.path.join(sourceDir,basename + '.txt'), baseOutput + '.txt')
-                                d={}
-                                d['fullpath'] = os.path.join(sourceDir,basename + '.txt')
-                                # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                                ls_updatedFiles.append(baseOutput + '.txt')
-                                if progress:
-                                    print('\t\t\tcopying ' + os.path.join(sourceDir,basename + '.txt') + ' to ' + baseOutput + '.txt')
-
-                            #also copy bval and bvec files for DWI
-                            if 'dwi' in scanName and not 'FA' in scanName:
-                                if os.path.join(sourceDir,basename + '.bval') in source_fileList:
-                                    if override or not os.path.isfile(baseOutput + '.bval'):
-                                        shutil.move(os.path.join(sourceDir,basename + '.bval'),baseOutput + '.bval')
-                                        shutil.move(os.path.join(sourceDir,basename + '.bvec'),baseOutput + '.bvec')
-                                        d={}
-                                        d['fullpath'] = [os.path.join(sourceDir,basename + '.bvec'), os.path.join(sourceDir,basename + '.bvec')]
-                                        # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                                        # os.rename(os.path.join(inDir,basename + '.bval'),baseOutput + '.bval')
-                                        # os.rename(os.path.join(inDir,basename + '.bvec'),baseOutput + '.bvec')
-                                        # os.system("cp " + os.path.join(inDir,basename + '.bval') + " " + baseOutput + ".bval")
-                                        # os.system("cp " + os.path.join(inDir,basename + '.bvec') + " " + baseOutput + ".bvec")
-                                        ls_updatedFiles.append(baseOutput + '.bval')
-                                        ls_updatedFiles.append(baseOutput + '.bvec')
-                                        if progress:
-                                            print('\t\t\tcopying ' + os.path.join(sourceDir,basename + '.bval') + ' to ' + baseOutput + '.bval')
-                                            print('\t\t\tcopying ' + os.path.join(sourceDir,basename + '.bvec') + ' to ' + baseOutput + '.bvec')
-
-
-                # elif ext == 'rda' or ext == '7':
-                #     tmp_outDir = os.path.join(outDir,'sub-' + subjectName,'sess-' + sessionNum)
-                #     if not os.path.isdir(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir)):
-                #         os.makedirs(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
-                #         if progress:
-                #             print('\t\t\tcreating output directory ' + tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
-
-                #     tmp_outDir = os.path.join(tmp_outDir,'svs')
-                #     if not os.path.isdir(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir)):
-                #         os.makedirs(tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
-                #         if progress:
-                #             print('\t\t\tcreating output directory ' + tmp_outDir.replace('s3://' + creds.bucket,creds.s3_dir))
-
-                #     #move associated rda, log, or .7 file file
-                #     if progress:
-                #         print('\t\tprocessing: ' + os.path.join(inDir,basename) + ' scan type: ' + ext)
-
-                #     get_spec_base(os.path.join(inDir,basename + '.' + ext),creds)
-                #     # os.rename(os.path.join(inDir,basename + '.' + ext),os.path.join(outDir,subjectName,'SESSION_' + sessionNum,basename + '.' + ext))
-                #     outFile = os.path.join(tmp_outDir,subjectName + '_SESS' + sessionNum + '_acq-' + specBase.spectraType + '-' + specBase.spectraName + '_svs.' + ext)
-                #     if override or not os.path.isfile(outFile.replace('s3://' + creds.bucket,creds.s3_dir)):
-                #         os.system('aws s3 cp ' + os.path.join(inDir.replace(creds.s3_dir,'s3://' + creds.bucket),basename + '.' + ext) + ' ' + outFile)
-                #         # os.system("cp " + os.path.join(inDir,basename + '.' + ext) + " " + outFile)
-                #         ls_updatedFiles.append(outFile)
-                #         if progress:
-                #             print('\t\t\tcopying ' + ext + ' file ' + outFile)
-                #     else:
-                #         if progress:
-                #             print('\t\t\tskipping file ' + os.path.join(inDir,basename + '.' + ext))
-                #         ls_existingFiles.append(os.path.join(inDir,basename + '.' + ext))
-
-                elif ext in ['log','xdf']:
-                    tmp_outDir = os.path.join(os.path.join(outDir,'sub-' + st.subject.id,'ses-' + st.subject.sesNum,'beh'))
-                    if not os.path.isdir(tmp_outDir):
-                        os.makedirs(tmp_outDir)
-                        if progress:
-                            print('\t\t\tcreating output directory ' + tmp_outDir)
-
-                    #move associated rda, log, or .7 file file
+            #create directory if is does not exist
+            for outDir in d_item['dirs']:
+                if not os.path.isdir(outDir):
+                    os.makedirs(outDir)
                     if progress:
-                        print('\t\tprocessing: ' + os.path.join(sourceDir,basename) + ' scan type: ' + ext)
-                    if override or not os.path.isfile(os.path.join(tmp_outDir,basename + '.' + ext)):
-                        outFile = os.path.join(tmp_outDir, basename + '.' + ext)
-                        shutil.move(os.path.join(sourceDir,basename + '.' + ext),outFile)
-                        d={}
-                        d['fullpath'] = os.path.join(sourceDir,basename + '.' + ext)
-                        # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                        ls_updatedFiles.append(outFile)
-                        if progress:
-                            print('\t\t\tcopying ' + ext + ' file ' + outFile)
-                    else:
-                        if progress:
-                            print('\t\t\tskipping file ' + os.path.join(sourceDir,basename + '.' + ext))
-                        ls_existingFiles.append(os.path.join(sourceDir,basename + '.' + ext))
-
-                elif ext == 'txt' and not os.path.join(sourceDir,basename + '.json') in source_fileList:
-                    tmp_outDir = os.path.join(outDir,'sub-' + st.subject.id,'ses-' + st.subject.sesNum,'beh')
-                    if not os.path.isdir(tmp_outDir):
-                        os.makedirs(tmp_outDir)
-                        if progress:
-                            print('\t\t\tcreating output directory ' + tmp_outDir)
-
-                    #move associated rda, log, or .7 file file
+                        print('\t\t\tcreating output directory ' + outDir)
+
+            #move associated json, txt, nii.gz, bval/bvec and beh files
+            for src, dst in d_item['moves']:
+                shutil.move(src, dst)
+                ls_movedFiles.append(src)
+                ls_updatedFiles.append(dst)
+                if progress:
+                    print('\t\t\tcopying ' + src + ' to ' + dst)
+
+            #add scan_id.json keys to the sidecar
+            if d_item['sidecar']:
+                update_sidecar(d_item['sidecar'][0],d_item['sidecar'][1],d_plan['session'])
+
+            #queue antspynet BET if T1w image (served by run_antspynet_bet.py --queue bet)
+            if d_item['bet']:
+                try:
+                    inFile, outFile = d_item['bet']
+                    reqId = st.spool.SpoolQueue(BET_QUEUE).put({'input': inFile, 'output': outFile, 'modality': 't1', 'project': st.creds.project})
                     if progress:
-                        print('\t\tprocessing: ' + os.path.join(sourceDir,basename) + ' scan type: ' + ext)
-                    if override or not os.path.isfile(os.path.join(tmp_outDir,basename + '.' + ext)):
-                        outFile = os.path.join(tmp_outDir,basename + '.' + ext)
-                        shutil.move(os.path.join(sourceDir,basename + '.' + ext),outFile)
-                        d={}
-                        d['fullpath'] = os.path.join(sourceDir,basename + '.' + ext)
-                        # st.mysql.sql_table_remove(st.creds.searchSourceTable,d)
-                        ls_updatedFiles.append(outFile)
-                        if progress:
-                            print('\t\t\tcopying ' + ext + ' file ' + outFile)
-                    else:
-                        if progress:
-                            print('\t\t\tskipping file ' + os.path.join(sourceDir,basename + '.' + ext))
-                        ls_existingFiles.append(os.path.join(sourceDir,basename + '.' + ext))
+                        print(f'\tQueued brain-extracted image: ' + outFile + ' (request ' + reqId + ')')
+                except Exception as e:
+                    traceback.print_exc()
+                    print('\tERROR: Failed to queue brain-extracted image')
 
         #catch any errors
         except Exception as e:
+            basename = os.path.basename(d_item['source'])
             print('ERROR: ' + basename + ' ', end='')
             print(e)
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -444,6 +460,26 @@ def process_single_dir(inDir,progress,override):
                 txtFile.write(str(e))
                 txtFile.write('\n')
 
+    return ls_updatedFiles,d_plan['ls_existingFiles'],ls_movedFiles
+
+
+# ******************* PROCESS SINGLE DIRECTORY ********************
+def process_single_dir(inDir,progress,override):
+    #get time info for verbose option
+    t = time.time()
+    now = datetime.datetime.now()
+
+    #update progress
+    if progress:
+        print("Searching " + inDir + " @" + now.strftime("%m-%d-%Y %H:%M:%S"))
+
+    d_plan = plan_session(inDir,progress,override)
+    if not d_plan:
+        return [],[]
+
+    update_participants([d_plan['subject']])
+    ls_updatedFiles,ls_existingFiles,ls_movedFiles = execute_session_plan(d_plan,progress)
+
     #provide final update
     elapsed_t = time.time() - t
     if progress:
@@ -452,28 +488,99 @@ def process_single_dir(inDir,progress,override):
     return ls_updatedFiles,ls_existingFiles
 
 
+def _organise_session(inDir: str, project: str, progress: bool, override: bool) -> tuple:
+    """
+    Plan and execute a single session inside a worker process.
+
+    :return: inDir, subject identifier, list of created rawdata files, list of skipped existing files, list of moved sourcedata files
+    :rtype: tuple
+    """
+    if st.creds.project != project:
+        st.creds.read(project)
+
+    d_plan = plan_session(inDir,progress,override)
+    if not d_plan:
+        return inDir,None,[],[],[]
+    return (inDir,d_plan['subject']) + execute_session_plan(d_plan,progress)
+
 
 # ******************* PROCESS MULTIPLE DIRECTORIES ********************
-def process_multiple_dir(inDir,progress,override):
-    
+def organise_sessions(ls_dirs: list, progress: bool=False, override: bool=False, max_workers: int=None, catalog: bool=True) -> tuple:
+    """
+    Organise many sourcedata session directories into rawdata across a pool of worker processes.
+    Each worker plans and executes whole sessions. participants.tsv is updated once for every new
+    subject, and the moved files are added to the project's searchTable (and removed from its
+    searchSourceTable) in one catalog update at the end.
+
+    :param ls_dirs: fullpaths to sourcedata sub-*/ses-* directories
+    :type ls_dirs: list
+
+    :param progress: flag to display command line output providing additional details on the processing status, defaults to False
+    :type progress: bool, optional
 
+    :param override: move files even if the rawdata file already exists, defaults to False
+    :type override: bool, optional
+
+    :param max_workers: number of worker processes, defaults to None (number of CPUs)
+    :type max_workers: int, optional
+
+    :param catalog: update the project's catalog tables with the moved files, defaults to True
+    :type catalog: bool, optional
+
+    :return: list of created rawdata files, list of skipped existing files
+    :rtype: tuple
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    t = time.time()
     ls_updatedFiles = []
     ls_existingFiles = []
+    ls_movedFiles = []
+    ls_subjects = []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_organise_session,d,st.creds.project,progress,override): d for d in ls_dirs}
+        for future in as_completed(futures):
+            try:
+                inDir, subject, tmp_ls_updatedFiles, tmp_ls_existingFiles, tmp_ls_movedFiles = future.result()
+            except Exception as e:
+                print(f"ERROR: failed to organise {futures[future]}: {e}")
+                continue
+            if subject:
+                ls_subjects.append(subject)
+            ls_updatedFiles.extend(tmp_ls_updatedFiles)
+            ls_existingFiles.extend(tmp_ls_existingFiles)
+            ls_movedFiles.extend(tmp_ls_movedFiles)
+
+    #single participants.tsv update
+    update_participants(ls_subjects)
+
+    #single catalog update, made in this (parent) process so that it also invalidates this process's query cache
+    if catalog and ls_updatedFiles:
+        try:
+            ls_rows = [st.catalog.get_catalog_entry(f) for f in ls_updatedFiles]
+            st.mysql.sql_table_insert(st.creds.searchTable,{c: [r[i] for r in ls_rows] for i, c in enumerate(st.catalog.FILE_COLUMNS)},progress=progress)
+            st.mysql.sql_table_delete(st.creds.searchSourceTable,paths=ls_movedFiles,progress=progress)
+        except Exception as e:
+            traceback.print_exc()
+            print('\tERROR: failed to update the catalog tables, run connect_neuro_db_update.py to resynchronize')
+
+    if progress:
+        print(f"organised {len(ls_dirs)} sessions ({len(ls_updatedFiles)} files) in {time.time() - t:.1f} seconds")
+
+    return ls_updatedFiles,ls_existingFiles
+
+
+def process_multiple_dir(inDir,progress,override,max_workers=None,catalog=True):
+    
 
     #loop over all session directories that you can find
     # source_dirsToProcess = st.mysql.sql_query_dirs(regex='acq-',source=True,progress=True)#,inclusion=incExcDict['inclusion'],exclusion=incExcDict['exclusion'])
     source_dirsToProcess = [path for path in glob(os.path.join(inDir,'sub-*','ses-*')) if os.path.isdir(path)]
-    a = [x for x in source_dirsToProcess]
-    a = sorted(list(set(a)))
+    a = sorted(set(x for x in source_dirsToProcess if 'ses-' in x))
     #a=sorted([x[0] for x in os.walk(inDir) if 'ses' in os.path.basename(x[0])])
 
-    for item in a:
-        if 'ses-' in item:
-            tmp_ls_updatedFiles,tmp_ls_existingFiles = process_single_dir(item,progress,override)
-            ls_existingFiles.extend(tmp_ls_existingFiles)
-            ls_updatedFiles.extend(tmp_ls_updatedFiles)
-
-    return ls_updatedFiles,ls_existingFiles
+    return organise_sessions(a,progress,override,max_workers=max_workers,catalog=catalog)
 
 
 # *******************  MAIN  ******************** 
@@ -500,7 +607,7 @@ if __name__ == '__main__':
 
     #loop over all tables
     if not options.IN_DIR:
-        ls_updatedFiles,ls_existingFiles = process_multiple_dir(os.path.join(st.creds.dataDir,'sourcedata'),options.progress,options.OVERWRITE)
+        ls_updatedFiles,ls_existingFiles = process_multiple_dir(os.path.join(st.creds.dataDir,'sourcedata'),options.progress,options.OVERWRITE,max_workers=options.WORKERS,catalog=options.CATALOG)
     else:
         ls_updatedFiles,ls_existingFiles = process_single_dir(options.IN_DIR,options.progress,options.OVERWRITE)
         #print("Successfully updated " + sqlTable + "\n\tTotal time: " + str(elapsed_t) + " seconds\n\n")
@@ -4,15 +4,19 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 28 Dec 2020
 #
+# v2.2.1 on 18 Oct 2026 - check new series for existing outputs before converting, record conversions without outputs as failed
+# v2.2.0 on 18 Oct 2026 - conversion manifest: one sourcedata walk computes the to-do set (new, changed and unconverted series) instead of a catalog query per directory
 # v2.0.0 on 1 April 2023
 # v1.1.2  on 25 Oct 2021 Modification (1.1.2) - add inclusion of *_dcm2nii_input.json for input parameters
 # v1.1.1 on 16 Sept 2021 Modification (1.1.1) - remove checking local scratch disk for output using glob: unncessary with direct s3 mount
 # v1.1.0 11 Jan 2021 Modification (1.1.0)- add utilization of instance_ids.json
 
 import os
+import re
 import argparse
 from pycondor import Dagman
 import datetime
+import time
 import sys
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
 # from json import loads
@@ -26,8 +30,8 @@ import wsuconnect.support_tools as st
 
 # GLOBAL INFO
 #versioning
-VERSION = '2.1.0'
-DATE = '14 Nov 2024'
+VERSION = '2.2.1'
+DATE = '18 Oct 2026'
 
 
 
@@ -37,11 +41,64 @@ parser.add_argument('-p','--project', required=True, action="store", dest="PROJE
 parser.add_argument('--overwrite', action="store_true", dest="OVERWRITE", help="Force conversion by skipping directory and database checking", default=False)
 parser.add_argument('--docker', action="store_true", dest="DOCKER", help="Submit conversion to HTCondor and process in wsuconnect/neuro docker container [default=False]", default=False)
 parser.add_argument('-s', '--submit', action="store_true", dest="SUBMIT", help="Submit conversion to condor for parallel conversion", default=False)
+parser.add_argument('--rebuild-manifest', action="store_true", dest="REBUILD", help="Discard the conversion manifest and rebuild it from the NIfTI images on disk and in the searchTable", default=False)
+parser.add_argument('--submitted-max-age', action="store", type=float, dest="SUBMITTED_MAX_AGE", help="hours to wait for the outputs of a directory submitted to HTCondor on an earlier run before submitting it again (default 24)", default=24.0)
 parser.add_argument('-v', '--version', action="store_true", dest="version", help="Display the current version")
 parser.add_argument('--progress', action="store_true", dest="progress", help="Show progress (default FALSE)", default=False)
 
 
 
+# ******************* CONVERSION OUTPUTS ********************
+def get_outputs(acqDir: str) -> list:
+    """
+    dcm2niix outputs of an acquisition directory that are still in sourcedata. convert_dicoms names its outputs
+    after the acquisition directory (%f_%z_%s) and writes them to the directory containing it.
+
+    :param acqDir: fullpath to a sourcedata acquisition (acq-*) directory
+    :type acqDir: str
+
+    :return: fullpaths to the output files
+    :rtype: list
+    """
+    prefix = os.path.basename(acqDir) + '_'
+    try:
+        with os.scandir(os.path.dirname(acqDir)) as it:
+            return sorted(e.path for e in it if e.name.startswith(prefix) and e.is_file(follow_symlinks=False))
+    except OSError:
+        return []
+
+
+def get_converted_sessions() -> dict:
+    """
+    NIfTI images already organised into rawdata, grouped by session, from a single query of the project's searchTable.
+
+    :return: {'rawdata/sub-<id>/ses-<session>': [NIfTI fullpaths]}
+    :rtype: dict
+    """
+    reSession = re.compile(r'rawdata/sub-[^/]+/ses-[^/]+')
+    d_sessions = {}
+    for f in st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,returncol='fullpath',searchcol='fullpath',regex='nii.gz',inclusion='rawdata'):
+        m = reSession.search(f)
+        if m and not f.endswith(os.path.sep):
+            d_sessions.setdefault(m.group(0),[]).append(f)
+    return d_sessions
+
+
+def get_session_key(acqDir: str) -> str:
+    """
+    rawdata session directory (relative to the project) that an acquisition directory is organised into.
+
+    :param acqDir: fullpath to a sourcedata acquisition (acq-*) directory
+    :type acqDir: str
+
+    :return: rawdata/sub-<id>/ses-<session>
+    :rtype: str
+    """
+    st.subject.get_id(acqDir)
+    return os.path.join('rawdata','sub-' + st.subject.id,'ses-' + str(st.subject.sesNum))
+
+
+
 # ******************* MAIN ********************
 if __name__ == '__main__':
     """
@@ -50,6 +107,7 @@ if __name__ == '__main__':
     #read crendentials from $SCRATCH_DIR/instance_ids.json
     ls_updatedFiles = []
     ls_existingFiles = []
+    ls_pendingFiles = []
 
     #get and evaluate options
     options = parser.parse_args()
@@ -67,11 +125,70 @@ if __name__ == '__main__':
     
     st.creds.read(options.PROJECT)
 
-    # find all directories to process
-    source_dirsToProcess = sorted([x[0] for x in os.walk(os.path.join(st.creds.dataDir,'sourcedata')) if 'acq-' in os.path.basename(x[0])])
-    source_dirsToProcess = list(set(source_dirsToProcess))
+    #read the conversion manifest, an empty manifest is rebuilt from the images on disk and in the searchTable
+    manifestFile = st.catalog.get_conversion_manifest_file(st.creds.dataDir,st.creds.project)
+    d_manifest = {} if options.REBUILD else st.catalog.load_checkpoint(manifestFile)
+    bootstrap = not d_manifest
 
+    # find all directories to process (single walk of sourcedata)
+    d_found = st.catalog.find_conversion_dirs(os.path.join(st.creds.dataDir,'sourcedata'),d_manifest,progress=options.progress)
+    d_newManifest = {}
+    d_sessions = None
     now = datetime.datetime.today().strftime('%Y%m%d_%H%M')
+
+    #compute the to-do set
+    ls_todo = []
+    for source_singleDir in sorted(d_found):
+        d_dir = d_found[source_singleDir]
+        prev = d_manifest.get(source_singleDir,{})
+        d_entry = {'n_dicoms': d_dir['n_dicoms'], 'fingerprint': d_dir['fingerprint'], 'dirs': d_dir['dirs'],
+                   'status': prev.get('status'), 'outputs': prev.get('outputs',[]), 'updated': prev.get('updated'), 'submitted': prev.get('submitted')}
+
+        if d_dir['n_dicoms'] == 0:
+            if options.progress:
+                print('No DICOM images: Skipping ' + source_singleDir)
+            continue
+
+        b_pending = False
+        if options.OVERWRITE:
+            reason = 'overwrite'
+        elif d_dir['state'] == 'changed':
+            reason = f"gained {d_dir['gained']} DICOM images" if d_dir['gained'] > 0 else 'DICOM images changed'
+        elif prev.get('status') == 'converted':
+            reason = None
+        else:
+            #new series (e.g. already converted by connect_pacs_dicom_grabber.py), rebuilding the manifest, or
+            #submitted to condor on an earlier run: look for the outputs
+            ls_outputs = get_outputs(source_singleDir)
+            if not ls_outputs:
+                if d_sessions is None:
+                    d_sessions = get_converted_sessions()
+                ls_outputs = d_sessions.get(get_session_key(source_singleDir),[])
+            if ls_outputs:
+                reason = None
+                d_entry.update(status='converted',outputs=ls_outputs,updated=now)
+            elif prev.get('status') == 'submitted' and time.time() - (prev.get('submitted') or 0) < options.SUBMITTED_MAX_AGE * 3600:
+                #condor job still queued or running, do not submit a duplicate
+                reason = None
+                b_pending = True
+                ls_pendingFiles.append(source_singleDir)
+                if options.progress:
+                    print('Conversion submitted ' + str(prev.get('updated')) + ', waiting for outputs: Skipping ' + source_singleDir)
+            else:
+                reason = 'new series' if d_dir['state'] == 'new' and not bootstrap else 'not converted'
+
+        d_newManifest[source_singleDir] = d_entry
+        if b_pending:
+            continue
+        if reason:
+            ls_todo.append(source_singleDir)
+            if options.progress:
+                print('Converting (' + reason + '): ' + source_singleDir)
+        else:
+            ls_existingFiles.append(source_singleDir)
+            if options.progress:
+                print('NIfTI Images Found: Skipping ' + source_singleDir)
+
     if options.SUBMIT or options.DOCKER:
 
         #splitDirs = source_dirsToProcess[0].split('/')
@@ -115,48 +232,38 @@ if __name__ == '__main__':
 
 
     #convert each directory
-    source_dirsToProcess.sort()
-    for source_singleDir in source_dirsToProcess:
-        # source_singleDir = source_singleDir.replace(creds.s3_prefix + '/','')
-        if not options.OVERWRITE:
-            #check output_dir for niftis on both sql db (processed_data) and local dir (optional override flag)
-            subjectName,sessionNum = st.get_dir_identifiers(source_singleDir) #get subject name from filename
-
-            #check processed_data directory for nifti images
-            processedDataOutput = os.path.join('rawdata','sub-' + subjectName,'ses-' + sessionNum)#create base path and filename for move
-            processedFlag = st.mysql.sql_query_dir_check('nii.gz',processedDataOutput,False)
-
-            #continue if no files in processed_data directory for given subject/session
-            if processedFlag:
-                ls_existingFiles.append(source_singleDir)
-                if options.progress:
-                    print('NIfTI Images Found: Skipping ' + source_singleDir)
-            else:
-
-                #convert dicoms to nifti files
-                ls_updatedFiles.append(source_singleDir)
-                if not options.SUBMIT and not options.DOCKER:  
-                    st.convert_dicoms(source_singleDir,options.progress)
-                else:
-                    str_args = '-i ' + source_singleDir
-                    if options.progress:
-                        str_args += ' --progress'
-                    job_dcm2nii.add_arg(str_args)
-                    if options.progress:
-                        print('Added directory to conversion queue ' + source_singleDir)               
-                    
-
-        else: #overwrite
+    try:
+        for source_singleDir in ls_todo:
             ls_updatedFiles.append(source_singleDir)
             if not options.SUBMIT and not options.DOCKER:
-                st.convert_dicoms(source_singleDir,options.progress)
+                try:
+                    st.convert_dicoms(source_singleDir,progress=options.progress)
+                except Exception as e:
+                    print('ERROR: conversion failed for ' + source_singleDir + ': ' + str(e))
+                    d_newManifest[source_singleDir].update(status='failed',outputs=[],updated=now)
+                    continue
+                ls_outputs = get_outputs(source_singleDir)
+                if not ls_outputs:
+                    print('ERROR: conversion produced no NIfTI images for ' + source_singleDir)
+                    d_newManifest[source_singleDir].update(status='failed',outputs=[],updated=now)
+                    continue
+                d_newManifest[source_singleDir].update(status='converted',outputs=ls_outputs,updated=now)
             else:
-                job_dcm2nii.add_arg('-i ' + source_singleDir + ' --progress')
-        
-    if options.SUBMIT or options.DOCKER:
-        # job_sleep.add_child(job_dcm2nii)
-        # job_dcm2nii.add_child(job_stop) - Can I force this requirement on the MASTER?
-        dagman.build_submit()
+                str_args = '-i ' + source_singleDir
+                if options.progress:
+                    str_args += ' --progress'
+                job_dcm2nii.add_arg(str_args)
+                d_newManifest[source_singleDir].update(status='submitted',outputs=[],updated=now,submitted=time.time())
+                if options.progress:
+                    print('Added directory to conversion queue ' + source_singleDir)
+
+        if options.SUBMIT or options.DOCKER:
+            # job_sleep.add_child(job_dcm2nii)
+            # job_dcm2nii.add_child(job_stop) - Can I force this requirement on the MASTER?
+            dagman.build_submit()
+    finally:
+        #directories that are no longer in sourcedata are dropped from the manifest
+        st.catalog.save_checkpoint(manifestFile,d_newManifest)
 
     #write conversion lists to file
     print('\n\n NIfTI conversion COMPLETE: Please check')
@@ -172,5 +279,7 @@ if __name__ == '__main__':
     with open(outputTxt,'w') as txtFile:
         txtFile.writelines("%s\n" % l for l in ls_existingFiles)
     print('\t' + outputTxt)
+    print('\t' + manifestFile)
+    if ls_pendingFiles:
+        print('\t' + str(len(ls_pendingFiles)) + ' directories are waiting for the outputs of an earlier HTCondor submission')
     
-
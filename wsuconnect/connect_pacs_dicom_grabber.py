@@ -4,7 +4,19 @@
 # Created by Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 31 Jan 2023
 #
-# Last Modified on 5 July 2024 - add removal of processed participants from the PACS database
+# Last Modified on 18 Oct 2026 - reconcile mri_tracking with one query and one bulk upsert per batch of studies
+# Modified on 18 Oct 2026 - hold a per-session lock across conversion and the BIDS stage of a series
+# Modified on 18 Oct 2026 - changes mode: skip changes of deleted resources (HTTP 404), give up on a change after --changes-max-retries attempts
+# Modified on 18 Oct 2026 - finalize a patient only after a patient quiet period (--patient-quiet-period) and once Orthanc reports it stable
+# Modified on 18 Oct 2026 - disable the query cache in the daemon, its workers write to the catalog
+# Modified on 18 Oct 2026 - Orthanc /changes consumer mode (--source changes) with a persisted sequence number
+# Modified on 18 Oct 2026 - clear patients from Orthanc with RestToolbox.OrthancClient (one listing request, concurrent deletes)
+# Modified on 18 Oct 2026 - persistent SQLite ingest journal, resume unfinished series after a restart
+# Modified on 18 Oct 2026 - stage series by hard link/rename (checksummed copy across filesystems), never exposing a partial series
+# Modified on 18 Oct 2026 - convert series in a bounded process pool with per-stage (copy, convert, bids, insert) timing
+# Modified on 18 Oct 2026 - inotify/scandir watcher with a per-patient quiet period, series are converted in the background as they complete
+# Modified on 18 Oct 2026 - read DICOM headers only (no pixel data), group files by series and update mri_tracking once per study
+# Modified on 5 July 2024 - add removal of processed participants from the PACS database
 # Modified on 11 June 2024 - changes to allow for the acceptance of classic DICOMs
 # Modified on 28 Feb 2023 - slight changes to grab path of script automatically 
 
@@ -18,11 +30,12 @@ import pandas as pd
 import shutil
 import time as tm
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta, time
 #versioning
-VERSION = '4.0.1'
-DATE = '25 October 2024'
+VERSION = '4.6.1'
+DATE = '18 Oct 2026'
 
 
 # ******* LOCAL IMPORTS ******
@@ -43,6 +56,24 @@ os.system('FSLDIR=' + os.environ["FSLDIR"])
 #input argument parser
 parser = argparse.ArgumentParser('This program monitors a source directory (/PACS_ms) for new files (DICOM), determines the associated project and subject information, moves the files to the target sourcedata directory, converts to NIfTI, and creates the rawdata directory according to BIDS structure.')
 parser.add_argument('-v', '--version', action="store_true", dest="version", help="Display the current version")
+parser.add_argument('-s', '--source', action="store", dest="SOURCE", choices=['watch','changes'], help="watch: ingest files written to /PACS_m2 (default). changes: ingest series reported stable on the Orthanc /changes feed, downloading their archives directly", default='watch')
+parser.add_argument('--changes-interval', action="store", type=float, dest="CHANGES_INTERVAL", help="seconds between /changes requests while idle in changes mode (default 5)", default=5.0)
+parser.add_argument('--changes-max-retries', action="store", type=int, dest="CHANGES_MAX_RETRIES", help="attempts to queue a change in changes mode before it is logged and skipped (default 5), changes whose resource no longer exists (HTTP 404) are skipped immediately", default=5)
+parser.add_argument('-q', '--quiet-period', action="store", type=float, dest="QUIET_PERIOD", help="seconds without a new file before a series is considered complete (default 30)", default=30.0)
+parser.add_argument('--patient-quiet-period', action="store", type=float, dest="PATIENT_QUIET_PERIOD", help="seconds without a new file for any series of a patient, and with the patient reported stable by Orthanc, before the patient is finalized and removed from PACS (default 240)", default=240.0)
+parser.add_argument('--quiet-period-override', action="append", nargs=2, metavar=('NAME','SECONDS'), dest="QUIET_OVERRIDES", help="quiet period for a specific patient (PatientName family name) or project, may be repeated", default=None)
+parser.add_argument('--watch-mode', action="store", dest="WATCH_MODE", choices=['auto','inotify','poll'], help="detect new files with inotify or by polling the drop folder with os.scandir (default auto, inotify when available). inotify does not see files written by other hosts over NFS.", default='auto')
+parser.add_argument('-n', '--workers', action="store", type=int, dest="WORKERS", help="number of series converted in parallel (default half of the available cores)", default=None)
+parser.add_argument('--queue-size', action="store", type=int, dest="QUEUE_SIZE", help="number of complete series that may wait for a free worker before new series are held back (default 2 x workers)", default=None)
+parser.add_argument('--staging', action="store", dest="STAGING", choices=['auto','link','move','copy'], help="how files are staged into sourcedata: hard link or rename when /PACS_m2 and the project share a filesystem, otherwise a checksummed copy (default auto, link where possible)", default='auto')
+parser.add_argument('--journal', action="store", dest="JOURNAL", help="fullpath to the SQLite ingest journal used to resume after a restart, must be on a local filesystem (default /var/lib/connect/connect_pacs_dicom_grabber.sqlite)", default='/var/lib/connect/connect_pacs_dicom_grabber.sqlite')
+parser.add_argument('--retry-failed', action="store_true", dest="RETRY_FAILED", help="on startup, also resume series that stopped with an error", default=False)
+parser.add_argument('--metrics', action="store_true", dest="METRICS", help="print throughput and backlog metrics from the journal and exit", default=False)
+parser.add_argument('--metrics-window', action="store", type=float, dest="METRICS_WINDOW", help="seconds to compute --metrics throughput over (default 3600)", default=3600.0)
+parser.add_argument('--poll-interval', action="store", type=float, dest="POLL_INTERVAL", help="seconds between drop folder scans in poll mode (default 2)", default=2.0)
+
+#DICOM header elements required to route a file, all other elements and the pixel data are not read
+DICOM_TAGS = ['PatientName', 'StudyDate', 'StudyInstanceUID', 'SeriesInstanceUID', 'AcquisitionNumber', 'SeriesTime', 'ProtocolName', 'AcquisitionTime', 'AcquisitionDuration']
  
 
 
@@ -86,366 +117,900 @@ def write_log(string_to_write):
 
 
 
-# ******************* MAIN ********************
-def main():
+def read_dicom_header(filepath: str) -> pydicom.Dataset:
     """
-    The cli entry point of this program.
+    Read the header elements listed in DICOM_TAGS from a DICOM file, stopping before the pixel data.
+
+    :param filepath: fullpath to the DICOM file
+    :type filepath: str
+
+    :raises pydicom.errors.InvalidDicomError: file is not a DICOM file
+
+    :return: DICOM header containing only the requested elements
+    :rtype: pydicom.Dataset
     """
-    from wsuconnect.data import load as load_data
-    from json import loads
-    startDateTime = datetime.now()
-    # lastUpdateTime = datetime.datetime.now()
-    write_log('PACS data grabber now runing @ ' + startDateTime.strftime('%m%d%Y %H:%M:%S'))
-    write_log('Checking /PACS_m2 for new files...')
+    return pydicom.dcmread(filepath, stop_before_pixels=True, specific_tags=DICOM_TAGS)
 
-    #get and evaluate options
-    # options = parse_arguments()
-    dcmPath = "/PACS_m2"
-    URL = 'http://10.11.0.31:8042'
 
-    #get start time/date of code
-    df_dir = pd.DataFrame(columns=['project','inDir'])
-    df_procData = pd.DataFrame()
-    ls_rawDcm = []
-    ls_pacsFiles = []
-    ls_dirs = []
-    ls_patientNames = []
-    continueFlag = True
+def get_series_info(dcmHdr: pydicom.Dataset, projectIDs: dict) -> dict:
+    """
+    Determine the project, subject, session and sourcedata acquisition directory of a DICOM series.
 
+    Patient names are formatted as '<project> <subject> [<session>]'. When the session is not
+    included, the study date is used as the session identifier.
 
-    projectIDs = loads(load_data.readable('credentials.json').read_text())
+    :param dcmHdr: DICOM header of any file in the series
+    :type dcmHdr: pydicom.Dataset
 
+    :param projectIDs: contents of credentials.json
+    :type projectIDs: dict
 
-    # Loop over directory recursively
-    writeLoopFlag = True
+    :raises ValueError: project or its dataDir not found in credentials.json
 
-    while True:
-        loopFlag = False
-        tm.sleep(30)
-        for root, dirs, files in os.walk(dcmPath, topdown=True):
-            
-            for filename in files:
+    :return: dictionary with keys seriesUID, family_name, project, subject, session, date and dcmDir
+    :rtype: dict
+    """
+    family_name = dcmHdr.PatientName.family_name
+    patientNameSplit = family_name.split()
 
-                # check if file is in exception list
-                currentDateTime = datetime.now()
+    # update destination path
+    if patientNameSplit[0] in projectIDs:
+        if 'dataDir' in projectIDs[patientNameSplit[0]]:
+            tmp_destBasePath = projectIDs[patientNameSplit[0]]['dataDir']
+        else:
+            raise ValueError('dataDir not found in credentials.json for project ' + patientNameSplit[0])
+    else:
+        raise ValueError('Project ' + patientNameSplit[0] + ' not found in credentials.json')
+    tmp_destBasePath = os.path.join(tmp_destBasePath,'sourcedata')
+
+    if len(patientNameSplit) >= 3:
+        session = 'ses-' + patientNameSplit[2]
+    else:
+        session = 'ses-' + dcmHdr.StudyDate
+
+    # Format Destination Directory Path
+    dcmDir = os.path.join(tmp_destBasePath,
+                          'sub-' + patientNameSplit[1],
+                          session,
+                          'acq-%02d_%d_%s' % (int(dcmHdr.AcquisitionNumber), int(float(dcmHdr.SeriesTime)), dcmHdr.ProtocolName))
+
+    return {'seriesUID': str(dcmHdr.SeriesInstanceUID),
+            'family_name': family_name,
+            'project': patientNameSplit[0],
+            'subject': 'sub-' + patientNameSplit[1],
+            'session': session,
+            'date': f"{dcmHdr.StudyDate[:4]}-{dcmHdr.StudyDate[4:6]}-{dcmHdr.StudyDate[6:]}",
+            'dcmDir': dcmDir.replace(' ','_')}
+
+
+def dicom_time_to_timedelta(value: str) -> timedelta:
+    """
+    Convert a DICOM TM value (HHMMSS.FFFFFF) to a timedelta since midnight.
 
-                # if not ls_dirs:
-                if writeLoopFlag:
-                    write_log('\tcopying new batch of files [' + str(len(dirs)) + '] @ ' + currentDateTime.strftime('%m%d%Y %H:%M:%S'))
-                    writeLoopFlag = False
-                loopFlag = True
+    :param value: DICOM time string
+    :type value: str
 
-                try:
-                    # Create input file path and read file
-                    inFilePath = os.path.join(root,filename)
-                
-                    #try to read dicom header 
-                    dcmHdr = pydicom.dcmread(inFilePath)
-
-                    # Split patient name into IRB protocol number and subject number
-                    if not dcmHdr.PatientName.family_name in df_procData.keys():
-                        df_procData[dcmHdr.PatientName.family_name] = {
-                            'ls_rawDcm': [],
-                            'project': '',
-                            'sourcedataDir': '',
-                            'ls_inDir': [],
-                            'stableFlag': False,
-                            'continueFlag': False
-                        }
-                    patientNameSplit = dcmHdr.PatientName.family_name.split()
-                    if not df_procData[dcmHdr.PatientName.family_name]['project']:
-                        df_procData[dcmHdr.PatientName.family_name]['project'] = patientNameSplit[0]
-                    
-                    # update destination path
-                    if patientNameSplit[0] in projectIDs:
-                        if 'dataDir' in projectIDs[patientNameSplit[0]]:
-                            tmp_destBasePath = projectIDs[patientNameSplit[0]]['dataDir']
-                        else:
-                            raise ValueError('dataDir not found in credentials.json for project ' + patientNameSplit[0])
-                    else:
-                        raise ValueError('Project ' + patientNameSplit[0] + ' not found in credentials.json')
-                    tmp_destBasePath = os.path.join(tmp_destBasePath,'sourcedata')
+    :return: time since midnight, or None if value could not be parsed
+    :rtype: timedelta
+    """
+    try:
+        value = str(value).strip()
+        return timedelta(hours=int(value[0:2]), minutes=int(value[2:4] or 0), seconds=float(value[4:] or 0))
+    except (TypeError, ValueError):
+        return None
 
 
-                    # Format Destination File Path
-                    destFilePath = os.path.join(tmp_destBasePath, 
-                                                'sub-' + patientNameSplit[1])
-                    
-                    if len(patientNameSplit) >= 3:
-                        destFilePath = os.path.join(destFilePath, 'ses-' + patientNameSplit[2])
-                    else:
-                        destFilePath = os.path.join(destFilePath, 'ses-' + dcmHdr.StudyDate)
-
-                    destFilePath = os.path.join(destFilePath, 'acq-%02d_%d_%s' % (int(dcmHdr.AcquisitionNumber), int(float(dcmHdr.SeriesTime)), dcmHdr.ProtocolName))
-                    destFilePath = os.path.join(destFilePath, filename)
-
-                    # d_scanLog = {}
-                    # try:
-                    #     d_scanLog = loads(load_data.readable(dcmHdr.StudyDate[0:4],dcmHdr.StudyDate[0:6] + '_scan_dates.json').read_text())
-                    # except FileNotFoundError:
-                    #     print('did not find scan_dates.json file')
-
-                    #check if subject/session for this date is in database
-                    formatted_date = f"{dcmHdr.StudyDate[:4]}-{dcmHdr.StudyDate[4:6]}-{dcmHdr.StudyDate[6:]}"
-                    if len(patientNameSplit) >= 3:
-                        df_scanLog = st.mysql.sql_mri_tracking_query(regex=formatted_date, 
-                                                                     searchcol='date',
-                                                                     project=f"sub-{patientNameSplit[0]}",
-                                                                     subject=f"sub-{patientNameSplit[1]}", 
-                                                                     session=f"ses-{patientNameSplit[2]}")
-                    else:
-                        df_scanLog = st.mysql.sql_mri_tracking_query(regex=formatted_date, 
-                                                                     searchcol='date',
-                                                                     project=f"sub-{patientNameSplit[0]}",
-                                                                     subject=f"sub-{patientNameSplit[1]}")
-                    b_fileUpdated = not df_scanLog.empty
-
-
-                    try:
-                        formatted_time = f"{dcmHdr['AcquisitionTime'][0:2]}:{dcmHdr['AcquisitionTime'][2:4]}:{dcmHdr['AcquisitionTime'][4:6]}"
-                        acq_start = datetime(1900, 1, 1, dcmHdr['AcquisitionTime'][0:2], dcmHdr['AcquisitionTime'][2:4], dcmHdr['AcquisitionTime'][4:6], 0)  # arbitrary date
-                        acq_end = acq_start + timedelta(seconds=dcmHdr['AcquisitionDuration'])
-                        # end_time = acq_end.time()
-                        acq_end = timedelta(hours=acq_end.hour,minutes=acq_end.minute,seconds=acq_end.second)
-                        formatted_end_time = acq_end.strftime("%H:%M:%S")
-                    except:
-                        formatted_time = None
-                        formatted_end_time = None
-
-
-                    #subject/session/date does not exist in mri_tracking SQL table, then add
-                    if b_fileUpdated:
-                        if len(patientNameSplit) >= 3:
-                            st.mysql.sql_mri_tracking_insert(project=f"sub-{patientNameSplit[0]}",
-                                                             subject=f"sub-{patientNameSplit[1]}", 
-                                                             session=f"ses-{patientNameSplit[2]}", 
-                                                             date=formatted_date, 
-                                                             scan_start_time=formatted_time, 
-                                                             scan_end_time=formatted_end_time)
+def update_study_times(d_studies: dict, d_info: dict, dcmHdr: pydicom.Dataset):
+    """
+    Extend the scan start/end times of a study with the acquisition time of a single DICOM file.
+
+    :param d_studies: study times keyed by (project, subject, session, date), updated in place
+    :type d_studies: dict
+
+    :param d_info: series information returned by get_series_info()
+    :type d_info: dict
+
+    :param dcmHdr: DICOM header of the file
+    :type dcmHdr: pydicom.Dataset
+    """
+    k = (d_info['project'], d_info['subject'], d_info['session'], d_info['date'])
+    if not k in d_studies.keys():
+        d_studies[k] = {'scan_start_time': None, 'scan_end_time': None}
+
+    acq_start = dicom_time_to_timedelta(dcmHdr.get('AcquisitionTime', None))
+    if acq_start is None:
+        return
+    acq_end = acq_start
+    try:
+        acq_end = acq_start + timedelta(seconds=float(dcmHdr.get('AcquisitionDuration', 0) or 0))
+    except (TypeError, ValueError):
+        pass
+
+    if d_studies[k]['scan_start_time'] is None or acq_start < d_studies[k]['scan_start_time']:
+        d_studies[k]['scan_start_time'] = acq_start
+    if d_studies[k]['scan_end_time'] is None or acq_end > d_studies[k]['scan_end_time']:
+        d_studies[k]['scan_end_time'] = acq_end
+
+
+def format_time(t: timedelta) -> str:
+    """
+    Format a timedelta since midnight as 'HH:MM:SS' for the mri_tracking SQL table.
+    """
+    if t is None:
+        return None
+    seconds = int(t.total_seconds()) % 86400
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+def update_mri_tracking(d_studies: dict):
+    """
+    Insert or update a single mri_tracking row per study, with one query and one bulk upsert for all
+    studies. Existing rows are only updated when the new scan start time is earlier or the new scan
+    end time is later than the stored value.
+
+    :param d_studies: study times keyed by (project, subject, session, date), as built by update_study_times()
+    :type d_studies: dict
+    """
+    if not d_studies:
+        return
+
+    try:
+        d_uuids = {st.mysql.generate_unique_id(subject, session, date): (project, subject, session, date) for (project, subject, session, date) in d_studies.keys()}
+        df_scanLog = st.mysql.sql_mri_tracking_query(uuid=list(d_uuids.keys()))
+        d_existing = {r['uuid']: r for _, r in df_scanLog.iterrows()}
+
+        ls_rows = []
+        for uid, k in d_uuids.items():
+            (project, subject, session, date) = k
+            d_times = d_studies[k]
+
+            #subject/session/date does not exist in mri_tracking SQL table, then add
+            if not uid in d_existing.keys():
+                ls_rows.append({'uuid': uid,
+                                'project': f"sub-{project}",
+                                'subject': subject,
+                                'session': session,
+                                'date': date,
+                                'number_checks': 0,
+                                'scan_start_time': format_time(d_times['scan_start_time']),
+                                'scan_end_time': format_time(d_times['scan_end_time'])})
+                continue
+
+            #subject/session/date does exist in mri_tracking SQL table, update start or end time as necessary
+            row = d_existing[uid]
+            b_update = False
+            start_t = row['scan_start_time']
+            start_t = None if pd.isna(start_t) else pd.Timedelta(start_t).to_pytimedelta()
+            end_t = row['scan_end_time']
+            end_t = None if pd.isna(end_t) else pd.Timedelta(end_t).to_pytimedelta()
+            d_row = {'uuid': uid,
+                     'project': row['project'],
+                     'subject': row['subject'],
+                     'session': row['session'],
+                     'date': str(row['date']),
+                     'scan_start_time': format_time(start_t),
+                     'scan_end_time': format_time(end_t)}
+            if d_times['scan_start_time'] is not None and (start_t is None or d_times['scan_start_time'] < start_t):
+                d_row['scan_start_time'] = format_time(d_times['scan_start_time'])
+                b_update = True
+            if d_times['scan_end_time'] is not None and (end_t is None or d_times['scan_end_time'] > end_t):
+                d_row['scan_end_time'] = format_time(d_times['scan_end_time'])
+                b_update = True
+            if b_update:
+                ls_rows.append(d_row)
+
+        #new rows are inserted, existing rows only have their scan times replaced
+        if ls_rows:
+            st.mysql.sql_mri_tracking_upsert(pd.DataFrame(ls_rows), update_cols=['scan_start_time','scan_end_time'])
+
+    except Exception as e:
+        log_exception(e)
+
+
+
+def log_exception(e: Exception):
+    """
+    Print and log the type, file and line number of an exception.
+
+    :param e: caught exception
+    :type e: Exception
+    """
+    print("Error Message: {0}".format(e))
+    exc_type, exc_obj, exc_tb = sys.exc_info()
+    fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+    print(exc_type, fname, exc_tb.tb_lineno)
+
+    write_log("\t\tError Message: {0}".format(e))
+    write_log('\t\t' + str(exc_type) + ' ' + str(fname) + ' ' + str(exc_tb.tb_lineno))
+
+
+def remove_pacs_files(ls_files: list, dcmPath: str):
+    """
+    Remove files from the PACS drop folder, along with any directories left empty beneath dcmPath.
+    Files that cannot be removed are logged; directory removal stops at the first non-empty parent.
+
+    :param ls_files: fullpaths of files to remove
+    :type ls_files: list
+
+    :param dcmPath: fullpath to the drop folder
+    :type dcmPath: str
+    """
+    ls_dirs = set()
+    for pacsFile in ls_files:
+        try:
+            if os.path.isfile(pacsFile):
+                os.remove(pacsFile)
+            ls_dirs.add(os.path.dirname(pacsFile))
+        except OSError as e:
+            write_log('\t\tcould not remove ' + pacsFile + ': ' + str(e))
+
+    #deepest directories first, stop at the first non-empty parent
+    for d in sorted(ls_dirs, key=len, reverse=True):
+        while d.startswith(dcmPath) and os.path.normpath(d) != os.path.normpath(dcmPath):
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+            d = os.path.dirname(d)
+
+
+@contextmanager
+def project_lock(dataDir: str, name: str='bids'):
+    """
+    Exclusive lock on a stage of a project, shared by all worker processes.
+
+    The default 'bids' lock covers the project's BIDS rawdata stage: process_single_dir processes every
+    NIfTI image in a session directory and rewrites the project's participants.tsv, so two series of the
+    same project are never BIDS-ified at the same time. Any other name is a separate lock, e.g. one per
+    session held across conversion and the BIDS stage. Always take a session lock before the 'bids' lock.
+
+    :param dataDir: fullpath to the project's data directory
+    :type dataDir: str
+
+    :param name: lock name, defaults to 'bids'
+    :type name: str, optional
+    """
+    import fcntl
+    lockDir = os.path.join(dataDir,'code','processing_logs','connect_pacs_dicom_grabber')
+    if name != 'bids':
+        lockDir = os.path.join(lockDir,'locks')
+    if not os.path.isdir(lockDir):
+        os.makedirs(lockDir,exist_ok=True)
+    with open(os.path.join(lockDir,name + '.lock'),'w') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def process_series(d_info: dict, dcmPath: str, staging: str='auto', journal=None) -> dict:
+    """
+    Copy a complete series from the PACS drop folder to its sourcedata acquisition directory, convert the
+    DICOMs to NIfTI, create the BIDS rawdata files and insert them into the project's searchTable.
+
+    This function is run in a worker process of st.pacs.WorkerPool. Errors are logged and returned rather
+    than raised so that a failed series does not affect any other. When a journal is given, each finished
+    stage is recorded and stages the journal already lists as finished are skipped, so a series resumed
+    after a restart continues where it stopped.
+
+    :param d_info: series information from get_series_info(), including the list of files ls_files
+    :type d_info: dict
+
+    :param dcmPath: fullpath to the drop folder
+    :type dcmPath: str
+
+    :param staging: staging mode passed to st.pacs.stage_files (auto, link, move or copy), defaults to 'auto'
+    :type staging: str, optional
+
+    :param journal: ingest journal, defaults to None
+    :type journal: st.pacs.IngestJournal, optional
+
+    :return: dictionary with keys dcmDir, ls_files, ls_updatedFiles, staging, d_timing (seconds spent in the copy, convert, bids and insert stages) and error
+    :rtype: dict
+    """
+    dcmDir = d_info['dcmDir']
+    seriesUID = d_info['seriesUID']
+    d_result = {'dcmDir': dcmDir,
+                'ls_files': d_info['ls_files'],
+                'ls_updatedFiles': [],
+                'staging': None,
+                'd_timing': {},
+                'error': None}
+
+    #stages already finished before a restart
+    state = 'complete'
+    if journal:
+        d_journal = journal.get_series(seriesUID)
+        if d_journal:
+            state = d_journal['state']
+            d_result['ls_updatedFiles'] = d_journal['outputs']
+    ls_done = st.pacs.SERIES_STATES[:st.pacs.SERIES_STATES.index(state) + 1]
+
+    try:
+        #stage to sourcedata (hard link/rename on the same filesystem, checksummed copy otherwise), then remove the originals
+        if not 'staged' in ls_done:
+            t = tm.time()
+            ls_staged, d_result['staging'] = st.pacs.stage_files(d_info['ls_files'],dcmDir,mode=staging)
+            d_result['d_timing']['copy'] = tm.time() - t
+            state = 'staged'
+            if journal:
+                journal.set_file_states(d_info['ls_files'],'staged',seriesUID)
+                journal.set_series_state(seriesUID,state,seconds=d_result['d_timing']['copy'])
+        remove_pacs_files(d_info['ls_files'],dcmPath)
+        if journal:
+            journal.set_file_states([f for f in d_info['ls_files'] if not os.path.isfile(f)],'removed')
+
+        #convert and create rawdata files under the session lock: process_single_dir organises every NIfTI image
+        #in the session directory, which must not include the half-written outputs of a sibling series
+        st.creds.read(d_info['project'])
+        sessionDir = os.path.dirname(dcmDir)
+        with project_lock(st.creds.dataDir,os.path.basename(os.path.dirname(sessionDir)) + '_' + os.path.basename(sessionDir)):
+
+            #Convert DICOM to NIfTI images
+            if not 'converted' in ls_done:
+                t = tm.time()
+                st.convert_dicoms(dcmDir,progress=False)
+                d_result['d_timing']['convert'] = tm.time() - t
+                state = 'converted'
+                if journal:
+                    journal.set_series_state(seriesUID,state,seconds=d_result['d_timing']['convert'])
+
+            #create rawdata files from sourcedata
+            if not 'bids' in ls_done:
+                t = tm.time()
+                with project_lock(st.creds.dataDir):
+                    d_result['ls_updatedFiles'] = process_single_dir(sessionDir,True,False)[0]
+                d_result['d_timing']['bids'] = tm.time() - t
+                state = 'bids'
+                if journal:
+                    journal.set_series_state(seriesUID,state,seconds=d_result['d_timing']['bids'],outputs=d_result['ls_updatedFiles'])
+
+        #insert new NIfTI images into SQL table
+        ls_updatedFiles = d_result['ls_updatedFiles']
+        if not 'catalogued' in ls_done:
+            t = tm.time()
+            if ls_updatedFiles:
+                d = {}
+                fullpath = []
+                filename = []
+                baseFilename = []
+                extension = []
+                for f in ls_updatedFiles:
+                    fullpath.append(f)
+                    filename.append(os.path.basename(f))
+                    idx = os.path.basename(f).find('.')
+                    if idx != -1:
+                        if idx == 0:
+                            baseFilename.append('NULL')
+                            extension.append(os.path.basename(f))
                         else:
-                            st.mysql.sql_mri_tracking_insert(project=f"sub-{patientNameSplit[0]}",
-                                                             subject=f"sub-{patientNameSplit[1]}", 
-                                                             session=f"ses-{dcmHdr.StudyDate}", 
-                                                             date=formatted_date, 
-                                                             scan_start_time=formatted_time, 
-                                                             scan_end_time=formatted_end_time)
-                        # formatted = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
-                        # p = load_data(dcmHdr.StudyDate[0:4])
-                        # p.mkdir(exist_ok=True)
-                        # p = load_data(f"{dcmHdr.StudyDate[0:4]}/{dcmHdr.StudyDate[0:6]}_scan_dates.json")
-                        # with open(str(p),'w') as j:
-                        #     json.dump(d_scanLog,j,indent='\t', sort_keys=True)
-
-                    #subject/session/date does exist in mri_tracking SQL table, update start or end time as necessary
+                            baseFilename.append(os.path.basename(f)[:idx])
+                            extension.append(os.path.basename(f)[idx+1:])
                     else:
-                        t = timedelta(hours=dcmHdr['AcquisitionTime'][0:2], minutes=dcmHdr['AcquisitionTime'][2:4], seconds=dcmHdr['AcquisitionTime'][4:6])
-                        start_t = df_scanLog.loc[0, 'scan_start_time']
-                        start_t = start_t.to_pytimedelta() if isinstance(start_t, pd.Timedelta) else start_t
-                        end_t = df_scanLog.loc[0, 'scan_end_time']
-                        end_t = start_t.to_pytimedelta() if isinstance(start_t, pd.Timedelta) else start_t
-                        if acq_start and start_t:
-                            if t < start_t:
-                                df_scanLog.loc[0, 'scan_start_time'] = formatted_time
-                                st.mysql.sql_mri_tracking_set(df_scanLog)
-                        if acq_end and end_t:
-                            if acq_end > end_t:
-                                df_scanLog.loc[0, 'scan_end_time'] = formatted_end_time
-                                st.mysql.sql_mri_tracking_set(df_scanLog)
-                    
-                    
-
-                    #move file to the destination path
-                    destFilePath = destFilePath.replace(' ','_')
-                    if not os.path.exists(os.path.dirname(destFilePath)):
-                        os.makedirs(os.path.dirname(destFilePath))
-                    shutil.copyfile(inFilePath,destFilePath)
-                    ls_pacsFiles.append(inFilePath)
-                    
-
-                    #output dict
-                    d = {}
-                    d['fullpath'] = destFilePath
-                    d['filename'] = os.path.basename(destFilePath)
-                    
-
-
-                    #add conversion directory to DCM list
-                    dcmDir = os.path.dirname(destFilePath)
-                    if not dcmDir in df_procData[dcmHdr.PatientName.family_name]['ls_rawDcm']:
-                        # ls_rawDcm.append(dcmDir)
-                        tmp_ls = df_procData[dcmHdr.PatientName.family_name]['ls_rawDcm']
-                        tmp_ls.append(dcmDir)
-                        df_procData[dcmHdr.PatientName.family_name]['ls_rawDcm'] = tmp_ls
-
-                    #subject/session sourcedata directory 
-                    if not df_procData[dcmHdr.PatientName.family_name]['sourcedataDir']:
-                        df_procData[dcmHdr.PatientName.family_name]['sourcedataDir'] = os.path.dirname(dcmDir)
-                        
-                    if not df_procData[dcmHdr.PatientName.family_name]['ls_inDir']:
-                        df_procData[dcmHdr.PatientName.family_name]['ls_inDir'] = [os.path.dirname(inFilePath)]
-                    elif not bool([s for s in df_procData[dcmHdr.PatientName.family_name]['ls_inDir'] if (os.path.dirname(dcmDir) in s)]):
-                        tmp_ls = df_procData[dcmHdr.PatientName.family_name]['ls_inDir']
-                        tmp_ls.append(os.path.dirname(inFilePath))
-                        df_procData[dcmHdr.PatientName.family_name]['ls_inDir'] = tmp_ls 
-
-                except TypeError as e:
-                    ls_pacsFiles.append(inFilePath)
-
-                except pydicom.errors.InvalidDicomError as e:
-                    ls_pacsFiles.append(inFilePath)
+                        baseFilename.append(os.path.basename(f))
+                        extension.append('NULL')
+                d['fullpath'] = fullpath
+                d['filename'] = filename
+                d['basename'] = baseFilename
+                d['extension'] = extension
+
+                st.mysql.sql_table_insert(st.creds.searchTable,d)
+            d_result['d_timing']['insert'] = tm.time() - t
+            state = 'catalogued'
+            if journal:
+                journal.set_series_state(seriesUID,state,seconds=d_result['d_timing']['insert'])
+
+        if journal:
+            journal.set_series_state(seriesUID,'done',seconds=sum(d_result['d_timing'].values()))
 
-                except Exception as e:
-                    ls_pacsFiles.append(inFilePath)
+    except Exception as e:
+        log_exception(e)
+        d_result['error'] = str(e)
+        if journal:
+            journal.set_series_state(seriesUID,state,error=str(e))
+
+    write_log('\t' + dcmDir + ' (' + str(d_result['staging']) + ') ' + ' '.join(f"{k}={v:.1f}s" for k, v in d_result['d_timing'].items()) + (' FAILED' if d_result['error'] else ''))
+    return d_result
+
+
+def is_not_found(e: Exception) -> bool:
+    """
+    Check if an Orthanc request failed with HTTP 404, e.g. the resource was deleted from the PACS.
+
+    :param e: caught exception, OrthancClient raises Exception(<HTTP status>)
+    :type e: Exception
+
+    :return: True if the request returned 404
+    :rtype: bool
+    """
+    return bool(e.args) and str(e.args[0]) == '404'
+
+
+def get_unstable_patients(URL: str) -> list:
+    """
+    PatientName of every patient Orthanc does not yet report as stable.
+
+    :param URL: Orthanc PACS server URL
+    :type URL: str
+
+    :return: patient names, or None if the PACS could not be queried
+    :rtype: list
+    """
+    try:
+        orthanc = st.RestToolbox.OrthancClient(URL)
+        ls_unstable = [d['MainDicomTags'].get('PatientName') for d in orthanc.patients(expand=True) if d.get('MainDicomTags') and not d.get('IsStable', True)]
+        orthanc.close()
+        return ls_unstable
+    except Exception as e:
+        log_exception(e)
+        return None
+
+
+def finalize_patient(patient: str, d_patient: dict, URL: str, journal=None):
+    """
+    Remove a processed patient from the Orthanc PACS database and evaluate the files transferred to
+    the subject's rawdata directory.
+
+    :param patient: PatientName family name
+    :type patient: str
+
+    :param d_patient: patient information with keys project and sourcedataDir
+    :type d_patient: dict
+
+    :param URL: Orthanc PACS server URL
+    :type URL: str
+
+    :param journal: ingest journal, defaults to None
+    :type journal: st.pacs.IngestJournal, optional
+    """
+    write_log('\tclearing patient ' + patient + ' from PACS database @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+    try:
+        #single expanded listing instead of one request per patient, deletes are issued concurrently
+        orthanc = st.RestToolbox.OrthancClient(URL)
+        ls_delete = ['/patients/' + d['ID'] for d in orthanc.patients(expand=True) if not d.get('MainDicomTags') or d['MainDicomTags'].get('PatientName') == patient]
+        orthanc.delete_many(ls_delete)
+        orthanc.close()
+    except Exception as e:
+        log_exception(e)
+
+    write_log("\tEvaluating files in subject rawdata directory")
+    try:
+        st.evaluate_source_file_transfer(d_patient['project'],d_patient['sourcedataDir'])
+    except Exception as e:
+        log_exception(e)
+
+    if journal:
+        journal.finalize_patient(patient)
+    write_log('\tFinished processing patient ' + patient + ' @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+
+
+
+def fetch_series(orthancId: str, URL: str, spoolDir: str, projectIDs: dict, staging: str='auto', journal=None) -> dict:
+    """
+    Download a stable series archive from the Orthanc PACS, route it with its DICOM headers and pass it
+    to process_series(). The archive is extracted into spoolDir/<orthancId>, which should be on the
+    same filesystem as the project so the series is staged with hard links.
+
+    A series that the journal lists as done with the same files (a /changes event delivered again
+    after a restart) is not processed again.
+
+    This function is run in a worker process of st.pacs.WorkerPool.
+
+    :param orthancId: Orthanc series identifier
+    :type orthancId: str
+
+    :param URL: Orthanc PACS server URL
+    :type URL: str
+
+    :param spoolDir: fullpath to the directory archives are extracted into
+    :type spoolDir: str
 
+    :param projectIDs: contents of credentials.json
+    :type projectIDs: dict
 
+    :param staging: staging mode passed to st.pacs.stage_files (auto, link, move or copy), defaults to 'auto'
+    :type staging: str, optional
+
+    :param journal: ingest journal, defaults to None
+    :type journal: st.pacs.IngestJournal, optional
+
+    :return: process_series() results with the added keys orthancId, d_info and d_studies (scan start/end times per study)
+    :rtype: dict
+    """
+    import io
+    import zipfile
+
+    seriesDir = os.path.join(spoolDir,orthancId)
+    d_result = {'orthancId': orthancId, 'd_info': None, 'd_studies': {}, 'd_timing': {}, 'error': None}
+    try:
+        t = tm.time()
+        orthanc = st.RestToolbox.OrthancClient(URL)
+        archive = orthanc.get('/series/' + orthancId + '/archive', interpretAsJson=False)
+        orthanc.close()
+        if os.path.isdir(seriesDir):
+            shutil.rmtree(seriesDir)
+        with zipfile.ZipFile(io.BytesIO(archive)) as z:
+            z.extractall(seriesDir)
+        del archive
+        ls_files = sorted(os.path.join(root,f) for root, dirs, files in os.walk(seriesDir) for f in files)
+        fetchTime = tm.time() - t
+
+        d_info = None
+        d_studies = {}
+        for inFilePath in ls_files:
+            dcmHdr = read_dicom_header(inFilePath)
+            if d_info is None:
+                d_info = get_series_info(dcmHdr,projectIDs)
+            update_study_times(d_studies,d_info,dcmHdr)
+        if d_info is None:
+            raise ValueError('series ' + orthancId + ' archive contains no DICOM files')
+        d_info['ls_files'] = ls_files
+        d_result['d_info'] = d_info
+        d_result['d_studies'] = d_studies
+
+        if journal:
+            d_journal = journal.get_series(d_info['seriesUID'])
+            if d_journal and d_journal['state'] == 'done' and d_journal['info'].get('ls_files') == ls_files:
+                write_log('\t' + d_info['dcmDir'] + ' already processed')
+                return d_result
+            if d_journal is None or d_journal['state'] == 'done' or d_journal['info'].get('ls_files') != ls_files:
+                journal.start_series(d_info['seriesUID'],d_info)
+                journal.set_file_states(ls_files,'seen',d_info['seriesUID'])
+
+        d_result.update(process_series(d_info,seriesDir,staging,journal))
+        d_result['d_timing']['fetch'] = fetchTime
+
+    except Exception as e:
+        log_exception(e)
+        d_result['error'] = str(e)
+
+    finally:
+        if os.path.isdir(seriesDir):
+            shutil.rmtree(seriesDir,ignore_errors=True)
+
+    return d_result
+
+
+def log_stage_timing(pool):
+    """
+    Write the running per-stage timing summary of the worker pool to the log.
+
+    :param pool: conversion worker pool
+    :type pool: st.pacs.WorkerPool
+    """
+    d_stats = pool.stats()
+    write_log('\tstage timing: ' + ', '.join(f"{k} n={v['n']} mean={v['mean']:.1f}s max={v['max']:.1f}s" for k, v in d_stats.items() if k != 'failed') + ', failed=' + str(d_stats['failed']))
+
+
+def watch_drop_folder(options, journal, pool, projectIDs: dict, dcmPath: str, URL: str):
+    """
+    Ingest DICOM files written to the PACS drop folder. A series is processed once no new file has
+    arrived for its patient's quiet period, and a patient is finalized once none of its series are
+    receiving files or being processed, no file has arrived for the patient quiet period and Orthanc
+    reports the patient as stable. Runs forever.
+
+    :param options: parsed command line options
+    :type options: argparse.Namespace
+
+    :param journal: ingest journal
+    :type journal: st.pacs.IngestJournal
+
+    :param pool: conversion worker pool
+    :type pool: st.pacs.WorkerPool
+
+    :param projectIDs: contents of credentials.json
+    :type projectIDs: dict
+
+    :param dcmPath: fullpath to the drop folder
+    :type dcmPath: str
+
+    :param URL: Orthanc PACS server URL
+    :type URL: str
+    """
+    d_series = {}
+    d_studies = {}
+    d_patients = {}
+    d_stableChecks = {}
+    ls_pacsFiles = []
+
+    #watch the drop folder, a series is complete once no file has arrived for the patient's quiet period
+    d_quietPeriods = {k: float(v) for k, v in options.QUIET_OVERRIDES} if options.QUIET_OVERRIDES else {}
+    watcher = st.pacs.PacsWatcher(dcmPath, mode=options.WATCH_MODE, poll_interval=options.POLL_INTERVAL)
+    tracker = st.pacs.SeriesTracker(quiet_period=options.QUIET_PERIOD, d_quietPeriods=d_quietPeriods)
+    write_log('\twatching ' + dcmPath + ' (' + watcher.mode + ') with a ' + str(options.QUIET_PERIOD) + ' second quiet period')
+
+    #resume series and patients left unfinished by a previous run
+    ls_complete = []
+    for seriesUID, d_info in journal.unfinished_series(include_failed=options.RETRY_FAILED):
+        d_series[seriesUID] = d_info
+        ls_complete.append((seriesUID, {'nFiles': len(d_info.get('ls_files', []))}))
+    for family_name, d_patient in journal.open_patients().items():
+        d_patients[family_name] = dict(d_patient, ls_rawDcm=[], ls_futures=[])
+    if ls_complete or d_patients:
+        write_log('\tresuming ' + str(len(ls_complete)) + ' series and ' + str(len(d_patients)) + ' patients from ' + options.JOURNAL)
+
+    while True:
+        ls_newFiles = watcher.poll(timeout=1.0)
+        d_fileStates = journal.get_file_states(ls_newFiles) if ls_newFiles else {}
+        ls_seen = []
+        for inFilePath in ls_newFiles:
+            #already staged before a restart, only the original is left to remove
+            if d_fileStates.get(inFilePath) == 'staged':
+                ls_pacsFiles.append(inFilePath)
+                continue
 
-        # Remove DICOMS - prevent from detection in future loops
-        tm.sleep(1)
-        for pacsFile in ls_pacsFiles:
             try:
-                if os.path.isfile(pacsFile):
-                    os.remove(pacsFile)
-                    d = os.path.dirname(pacsFile)
-                while not d.endswith('PACS_m2'):
-                    os.rmdir(d)
-                    d = os.path.dirname(d)
+                # read only the header elements needed to route the file
+                dcmHdr = read_dicom_header(inFilePath)
+
+                #group files by series, destination is only formulated once per series
+                seriesUID = str(dcmHdr.SeriesInstanceUID)
+                if not seriesUID in d_series.keys():
+                    d_series[seriesUID] = get_series_info(dcmHdr,projectIDs)
+                    d_series[seriesUID]['ls_files'] = []
+                    write_log('\tnew series for patient ' + d_series[seriesUID]['family_name'] + ' @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+                d_series[seriesUID]['ls_files'].append(inFilePath)
+                tracker.update(seriesUID, d_series[seriesUID]['family_name'], d_series[seriesUID]['project'])
+                ls_seen.append((inFilePath, seriesUID))
+
+                #aggregate scan start/end times per study, mri_tracking is updated once per study below
+                update_study_times(d_studies,d_series[seriesUID],dcmHdr)
+
             except Exception as e:
-                a=e
-                # print("Error Message: stop {0}".format(e))
-        
+                ls_pacsFiles.append(inFilePath)
+                journal.set_file_states([inFilePath],'rejected')
+
+        for seriesUID in set(uid for _, uid in ls_seen):
+            journal.set_file_states([f for f, uid in ls_seen if uid == seriesUID],'seen',seriesUID)
+
+        # Remove non-DICOM/unroutable files - prevent from detection in future loops
         if ls_pacsFiles:
+            remove_pacs_files(ls_pacsFiles,dcmPath)
+            watcher.forget(ls_pacsFiles)
             ls_pacsFiles = []
 
 
-        try:
-            patientUIDs = st.RestToolbox.DoGet(URL + '/patients') 
-            for patientUID in patientUIDs:
-                d_patientInfo = st.RestToolbox.DoGet(URL + '/patients/' + patientUID)
-                if not 'MainDicomTags' in d_patientInfo.keys():
-                    continue
-                if d_patientInfo['MainDicomTags']['PatientName'] in df_procData.keys() and d_patientInfo['IsStable']:
-                    df_procData[d_patientInfo['MainDicomTags']['PatientName']]['stableFlag'] = True
-        except Exception as e:
-            print("Error Message: {0}".format(e))
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-            print(exc_type, fname, exc_tb.tb_lineno)
-        # ls_patientNames = []  
-                
-        for k in df_procData.keys():
-            if not df_procData[k]['stableFlag']:
+        #queue complete series for conversion, blocks while the worker pool queue is full
+        ls_complete.extend(tracker.complete())
+        for seriesUID, d_state in ls_complete:
+            d_info = d_series.pop(seriesUID)
+            family_name = d_info['family_name']
+            write_log('\tseries ' + d_info['dcmDir'] + ' complete (' + str(d_state['nFiles']) + ' files), processing data @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+
+            if not family_name in d_patients.keys():
+                d_patients[family_name] = {'project': d_info['project'],
+                                           'sourcedataDir': os.path.dirname(d_info['dcmDir']),
+                                           'ls_rawDcm': [],
+                                           'ls_futures': []}
+            d_patients[family_name]['ls_rawDcm'].append(d_info['dcmDir'])
+
+            #resumed series keep their journal state, new ones (or ones that received more files) start over
+            d_journal = journal.get_series(seriesUID)
+            if d_journal is None or d_journal['state'] == 'done' or d_journal['info'].get('ls_files') != d_info['ls_files']:
+                journal.start_series(seriesUID,d_info)
+            future = pool.submit(process_series,d_info,dcmPath,options.STAGING,journal)
+            future.add_done_callback(lambda f, ls_files=d_info['ls_files']: watcher.forget(ls_files))
+            d_patients[family_name]['ls_futures'].append(future)
+
+        #subject/session/date scan times in mri_tracking SQL table
+        if ls_complete and d_studies:
+            update_mri_tracking(d_studies)
+            d_studies = {}
+        ls_complete = []
+
+
+        #patients with no series receiving files, all series processed, no file for the patient quiet period
+        ls_candidates = []
+        for family_name in list(d_patients.keys()):
+            if tracker.has_patient(family_name) or not all(f.done() for f in d_patients[family_name]['ls_futures']):
                 continue
-            elif df_procData[k]['stableFlag'] and df_procData[k]['continueFlag']: #do 1 more pass for good measure
-
-                write_log('\tPatient ' + k + ' is stable but performing one more loop @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-                tm.sleep(240)
-                df_procData[k]['continueFlag'] = False
+            idle = tracker.patient_idle(family_name)
+            if idle is not None and idle < options.PATIENT_QUIET_PERIOD:
                 continue
+            if d_stableChecks.get(family_name, 0) > tm.time():
+                continue
+            ls_candidates.append(family_name)
+
+        #Orthanc must also report the patient as stable, a late series may still be arriving at the PACS
+        if ls_candidates:
+            ls_unstable = get_unstable_patients(URL)
+            for family_name in ls_candidates:
+                if ls_unstable is None or family_name in ls_unstable:
+                    d_stableChecks[family_name] = tm.time() + options.QUIET_PERIOD
+                    continue
+                d_stableChecks.pop(family_name, None)
+                tracker.forget_patient(family_name)
+                d_patient = d_patients.pop(family_name)
+                write_log('\tPatient ' + family_name + ' is complete @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+                pool.submit(finalize_patient,family_name,d_patient,URL,journal)
+                log_stage_timing(pool)
 
 
-            write_log('\tPatient ' + k + ' is stable, processing data @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-            write_log('\tclearing patient from PACS database @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-            patientUIDs = st.RestToolbox.DoGet(URL + '/patients') 
-            for patientUID in patientUIDs:
-                d_patientInfo = st.RestToolbox.DoGet(URL + '/patients/' + patientUID)
-                if not 'MainDicomTags' in d_patientInfo.keys():
-                    st.RestToolbox.DoDelete(URL + '/patients/' + patientUID)
-                    continue
-                if d_patientInfo['MainDicomTags']['PatientName'] == k:
-                    st.RestToolbox.DoDelete(URL + '/patients/' + patientUID)
-            
+def consume_changes(options, journal, pool, projectIDs: dict, URL: str):
+    """
+    Ingest series as the Orthanc PACS reports them stable on its /changes feed, instead of watching the
+    drop folder. StableSeries events queue fetch_series() for the series; a StableStudy event queues any
+    of the study's series not seen yet, and once all of them are processed mri_tracking is updated for
+    the study and the patient is finalized.
+
+    The sequence number of the last change is stored in the journal ('orthanc_since') and only advanced
+    past a change once everything up to it has been processed, so no change is lost across a restart.
+    A change whose resource was deleted from Orthanc (HTTP 404) is skipped, and a change that keeps
+    failing is logged and skipped after --changes-max-retries attempts so it cannot stall the feed.
+    Runs forever, with a single /changes request every --changes-interval seconds while idle.
+
+    :param options: parsed command line options
+    :type options: argparse.Namespace
 
+    :param journal: ingest journal
+    :type journal: st.pacs.IngestJournal
 
-            # list files and add to table/resshare/projects/2023_UES/EPIC/sourcedata/sub-1106/ses-20240610-1A/acq-06_123445_B0_map
-            for destFilePath in df_procData[k]['ls_rawDcm']:
+    :param pool: conversion worker pool
+    :type pool: st.pacs.WorkerPool
+
+    :param projectIDs: contents of credentials.json
+    :type projectIDs: dict
+
+    :param URL: Orthanc PACS server URL
+    :type URL: str
+    """
+    orthanc = st.RestToolbox.OrthancClient(URL)
+    since = journal.get_meta('orthanc_since', 0)
+    lastSeq = since
+    write_log('\tconsuming ' + URL + '/changes from sequence number ' + str(since))
+
+    ls_pending = []         # (seq, list of futures) in sequence order
+    d_studies = {}          # orthanc study id: {'family_name', 'project', 'stable', 'd_futures': {orthanc series id: future}}
+    d_patients = {}         # family_name: set of orthanc study ids still open
+
+    def get_study(studyId):
+        if not studyId in d_studies.keys():
+            d_study = orthanc.get('/studies/' + studyId)
+            family_name = str(d_study['PatientMainDicomTags'].get('PatientName','')).split('^')[0].strip()
+            d_studies[studyId] = {'family_name': family_name,
+                                  'project': family_name.split()[0] if family_name else '',
+                                  'stable': False,
+                                  'd_futures': {}}
+            d_patients.setdefault(family_name,set()).add(studyId)
+        return d_studies[studyId]
+
+    def queue_series(seriesId, studyId):
+        d_study = get_study(studyId)
+        if not d_study['project'] in projectIDs:
+            write_log('\tskipping series ' + seriesId + ': project of patient ' + d_study['family_name'] + ' not found in credentials.json')
+            return None
+        if seriesId in d_study['d_futures'].keys() and not d_study['d_futures'][seriesId].done():
+            return d_study['d_futures'][seriesId]
+        spoolDir = os.path.join(projectIDs[d_study['project']]['dataDir'],'code','processing_logs','connect_pacs_dicom_grabber','spool')
+        future = pool.submit(fetch_series,seriesId,URL,spoolDir,projectIDs,options.STAGING,journal)
+        d_study['d_futures'][seriesId] = future
+        return future
+
+    def queue_change(change):
+        ls_futures = []
+        if change['ChangeType'] == 'StableSeries':
+            d_series = orthanc.get('/series/' + change['ID'])
+            write_log('\tstable series ' + change['ID'] + ' @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+            ls_futures.append(queue_series(change['ID'],d_series['ParentStudy']))
+        elif change['ChangeType'] == 'StableStudy':
+            d_study = get_study(change['ID'])
+            d_study['stable'] = True
+            for d_series in orthanc.get('/studies/' + change['ID'] + '/series'):
+                if not d_series['ID'] in d_study['d_futures'].keys():
+                    ls_futures.append(queue_series(d_series['ID'],change['ID']))
+        return [f for f in ls_futures if f is not None]
+
+    d_retries = {}          # seq: number of failed attempts
+    while True:
+        try:
+            b_idle = True
+            for change in orthanc.iter_changes(since=lastSeq, limit=100):
+                b_idle = False
                 try:
+                    ls_futures = queue_change(change)
+                except Exception as e:
+                    ls_futures = []
+                    if is_not_found(e):
+                        #resource deleted from Orthanc since the change was recorded, nothing left to fetch
+                        write_log('\tskipping change ' + str(change['Seq']) + ': ' + change['ChangeType'] + ' ' + change['ID'] + ' no longer exists')
+                        if change['ChangeType'] == 'StableStudy' and change['ID'] in d_studies.keys():
+                            d_studies[change['ID']]['stable'] = True
+                    else:
+                        d_retries[change['Seq']] = d_retries.get(change['Seq'],0) + 1
+                        if d_retries[change['Seq']] < options.CHANGES_MAX_RETRIES:
+                            raise
+                        log_exception(e)
+                        write_log('\tgiving up on change ' + str(change['Seq']) + ' (' + change['ChangeType'] + ' ' + change['ID'] + ') after ' + str(d_retries[change['Seq']]) + ' attempts')
+                d_retries.pop(change['Seq'],None)
+                ls_pending.append((change['Seq'],ls_futures))
+
+                #only advance past a change once it is queued (or skipped), a change that raised is fetched again on the next pass
+                lastSeq = max(lastSeq, change['Seq'])
 
-                    write_log('\t' + destFilePath)
-                    write_log('\t\tconverting DICOMS and other fun stuff in @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-                    #Convert DICOM to NIfTI images
-                    st.convert_dicoms(destFilePath,progress=False)
-                    
-                    #insert new NIfTI images into SQL table
-                    d = {}
-                    fullpath = []
-                    filename = []
-                    # for path in Path(os.path.dirname(destFilePath)).glob('*'):
-                    #     if not os.path.isdir(str(path)):
-                    #         fullpath.append(str(path))
-                    #         filename.append(os.path.basename(str(path)))
-                    # d['fullpath'] = fullpath
-                    # d['filename'] = filename
-
-                    tmp_project = df_procData[k]['project']
-                    st.creds.read(tmp_project)
-                    #print(tmp_project + ' ' + destFilePath)
-                    #sql_table_insert(creds.searchSourceTable,d)
-
-
-
-                    #now I can copy nifti files!!!
-                    write_log('\t\tcreating rawdata files from sourcedata @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-                    ls_updatedFiles = process_single_dir(os.path.dirname(destFilePath),True,False)[0]
-                    if ls_updatedFiles:
-                        d = {}
-                        fullpath = []
-                        filename = []
-                        baseFilename = []
-                        extension = []
-                        for f in ls_updatedFiles:
-                            fullpath.append(f)
-                            filename.append(os.path.basename(f))
-                            idx = os.path.basename(f).find('.')
-                            if idx != -1:
-                                if idx == 0:
-                                    baseFilename.append('NULL')
-                                    extension.append(os.path.basename(f))
-                                else:
-                                    baseFilename.append(os.path.basename(f)[:idx])
-                                    extension.append(os.path.basename(f)[idx+1:])
-                            else:
-                                baseFilename.append(os.path.basename(f))
-                                extension.append('NULL')
-                        d['fullpath'] = fullpath
-                        d['filename'] = filename
-                        d['basename'] = baseFilename
-                        d['extension'] = extension
-                        
-                        st.mysql.sql_table_insert(st.creds.searchTable,d)
+        except Exception as e:
+            log_exception(e)
+            b_idle = True
 
+        #mri_tracking and patient finalization once every series of a stable study is processed
+        for studyId in list(d_studies.keys()):
+            d_study = d_studies[studyId]
+            if not d_study['stable'] or not all(f.done() for f in d_study['d_futures'].values()):
+                continue
+            d_times = {}
+            for f in d_study['d_futures'].values():
+                try:
+                    for k, v in f.result().get('d_studies',{}).items():
+                        if not k in d_times.keys():
+                            d_times[k] = dict(v)
+                            continue
+                        if v['scan_start_time'] is not None and (d_times[k]['scan_start_time'] is None or v['scan_start_time'] < d_times[k]['scan_start_time']):
+                            d_times[k]['scan_start_time'] = v['scan_start_time']
+                        if v['scan_end_time'] is not None and (d_times[k]['scan_end_time'] is None or v['scan_end_time'] > d_times[k]['scan_end_time']):
+                            d_times[k]['scan_end_time'] = v['scan_end_time']
                 except Exception as e:
-                    print("Error Message: {0}".format(e))
-                    exc_type, exc_obj, exc_tb = sys.exc_info()
-                    fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                    print(exc_type, fname, exc_tb.tb_lineno)
+                    log_exception(e)
+            update_mri_tracking(d_times)
+            d_studies.pop(studyId)
 
-                    write_log("\t\tError Message: {0}".format(e))
-                    write_log('\t\t' + str(exc_type) + ' ' + str(fname) + ' ' + str(exc_tb.tb_lineno))
+            family_name = d_study['family_name']
+            d_patients[family_name].discard(studyId)
+            if not d_patients[family_name] and d_times:
+                d_patients.pop(family_name)
+                (project, subject, session, date) = next(iter(d_times.keys()))
+                d_patient = {'project': project,
+                             'sourcedataDir': os.path.join(projectIDs[project]['dataDir'],'sourcedata',subject,session)}
+                write_log('\tPatient ' + family_name + ' is complete @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
+                pool.submit(finalize_patient,family_name,d_patient,URL,journal)
+                log_stage_timing(pool)
 
+        #advance the persisted cursor past every change that is fully processed
+        while ls_pending and all(f.done() for f in ls_pending[0][1]):
+            since = ls_pending.pop(0)[0]
+            journal.set_meta('orthanc_since',since)
 
-            write_log("\tEvaluating files in subject rawdata directory")
-            try:
-                st.evaluate_source_file_transfer(df_procData[k]['project'],df_procData[k]['sourcedataDir'])
-            except Exception as e:
-                print("Error Message: {0}".format(e))
-                exc_type, exc_obj, exc_tb = sys.exc_info()
-                fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                print(exc_type, fname, exc_tb.tb_lineno)
+        if b_idle:
+            tm.sleep(options.CHANGES_INTERVAL)
+
+
+
+# ******************* MAIN ********************
+def main():
+    """
+    The cli entry point of this program.
+    """
+    from wsuconnect.data import load as load_data
+    from json import loads, dumps
+
+    options = parser.parse_args()
+    if options.version:
+        print(os.path.basename(__file__) + ' version {0}.'.format(VERSION)+" DATED: "+DATE)
+
+    #durable ingest state, queried and exited if --metrics
+    journal = st.pacs.IngestJournal(options.JOURNAL)
+    if options.METRICS:
+        print(dumps(journal.metrics(window=options.METRICS_WINDOW), indent=4))
+        return
 
-                write_log("\t\tError Message: {0}".format(e))
-                write_log('\t\t' + str(exc_type) + ' ' + str(fname) + ' ' + str(exc_tb.tb_lineno))
+    startDateTime = datetime.now()
+    write_log('PACS data grabber now runing @ ' + startDateTime.strftime('%m%d%Y %H:%M:%S'))
+
+    dcmPath = "/PACS_m2"
+    URL = 'http://10.11.0.31:8042'
 
-                
-            df_procData = df_procData.drop(k,axis='columns')
+    projectIDs = loads(load_data.readable('credentials.json').read_text())
 
+    #the workers insert into the catalog, which cannot invalidate this (parent) process's query cache
+    st.mysql.sql_cache_configure(ttl=0)
+    pool = st.pacs.WorkerPool(max_workers=options.WORKERS, queue_size=options.QUEUE_SIZE)
 
-            write_log('\tFinished processing DICOM group @ ' + datetime.now().strftime('%m%d%Y %H:%M:%S'))
-            write_log('Checking /PACS_m2 for new files...')
-            writeLoopFlag = True
-            continueFlag = True
+    if options.SOURCE == 'changes':
+        write_log('Checking ' + URL + ' for stable series...')
+        consume_changes(options,journal,pool,projectIDs,URL)
+    else:
+        write_log('Checking /PACS_m2 for new files...')
+        watch_drop_folder(options,journal,pool,projectIDs,dcmPath,URL)
 
-                       
-                
 
 
 if __name__ == '__main__':
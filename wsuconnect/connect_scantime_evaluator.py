@@ -4,9 +4,9 @@
 # Copywrite: Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 24 Mar 2025
 #
-# Modified on 
-VERSION = '2.0.0'
-DATE = '10 November 2025'
+# Modified on 18 Oct 2026 - query the month's mri_tracking rows once and write all updates with one bulk upsert
+VERSION = '2.1.0'
+DATE = '18 Oct 2026'
 
 import sys
 import os
@@ -390,12 +390,21 @@ if __name__ == '__main__':
     print(df_scanLog)
 
     
+    #query the month's mri_tracking rows once, rows are matched by date/project below
+    df_month = st.mysql.sql_mri_tracking_query(year=month.strftime('%Y'), month=month.strftime('%m'))
+    if not df_month.empty:
+        df_month['date'] = df_month['date'].astype(str)
+    ls_dbRows = []
+
     #loop over scan files to compute duration
     for index, row in df_scanLog.iterrows():
         db_idx = None
         if row['arr. time'] != 0:
             dt = datetime.datetime.strptime(row['date'], "%m/%d/%y")
-            df_db = st.mysql.sql_mri_tracking_query(regex=dt.strftime("%Y-%m-%d"), searchcol='date',project=row['project'])
+            if df_month.empty:
+                df_db = pd.DataFrame()
+            else:
+                df_db = df_month[(df_month['date'] == dt.strftime("%Y-%m-%d")) & (df_month['project'] == row['project'])].reset_index(drop=True)
 
 
             arrival = datetime.datetime.strptime(f"{row['date']} {row['arr. time']:04}", "%m/%d/%y %H%M")
@@ -458,7 +467,11 @@ if __name__ == '__main__':
             df_db.loc[db_idx,'direct_fee'] = 272 * charge
 
             print(df_db.iloc[0])
-            st.mysql.sql_mri_tracking_set(df_db)
+            ls_dbRows.append(df_db)
+
+    #write all updated mri_tracking rows with a single bulk upsert
+    if ls_dbRows:
+        st.mysql.sql_mri_tracking_set(pd.concat(ls_dbRows, ignore_index=True))
 
 
     projects = sorted(df_scanLog['project'].unique())
@@ -4,6 +4,7 @@
 # Created by Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 27 July 2023
 #
+# Modified on 18 Oct 2026 - read image dimensions with support_tools.nifti instead of fslval
 # Modified on 7 Feb 2024 - added condor job support
 
 import os
@@ -20,13 +21,14 @@ import subprocess
 #local import
 REALPATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(REALPATH)
+from support_tools.nifti import get_dims
 
 
 
 # GLOBAL INFO
 #versioning
-VERSION = '1.0.0'
-DATE = '15 July 2024'
+VERSION = '1.0.1'
+DATE = '18 Oct 2026'
 
 
 FSLDIR = os.environ["FSLDIR"]
@@ -65,10 +67,7 @@ def main():
     os.system(' '.join([os.path.join(FSLDIR,'bin','overlay'), '1 0', options.REF, '3000 8500', options.INFILE, str(options.LOWER), str(options.UPPER), newFile]))
 
     #get input dims
-    dims = []
-    for di in ['dim1','dim2','dim3']:
-        proc = subprocess.check_output(' '.join([os.path.join(FSLDIR,'bin','fslval'), options.INFILE, di]),shell=True,encoding='utf-8')
-        dims.append(int(proc.split(' ')[0]))
+    dims = get_dims(options.INFILE,3)
 
 
     for plane in ['axial','sagittal','coronal']:
@@ -4,7 +4,7 @@
 # Created by Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 3 March 2025
 #
-# v
+# v1.1.0 on 18 Oct 2026 - find every report's svg figures with a single batched catalog query
 
 import os
 import argparse
@@ -23,8 +23,8 @@ import support_tools as st
 
 # GLOBAL INFO
 #versioning
-VERSION = '1.0.0'
-DATE = '3 March 2025'
+VERSION = '1.1.0'
+DATE = '18 Oct 2026'
 
 
 
@@ -62,11 +62,21 @@ if __name__ == '__main__':
     
     st.creds.read(options.PROJECT)
 
-    for file in glob.glob(os.path.join(st.creds.dataDir,'derivatives','sub-*_aslprep.html')):
+    figTypes = ['basil','basilGM','cbf','score','scrub']
+    reportFiles = glob.glob(os.path.join(st.creds.dataDir,'derivatives','sub-*_aslprep.html'))
+
+    #look up the figures for every report in one round-trip
+    d_specs = {}
+    for file in reportFiles:
+        subName = 'sub-' + file.split('sub-')[1].split('_')[0]
+        for figType in figTypes:
+            d_specs[(subName,figType)] = {'regex': f'desc-{figType}_cbf.svg', 'exclusion': ['bak'], 'inclusion': ['derivatives',subName,'figures']}
+    d_svgFiles = st.mysql.sql_query_batch(st.creds.searchTable,d_specs,database=st.creds.database,searchcol='fullpath')
+
+    for file in reportFiles:
         subName = 'sub-' + file.split('sub-')[1].split('_')[0]
 
 
-        figTypes = ['basil','basilGM','cbf','score','scrub']
         for figType in figTypes:
             head = f"""
 <!DOCTYPE html>
@@ -152,7 +162,7 @@ if __name__ == '__main__':
             """
 
 
-            svgFiles = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,searchcol='fullpath',regex=f'desc-{figType}_cbf.svg',exclusion=['bak'],inclusion=['derivatives',f'{subName}','figures'])
+            svgFiles = d_svgFiles[(subName,figType)]
             count = 1
             for svgFile in sorted(svgFiles):
                 lbls = st.bids.get_bids_labels(svgFile)
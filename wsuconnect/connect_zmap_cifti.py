@@ -4,6 +4,7 @@
 # Created by Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 #
 # Modified on 7 November 2025 - added image as an input to select various aslprep versions
+# Modified on 18 Oct 2026 - look up every participant's zstat images with a single batched catalog query
 #
 
 
@@ -84,13 +85,15 @@ if __name__ == '__main__':
     
     # derivatives_dir = Path(st.creds.dataDir) / 'derivatives'
     
+    #look up every participant's zstat images in one round-trip
+    d_boldFiles = st.mysql.sql_query_batch(st.creds.searchTable,{p: {'regex': 'zstat', 'inclusion': [p,'nii.gz'], 'exclusion': ['space']} for p in df_participants['participant_id']},database=st.creds.database,searchcol="fullpath",returncol="fullpath",progress=False)
     
     for index, row in df_participants.iterrows():
         
         participant_id = row['participant_id']
         # participant_folder = derivatives_dir / participant_id
 
-        bold_files = st.mysql.sql_query(database=st.creds.database,searchtable=st.creds.searchTable,regex="zstat",searchcol="fullpath",returncol="fullpath",progress=False,inclusion=[participant_id,'nii.gz'],exclusion=['space'])
+        bold_files = d_boldFiles[participant_id]
  
         # Skip the participant if their folder already exists (we should really do some other check, derivative folder may contain other types of data)
         # if os.path.exists(participant_folder):
@@ -181,4 +181,337 @@ def DoPost(uri, data = {}, contentType = ''):
     :return: results of the HTTP PUT or POST request on the PACS server
     :rtype: dict
     """
-    return _DoPutOrPost(uri, 'POST', data, contentType)
\ No newline at end of file
+    return _DoPutOrPost(uri, 'POST', data, contentType)
+
+
+class OrthancClient:
+    """
+    Client for the Orthanc PACS REST API that reuses its HTTP connections (keep-alive) and can issue
+    several requests concurrently.
+
+    Each thread keeps its own httplib2.Http object, since they are not thread safe, and httplib2 keeps
+    the connection to the server open between requests. Bulk endpoints are used wherever possible so
+    that polling costs a constant number of requests: /patients?expand and /tools/find with Expand
+    return the tags of every matching resource in one request, and /changes returns the events since
+    a sequence number.
+
+    :param url: Orthanc PACS server URL, e.g. http://10.11.0.31:8042
+    :type url: str
+
+    :param username: username for Orthanc PACS, defaults to the credentials set with SetCredentials()
+    :type username: str, optional
+
+    :param password: password for user `username`, defaults to None
+    :type password: str, optional
+
+    :param max_workers: number of concurrent requests made by get_many(), defaults to 8
+    :type max_workers: int, optional
+
+    :param timeout: socket timeout in seconds, defaults to 60
+    :type timeout: int, optional
+    """
+
+    def __init__(self, url, username=None, password=None, max_workers=8, timeout=60):
+        import threading as _threading
+        self.url = url.rstrip('/')
+        self.credentials = (username, password) if username is not None else _credentials
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._local = _threading.local()
+        self._executor = None
+
+
+    def __getstate__(self):
+        return {'url': self.url, 'credentials': self.credentials, 'max_workers': self.max_workers, 'timeout': self.timeout}
+
+
+    def __setstate__(self, state):
+        import threading as _threading
+        self.__dict__.update(state)
+        self._local = _threading.local()
+        self._executor = None
+
+
+    def _http(self):
+        """
+        HTTP client library object of the current thread, created on first use
+
+        :return: HTTP client library object
+        :rtype: httplib2.Http
+        """
+        h = getattr(self._local, 'h', None)
+        if h is None:
+            import httplib2 as _httplib2
+            h = _httplib2.Http(timeout=self.timeout)
+            if self.credentials != None:
+                h.add_credentials(self.credentials[0], self.credentials[1])
+            self._local.h = h
+        return h
+
+
+    def request(self, method, path, data=None, contentType='', params=None, interpretAsJson=True, status=[200]):
+        """
+        Performs an HTTP request on the PACS server over the current thread's connection
+
+        :param method: HTTP method (GET, POST, PUT or DELETE)
+        :type method: str
+
+        :param path: path relative to the server URL, e.g. /patients
+        :type path: str
+
+        :param data: information to send to the PACS server, dicts are sent as JSON, defaults to None
+        :type data: str, dict, optional
+
+        :param contentType: header content-type if data is str, "" sets contentType to text/plain
+        :type contentType: str, optional
+
+        :param params: query string items, defaults to None
+        :type params: dict, optional
+
+        :param interpretAsJson: decode the response as JSON, defaults to True
+        :type interpretAsJson: bool, optional
+
+        :param status: accepted HTTP status codes, defaults to [200]
+        :type status: list, optional
+
+        :raises Exception: generic error connecting to PACS server
+
+        :return: results of the HTTP request on the PACS server
+        :rtype: dict, list, bytes
+        """
+        uri = self.url + path
+        if params:
+            uri += '?' + _urlencode(params)
+
+        body = None
+        headers = {}
+        if data is not None:
+            if isinstance(data, (str, bytes)):
+                body = data
+                headers['content-type'] = contentType if len(contentType) != 0 else 'text/plain'
+            else:
+                body = _json.dumps(data)
+                headers['content-type'] = 'application/json'
+
+        resp, content = self._http().request(uri, method, body=body, headers=headers)
+        if not (resp.status in status):
+            raise Exception(resp.status)
+        elif not interpretAsJson:
+            return content
+        else:
+            try:
+                return _json.loads(content)
+            except:
+                return content
+
+
+    def get(self, path, params=None, interpretAsJson=True):
+        """
+        Performs an HTTP GET request on the PACS server
+
+        :param path: path relative to the server URL
+        :type path: str
+
+        :param params: query string items, defaults to None
+        :type params: dict, optional
+
+        :param interpretAsJson: decode the response as JSON, defaults to True
+        :type interpretAsJson: bool, optional
+
+        :return: results of the HTTP GET request on the PACS server
+        :rtype: dict, list, bytes
+        """
+        return self.request('GET', path, params=params, interpretAsJson=interpretAsJson)
+
+
+    def post(self, path, data={}, contentType=''):
+        """
+        Performs an HTTP POST request on the PACS server
+
+        :param path: path relative to the server URL
+        :type path: str
+
+        :param data: information to post to the PACS server
+        :type data: str, dict
+
+        :param contentType: header content-type if data is str, "" sets contentType to text/plain
+        :type contentType: str
+
+        :return: results of the HTTP POST request on the PACS server
+        :rtype: dict
+        """
+        return self.request('POST', path, data=data, contentType=contentType, status=[200, 302])
+
+
+    def put(self, path, data={}, contentType=''):
+        """
+        Performs an HTTP PUT request on the PACS server
+
+        :param path: path relative to the server URL
+        :type path: str
+
+        :param data: information to put to the PACS server
+        :type data: str, dict
+
+        :param contentType: header content-type if data is str, "" sets contentType to text/plain
+        :type contentType: str
+
+        :return: results of the HTTP PUT request on the PACS server
+        :rtype: dict
+        """
+        return self.request('PUT', path, data=data, contentType=contentType, status=[200, 302])
+
+
+    def delete(self, path):
+        """
+        Perform an HTTP DELETE on the PACS server
+
+        :param path: path relative to the server URL
+        :type path: str
+
+        :return: results of the HTTP DELETE request on the PACS server
+        :rtype: dict
+        """
+        return self.request('DELETE', path)
+
+
+    def get_many(self, paths, params=None, interpretAsJson=True):
+        """
+        Performs HTTP GET requests for several paths concurrently
+
+        :param paths: paths relative to the server URL
+        :type paths: list
+
+        :param params: query string items added to every request, defaults to None
+        :type params: dict, optional
+
+        :param interpretAsJson: decode the responses as JSON, defaults to True
+        :type interpretAsJson: bool, optional
+
+        :return: results in the order of paths
+        :rtype: list
+        """
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return list(self._executor.map(lambda p: self.get(p, params=params, interpretAsJson=interpretAsJson), paths))
+
+
+    def delete_many(self, paths):
+        """
+        Performs HTTP DELETE requests for several paths concurrently
+
+        :param paths: paths relative to the server URL
+        :type paths: list
+
+        :return: results in the order of paths
+        :rtype: list
+        """
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return list(self._executor.map(self.delete, paths))
+
+
+    def patients(self, expand=True):
+        """
+        All patients in the PACS database in a single request
+
+        :param expand: return the patient resources (MainDicomTags, IsStable, ...) instead of their ids, defaults to True
+        :type expand: bool, optional
+
+        :return: patient resources or ids
+        :rtype: list
+        """
+        return self.get('/patients', params={'expand': ''} if expand else None)
+
+
+    def find(self, level='Patient', query={}, expand=True, limit=None):
+        """
+        Search the PACS database with /tools/find
+
+        :param level: Patient, Study, Series or Instance, defaults to 'Patient'
+        :type level: str, optional
+
+        :param query: DICOM tag values to match (wildcards * and ? are allowed), defaults to {}
+        :type query: dict, optional
+
+        :param expand: return the matching resources instead of their ids, defaults to True
+        :type expand: bool, optional
+
+        :param limit: maximum number of results, defaults to None
+        :type limit: int, optional
+
+        :return: matching resources or ids
+        :rtype: list
+        """
+        data = {'Level': level, 'Query': query, 'Expand': expand}
+        if limit:
+            data['Limit'] = limit
+        return self.post('/tools/find', data)
+
+
+    def changes(self, since=0, limit=100):
+        """
+        Events recorded by the PACS server after sequence number `since`
+
+        :param since: sequence number of the last processed change, defaults to 0
+        :type since: int, optional
+
+        :param limit: maximum number of changes returned, defaults to 100
+        :type limit: int, optional
+
+        :return: dictionary with keys Changes (list of {ChangeType, ID, Path, ResourceType, Seq, Date}), Done and Last
+        :rtype: dict
+        """
+        return self.get('/changes', params={'since': since, 'limit': limit})
+
+
+    def iter_changes(self, since=0, limit=100):
+        """
+        Iterate over all events recorded after sequence number `since`, one /changes request per `limit` events
+
+        :param since: sequence number of the last processed change, defaults to 0
+        :type since: int, optional
+
+        :param limit: number of changes requested at a time, defaults to 100
+        :type limit: int, optional
+
+        :return: changes in sequence order
+        :rtype: generator
+        """
+        while True:
+            d_changes = self.changes(since=since, limit=limit)
+            for change in d_changes['Changes']:
+                yield change
+            since = d_changes['Last']
+            if d_changes['Done'] or not d_changes['Changes']:
+                break
+
+
+    def delete_patient(self, patientName):
+        """
+        Delete every patient with the given PatientName from the PACS database
+
+        :param patientName: PatientName
+        :type patientName: str
+
+        :return: deleted patient ids
+        :rtype: list
+        """
+        ls_ids = self.find(level='Patient', query={'PatientName': patientName}, expand=False)
+        self.delete_many(['/patients/' + i for i in ls_ids])
+        return ls_ids
+
+
+    def close(self):
+        """
+        Stop the concurrent request threads and close this thread's connections
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        h = getattr(self._local, 'h', None)
+        if h is not None:
+            h.close()
+            self._local.h = None
@@ -1,4 +1,4 @@
 # __init__.py
-from ._RestToolbox import DoGet, DoPost, DoPut, DoDelete
+from ._RestToolbox import DoGet, DoPost, DoPut, DoDelete, SetCredentials, OrthancClient
 
-__all__ = ['DoGet', 'DoPost', 'DoPut', 'DoDelete']
\ No newline at end of file
+__all__ = ['DoGet', 'DoPost', 'DoPut', 'DoDelete', 'SetCredentials', 'OrthancClient']
\ No newline at end of file
@@ -27,8 +27,12 @@ creds.masterMachineName = _fullCredentials['master_machine_name']
 
 #import modules
 from wsuconnect.support_tools import bids
+from wsuconnect.support_tools import catalog
 from wsuconnect.support_tools import condor
+from wsuconnect.support_tools import nifti
+from wsuconnect.support_tools import pacs
 from wsuconnect.support_tools import RestToolbox
+from wsuconnect.support_tools import spool
 
 from .apply_brainmask import apply_brainmask
 from .check_rawdata import check_rawdata
@@ -42,9 +46,10 @@ from .flirt_pngappend import flirt_pngappend
 from .fmriprep_clean_workdir import fmriprep_clean_workdir
 #from .fsreconall_stage1_wf import fsreconall_stage1
 #from .fsreconall_stage2_wf import fsreconall_stage2
-from .get_scan_id import get_scan_id
+from .get_scan_id import get_scan_id, classify_scans, load_scan_id_rules
 from . import mysql
 from .move_html import move_html
+from .normalize_permissions import normalize_permissions
 from .prepare_examcard_html import prepare_examcard_html
 from .remove_dirs import remove_dirs
 from .xdf_extract_physio import xdf_extract_physio
@@ -90,4 +95,4 @@ def import_dti_preprocess_wf():
 specBase = specBase()
 
 
-__all__ = ['apply_brainmask','bids','check_rawdata','compute_segstats','convert_dicoms','copy_dirs','condor','dti_flirt','evaluate_source_file_transfer','feat_full_firstlevel','flirt_pngappend','fmriprep_clean_workdir','fsreconall_stage1','fsreconall_stage2','get_scan_id','import_flirt','import_dti_preprocess','mysql','prepare_examcard_html','remove_dirs','RestToolbox','creds','subject','specBase','xdf_extract_physio']
\ No newline at end of file
+__all__ = ['apply_brainmask','bids','catalog','check_rawdata','compute_segstats','convert_dicoms','copy_dirs','condor','dti_flirt','evaluate_source_file_transfer','feat_full_firstlevel','flirt_pngappend','fmriprep_clean_workdir','fsreconall_stage1','fsreconall_stage2','get_scan_id','classify_scans','load_scan_id_rules','import_flirt','import_dti_preprocess','mysql','nifti','normalize_permissions','pacs','prepare_examcard_html','remove_dirs','RestToolbox','spool','creds','subject','specBase','xdf_extract_physio']
\ No newline at end of file
@@ -3,9 +3,11 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 16 Sept 2021
 #
+# v2.1.0 on 18 Oct 2026 - cache the pybids entity configuration used by get_bids_labels
 # v2.0.0 on 1 April 2023 - simplify code
 
 import os
+from functools import lru_cache
 
 def get_bids_filename(subject: str=None, session: str=None, acquisition: str=None, task: str=None, direction: str=None, run: str=None, process: str=None, resolution: str=None, space: str=None, description: str=None, suffix: str=None, extension: str=None) -> str:
     """
@@ -87,6 +89,21 @@ def get_bids_filename(subject: str=None, session: str=None, acquisition: str=Non
     return filename
 
 
+@lru_cache(maxsize=None)
+def _get_bids_entities() -> tuple:
+    """
+    Load the pybids 'bids' and 'derivatives' entity definitions once per process.
+
+    :return: pybids Entity objects
+    :rtype: tuple
+    """
+    from bids.layout.models import Config
+    entities = {}
+    for c in ['bids','derivatives']:
+        entities.update(Config.load(c).entities)
+    return tuple(entities.values())
+
+
 def get_bids_labels(IN_FILE: str) -> dict:
     """
     Get bids compliant filename labels from a file
@@ -102,7 +119,7 @@ def get_bids_labels(IN_FILE: str) -> dict:
 
     from bids.layout import parse_file_entities
     filename = os.path.basename(IN_FILE)
-    labels = parse_file_entities(filename)
+    labels = parse_file_entities(filename,entities=_get_bids_entities())
     if 'extension' in labels:
         labels['extension'] = labels['extension'].lstrip('.')
     if 'desc' in labels:
@@ -0,0 +1,4 @@
+# __init__.py
+from ._catalog import FILE_COLUMNS, BIDS_COLUMNS, CATALOG_COLUMNS, get_catalog_entry, get_bids_entry, get_catalog_row, get_checkpoint_file, load_checkpoint, save_checkpoint, scan_tree, walk_tree, get_snapshot_file, write_snapshot, read_snapshot_info, open_snapshot, get_conversion_manifest_file, fingerprint_dir, find_conversion_dirs
+
+__all__ = ['FILE_COLUMNS','BIDS_COLUMNS','CATALOG_COLUMNS','get_catalog_entry','get_bids_entry','get_catalog_row','get_checkpoint_file','load_checkpoint','save_checkpoint','scan_tree','walk_tree','get_snapshot_file','write_snapshot','read_snapshot_info','open_snapshot','get_conversion_manifest_file','fingerprint_dir','find_conversion_dirs']
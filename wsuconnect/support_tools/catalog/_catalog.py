@@ -0,0 +1,663 @@
+# _catalog.py
+
+# Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
+# Created on 18 Oct 2026
+#
+# v1.4.3 on 18 Oct 2026 - walk_tree logs and counts directories it cannot list and raises after the walk (strict)
+# v1.4.2 on 18 Oct 2026 - scan_tree reuses the checkpoint entry of a directory that cannot be listed (or raises)
+# v1.4.1 on 18 Oct 2026 - snapshots record the catalog version of each exported table
+# v1.4.0 on 18 Oct 2026 - dcm2niix conversion manifest: per-acquisition DICOM counts and fingerprints
+# v1.3.0 on 18 Oct 2026 - local SQLite catalog snapshot
+# v1.2.0 on 18 Oct 2026 - parsed BIDS entity columns for the searchTable
+# v1.1.0 on 18 Oct 2026 - threaded os.scandir walker that streams files to the caller
+# v1.0.0 on 18 Oct 2026 - incremental (checkpointed) directory walk for the searchTable
+
+import os
+import re
+import json
+import time
+import sqlite3
+
+
+VERSION = '1.4.3'
+DATE = '18 Oct 2026'
+
+#searchTable columns: file columns followed by the parsed BIDS entity columns
+FILE_COLUMNS = ['fullpath','filename','basename','extension']
+BIDS_COLUMNS = ['subject','session','acquisition','task','run','space','description','suffix','pipeline']
+CATALOG_COLUMNS = FILE_COLUMNS + BIDS_COLUMNS
+
+_RE_SUBJECT = re.compile(r'(?:^|_)sub-([a-zA-Z0-9]+)')
+_RE_SESSION = re.compile(r'(?:^|_)ses-([a-zA-Z0-9]+)')
+
+
+# ******************* CATALOG ROW FOR A SINGLE FILE ********************
+def get_catalog_entry(fullpath: str) -> tuple:
+    """
+    Split a file's fullpath into the column values stored in a project's searchTable.
+
+    Parameters
+    ----------
+    fullpath : str
+        fullpath to a file on disk
+
+    Returns
+    -------
+    tuple
+        (fullpath, filename, basename, extension) as stored in the searchTable
+    """
+    filename = os.path.basename(fullpath)
+
+    # get basename and extensions (funky due to no filename/extension or multiple '.')
+    idx = filename.find('.')
+    if idx == -1:
+        return fullpath, filename, filename, 'NULL'
+
+    if len(filename[1:]) <= 48:
+        extension = filename[idx+1:]
+    else:
+        extension = filename[-48:]
+
+    if idx == 0:
+        return fullpath, filename, 'NULL', extension
+    return fullpath, filename, filename[:idx], extension
+
+
+# ******************* BIDS ENTITIES FOR A SINGLE FILE ********************
+def get_bids_entry(fullpath: str) -> tuple:
+    """
+    Parse the BIDS entities of a file into the entity columns stored in a project's searchTable.
+
+    Filename entities are parsed with support_tools.bids.get_bids_labels. Subject and session fall
+    back to the nearest sub-*/ses-* component of the path (e.g. recon-all or feat directories), and
+    the pipeline is the directory directly beneath derivatives/ (derivatives/<pipeline>/...); files
+    written directly to derivatives/sub-* are given the pipeline 'derivatives'.
+
+    Parameters
+    ----------
+    fullpath : str
+        fullpath to a file on disk
+
+    Returns
+    -------
+    tuple
+        values ordered as BIDS_COLUMNS, None for entities that are not present
+    """
+    from wsuconnect.support_tools.bids import get_bids_labels
+
+    try:
+        labels = get_bids_labels(fullpath)
+    except Exception:
+        labels = {}
+
+    parts = fullpath.split(os.sep)
+    for k, r in [('subject',_RE_SUBJECT),('session',_RE_SESSION)]:
+        if not labels.get(k):
+            for part in reversed(parts):
+                m = r.search(part)
+                if m:
+                    labels[k] = m.group(1)
+                    break
+
+    if 'derivatives' in parts:
+        idx = parts.index('derivatives')
+        if idx + 2 < len(parts) and not parts[idx+1].startswith('sub-'):
+            labels['pipeline'] = parts[idx+1]
+        else:
+            labels['pipeline'] = 'derivatives'
+
+    return tuple(None if labels.get(k) is None else str(labels[k]) for k in BIDS_COLUMNS)
+
+
+def get_catalog_row(fullpath: str) -> tuple:
+    """
+    Full searchTable row (file columns and BIDS entity columns) for a file.
+
+    Parameters
+    ----------
+    fullpath : str
+        fullpath to a file on disk
+
+    Returns
+    -------
+    tuple
+        values ordered as CATALOG_COLUMNS
+    """
+    return get_catalog_entry(fullpath) + get_bids_entry(fullpath)
+
+
+# ******************* CHECKPOINT FILE ********************
+def get_checkpoint_file(dataDir: str, project: str) -> str:
+    """
+    Fullpath to the directory checkpoint file used by connect_neuro_db_update.py --incremental.
+
+    Parameters
+    ----------
+    dataDir : str
+        project data directory (support_tools.creds.dataDir)
+    project : str
+        project identifier (support_tools.creds.project)
+
+    Returns
+    -------
+    str
+        fullpath to <dataDir>/code/processing_logs/connect_neuro_db_update/<project>_catalog_checkpoint.json
+    """
+    return os.path.join(dataDir,'code','processing_logs','connect_neuro_db_update',project + '_catalog_checkpoint.json')
+
+
+def load_checkpoint(checkpointFile: str) -> dict:
+    """
+    Read a directory checkpoint written by save_checkpoint(). A missing or unreadable
+    checkpoint returns an empty dictionary, which forces a full scan.
+
+    Parameters
+    ----------
+    checkpointFile : str
+        fullpath to the checkpoint JSON file
+
+    Returns
+    -------
+    dict
+        {directory: {'mtime_ns': int, 'ino': int, 'files': list, 'dirs': list}}
+    """
+    try:
+        with open(checkpointFile) as j:
+            return json.load(j)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_checkpoint(checkpointFile: str, checkpoint: dict):
+    """
+    Atomically write a directory checkpoint to disk.
+
+    Parameters
+    ----------
+    checkpointFile : str
+        fullpath to the checkpoint JSON file
+    checkpoint : dict
+        directory checkpoint returned by scan_tree()
+    """
+    if not os.path.isdir(os.path.dirname(checkpointFile)):
+        os.makedirs(os.path.dirname(checkpointFile))
+
+    tmpFile = checkpointFile + '.tmp'
+    with open(tmpFile,'w') as j:
+        json.dump(checkpoint,j)
+    os.replace(tmpFile,checkpointFile)
+
+
+# ******************* CHECKPOINTED DIRECTORY WALK ********************
+def scan_tree(rootDir: str, checkpoint: dict=None, callback=None, progress: bool=False) -> tuple:
+    """
+    Walk rootDir and return every (non-symlink) file beneath it.
+
+    A directory's mtime changes whenever an entry is created, removed or renamed inside of it,
+    so a directory whose mtime and inode match the checkpoint is not listed again; its files and
+    sub-directories are taken from the checkpoint instead. Only a single stat() per directory is
+    needed for unchanged subtrees. A directory that cannot be read keeps its checkpoint entry.
+
+    Parameters
+    ----------
+    rootDir : str
+        fullpath to the directory to walk
+    checkpoint : dict, optional
+        directory checkpoint from a previous scan (see load_checkpoint()), by default None
+    callback : callable, optional
+        function called with the fullpath of every entry in a directory that had to be re-listed, by default None
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    tuple
+        (list of file fullpaths, updated checkpoint dict, number of re-listed directories)
+
+    Raises
+    ------
+    OSError
+        a directory could not be listed and has no checkpoint entry to fall back on; its subtree
+        would otherwise be missing from the returned files
+    """
+    if checkpoint is None:
+        checkpoint = {}
+
+    files = []
+    newCheckpoint = {}
+    nRescanned = 0
+    stack = [rootDir]
+
+    while stack:
+        d = stack.pop()
+        prev = checkpoint.get(d)
+        try:
+            dirStat = os.stat(d)
+            if prev and prev['mtime_ns'] == dirStat.st_mtime_ns and prev['ino'] == dirStat.st_ino:
+                entry = prev
+            else:
+                entry = {'mtime_ns': dirStat.st_mtime_ns, 'ino': dirStat.st_ino, 'files': [], 'dirs': []}
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_symlink():
+                            continue
+                        if e.is_dir(follow_symlinks=False):
+                            entry['dirs'].append(e.name)
+                        else:
+                            entry['files'].append(e.name)
+                nRescanned += 1
+                if callback:
+                    for f in entry['files'] + entry['dirs']:
+                        callback(os.path.join(d,f))
+                if progress:
+                    print('\trescanned ' + d)
+        except (FileNotFoundError, NotADirectoryError):
+            #removed since its parent was listed (or not a directory), nothing beneath it exists
+            continue
+        except OSError as e:
+            #could not list (e.g. a transient NFS or permission error): never report the subtree as empty,
+            #reuse the previous listing, or stop the scan so that the caller does not delete its rows
+            if prev is None:
+                raise OSError(f"cannot list {d} and it has no checkpoint entry: {e}") from e
+            print(f"WARNING: cannot list {d} ({e}), reusing its checkpoint entry")
+            entry = prev
+
+        newCheckpoint[d] = entry
+        files.extend(os.path.join(d,f) for f in entry['files'])
+        stack.extend(os.path.join(d,s) for s in entry['dirs'])
+
+    return files, newCheckpoint, nRescanned
+
+
+# ******************* PARALLEL DIRECTORY WALK ********************
+def _list_dir(d: str, callback=None) -> tuple:
+    """
+    List a single directory with os.scandir, skipping symlinks. A directory that no longer exists
+    (or is not a directory) is empty; any other listing error is returned to the caller.
+
+    Parameters
+    ----------
+    d : str
+        fullpath to the directory
+    callback : callable, optional
+        function called with the fullpath of every listed entry, by default None
+
+    Returns
+    -------
+    tuple
+        (list of file fullpaths, list of sub-directory fullpaths, OSError or None)
+    """
+    files = []
+    dirs = []
+    error = None
+    try:
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_symlink():
+                    continue
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(e.path)
+                else:
+                    files.append(e.path)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    except OSError as e:
+        error = e
+
+    if callback:
+        for f in files + dirs:
+            callback(f)
+
+    return files, dirs, error
+
+
+def walk_tree(rootDirs: str|list, max_workers: int=8, callback=None, strict: bool=True):
+    """
+    Walk one or more directory trees with a pool of threads and yield every (non-symlink) file.
+
+    Every directory is listed as a separate task, so the project directories and their
+    sub-*/ses-* subtrees are read concurrently; this hides the per-request latency of the
+    NFS-mounted shares. Files are yielded as soon as their directory has been listed, so the
+    full file list is never held in memory.
+
+    Directories that cannot be listed (e.g. a transient NFS or permission error) are logged and
+    counted. In strict mode the generator raises once the walk is complete, so that a consumer
+    rebuilding a table (sql_table_bulk_load) fails instead of swapping in a table without them.
+
+    Parameters
+    ----------
+    rootDirs : str | list
+        fullpath to a directory or list of directories to walk
+    max_workers : int, optional
+        number of threads listing directories, by default 8
+    callback : callable, optional
+        function called (in the worker threads) with the fullpath of every file and directory, by default None
+    strict : bool, optional
+        raise OSError after the walk if any directory could not be listed, by default True
+
+    Returns
+    -------
+    generator
+        fullpath of each file, in no particular order
+
+    Raises
+    ------
+    OSError
+        strict and at least one directory could not be listed
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if isinstance(rootDirs,str):
+        rootDirs = [rootDirs]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_list_dir,d,callback): d for d in rootDirs}
+        ls_errors = []
+        while pending:
+            done, _ = wait(pending,return_when=FIRST_COMPLETED)
+            for future in done:
+                d = pending.pop(future)
+                files, dirs, error = future.result()
+                if error is not None:
+                    print(f"WARNING: cannot list {d} ({error})")
+                    ls_errors.append(d)
+                pending.update({executor.submit(_list_dir,s,callback): s for s in dirs})
+                yield from files
+
+    if ls_errors and strict:
+        raise OSError(f"walk_tree: {len(ls_errors)} directories could not be listed, e.g. {ls_errors[0]}")
+
+
+# ******************* LOCAL SQLITE SNAPSHOT ********************
+def get_snapshot_file(dataDir: str, project: str) -> str:
+    """
+    Fullpath to a project's local catalog snapshot. The environment variable
+    CONNECT_CATALOG_SNAPSHOT overrides the default location (e.g. a stand-in catalog).
+
+    Parameters
+    ----------
+    dataDir : str
+        project data directory (support_tools.creds.dataDir)
+    project : str
+        project identifier (support_tools.creds.project)
+
+    Returns
+    -------
+    str
+        fullpath to <dataDir>/code/catalog/<project>_catalog.sqlite
+    """
+    if os.environ.get('CONNECT_CATALOG_SNAPSHOT'):
+        return os.environ['CONNECT_CATALOG_SNAPSHOT']
+    return os.path.join(dataDir,'code','catalog',project + '_catalog.sqlite')
+
+
+def write_snapshot(snapshotFile: str, tables: dict, exported: float=None, versions: dict=None) -> dict:
+    """
+    Write one or more catalog tables to a local SQLite snapshot. The snapshot is built in a
+    temporary file and atomically moved over snapshotFile, so readers never see a partial file.
+
+    Columns are declared COLLATE NOCASE and fullpath is indexed, matching the case-insensitive
+    comparisons and anchored LIKE searches of the MySQL tables.
+
+    Parameters
+    ----------
+    snapshotFile : str
+        fullpath to the snapshot file
+    tables : dict
+        {table: (list of columns, iterable of row tuples)}
+    exported : float, optional
+        epoch time the rows were read from the source database, by default None (now)
+    versions : dict, optional
+        {table: catalog version of the source table when its rows were read}, by default None (unknown)
+
+    Returns
+    -------
+    dict
+        {table: number of rows written}
+    """
+    if exported is None:
+        exported = time.time()
+    if versions is None:
+        versions = {}
+    if not os.path.isdir(os.path.dirname(snapshotFile)):
+        os.makedirs(os.path.dirname(snapshotFile))
+
+    tmpFile = snapshotFile + '.tmp'
+    if os.path.isfile(tmpFile):
+        os.remove(tmpFile)
+
+    d_rows = {}
+    connection = sqlite3.connect(tmpFile)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute("CREATE TABLE _snapshot (tablename TEXT PRIMARY KEY, exported REAL, nrows INTEGER, version INTEGER)")
+        for table, (columns, rows) in tables.items():
+            connection.execute(f"CREATE TABLE {table} ({', '.join(c + ' TEXT COLLATE NOCASE' for c in columns)})")
+            sqlCMD = f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(columns))})"
+            nRows = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= 10000:
+                    connection.executemany(sqlCMD,batch)
+                    nRows += len(batch)
+                    batch = []
+            connection.executemany(sqlCMD,batch)
+            nRows += len(batch)
+            connection.execute(f"CREATE INDEX idx_{table}_fullpath ON {table} (fullpath)")
+            connection.execute("INSERT INTO _snapshot VALUES (?, ?, ?, ?)",(table,exported,nRows,versions.get(table)))
+            d_rows[table] = nRows
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(tmpFile,snapshotFile)
+    return d_rows
+
+
+def read_snapshot_info(snapshotFile: str) -> dict:
+    """
+    Tables contained in a local catalog snapshot, the time each was exported and the catalog version
+    of the source table at that time.
+
+    Parameters
+    ----------
+    snapshotFile : str
+        fullpath to the snapshot file
+
+    Returns
+    -------
+    dict
+        {table: {'exported': epoch time, 'nrows': int, 'version': int or None}}, empty if the snapshot does not exist or cannot be read
+    """
+    if not os.path.isfile(snapshotFile):
+        return {}
+    try:
+        connection = open_snapshot(snapshotFile)
+        columns = [f[1] for f in connection.execute("PRAGMA table_info(_snapshot)")]
+        #snapshots written before catalog versions were recorded have no version and are never current
+        versionCol = 'version' if 'version' in columns else 'NULL'
+        return {f[0]: {'exported': f[1], 'nrows': f[2], 'version': f[3]} for f in connection.execute(f"SELECT tablename, exported, nrows, {versionCol} FROM _snapshot")}
+    except sqlite3.Error:
+        return {}
+
+
+_SNAPSHOT_CONNECTIONS = {}
+
+
+def _regexp(pattern: str, value: str) -> bool:
+    if value is None:
+        return None
+    return re.search(pattern,value,re.IGNORECASE) is not None
+
+
+def open_snapshot(snapshotFile: str) -> sqlite3.Connection:
+    """
+    Open a read-only connection to a local catalog snapshot, with a case-insensitive REGEXP
+    function so that the statements built for MySQL can be run unchanged. Connections are
+    reused until the snapshot file is replaced.
+
+    Parameters
+    ----------
+    snapshotFile : str
+        fullpath to the snapshot file
+
+    Returns
+    -------
+    sqlite3.Connection
+        open read-only connection
+    """
+    mtime = os.stat(snapshotFile).st_mtime_ns
+    connection, prevMtime = _SNAPSHOT_CONNECTIONS.get(snapshotFile,(None,None))
+    if connection is not None and prevMtime == mtime:
+        return connection
+    if connection is not None:
+        connection.close()
+
+    connection = sqlite3.connect(f"file:{snapshotFile}?mode=ro",uri=True,check_same_thread=False)
+    connection.create_function('REGEXP',2,_regexp,deterministic=True)
+    _SNAPSHOT_CONNECTIONS[snapshotFile] = (connection, mtime)
+    return connection
+
+
+# ******************* DCM2NIIX CONVERSION MANIFEST ********************
+#files in an acquisition directory that are not DICOM images (e.g. dcm2niix outputs written in place)
+_NON_DICOM_EXTENSIONS = ('.json','.nii','.nii.gz','.bval','.bvec','.txt','.log')
+
+
+def get_conversion_manifest_file(dataDir: str, project: str) -> str:
+    """
+    Fullpath to the conversion manifest used by connect_dcm2nii.py.
+
+    Parameters
+    ----------
+    dataDir : str
+        project data directory (support_tools.creds.dataDir)
+    project : str
+        project identifier (support_tools.creds.project)
+
+    Returns
+    -------
+    str
+        fullpath to <dataDir>/code/processing_logs/connect_dcm2niix/<project>_dcm2nii_manifest.json
+    """
+    return os.path.join(dataDir,'code','processing_logs','connect_dcm2niix',project + '_dcm2nii_manifest.json')
+
+
+def fingerprint_dir(acqDir: str, prev: dict=None) -> dict:
+    """
+    Count the DICOM images beneath an acquisition directory and fingerprint them.
+
+    The fingerprint is a SHA-1 of the relative path, size and mtime of every image, so it changes
+    when a series gains, loses or rewrites images. If prev is the manifest entry recorded for the
+    same directory and neither the directory nor any of its sub-directories has a new mtime, no
+    image has been added, removed or renamed and the recorded count and fingerprint are returned
+    without listing the directory.
+
+    Parameters
+    ----------
+    acqDir : str
+        fullpath to an acquisition (acq-*) directory
+    prev : dict, optional
+        manifest entry from a previous run, by default None
+
+    Returns
+    -------
+    dict
+        n_dicoms (int), fingerprint (str) and dirs ({relative sub-directory: mtime_ns}, '' is acqDir itself)
+    """
+    import hashlib
+
+    if prev and prev.get('dirs'):
+        try:
+            if all(os.stat(os.path.join(acqDir,d)).st_mtime_ns == m for d,m in prev['dirs'].items()):
+                return {'n_dicoms': prev['n_dicoms'], 'fingerprint': prev['fingerprint'], 'dirs': prev['dirs']}
+        except (OSError, KeyError):
+            pass
+
+    ls_entries = []
+    d_dirs = {}
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        d = os.path.join(acqDir,rel)
+        try:
+            #stat before listing, so that images added while listing change the recorded mtime
+            d_dirs[rel] = os.stat(d).st_mtime_ns
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_symlink() or e.name.startswith('.'):
+                        continue
+                    relName = os.path.join(rel,e.name) if rel else e.name
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(relName)
+                    elif not e.name.lower().endswith(_NON_DICOM_EXTENSIONS):
+                        s = e.stat(follow_symlinks=False)
+                        ls_entries.append(f"{relName}\0{s.st_size}\0{s.st_mtime_ns}")
+        except OSError:
+            continue
+
+    ls_entries.sort()
+    return {'n_dicoms': len(ls_entries),
+            'fingerprint': hashlib.sha1('\n'.join(ls_entries).encode()).hexdigest(),
+            'dirs': d_dirs}
+
+
+def find_conversion_dirs(sourceDir: str, manifest: dict=None, pattern: str='acq-', progress: bool=False) -> dict:
+    """
+    Walk a project's sourcedata directory once and compare every acquisition directory with the
+    conversion manifest. Acquisition directories are not descended into by the walk; their images
+    are counted and fingerprinted with fingerprint_dir().
+
+    Parameters
+    ----------
+    sourceDir : str
+        fullpath to the project's sourcedata directory
+    manifest : dict, optional
+        conversion manifest from a previous run (see get_conversion_manifest_file() and load_checkpoint()), by default None
+    pattern : str, optional
+        directories whose name contains pattern are acquisition directories, by default 'acq-'
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    dict
+        {acquisition directory: fingerprint_dir() dict with the additional keys state ('new', 'changed'
+        or 'unchanged') and gained (number of images added since the manifest entry was recorded)}
+    """
+    if manifest is None:
+        manifest = {}
+
+    d_found = {}
+    stack = [sourceDir]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                ls_subDirs = [e.path for e in it if e.is_dir(follow_symlinks=False)]
+        except OSError:
+            if progress:
+                print('WARNING: cannot list ' + d)
+            continue
+
+        for subDir in ls_subDirs:
+            if pattern not in os.path.basename(subDir):
+                stack.append(subDir)
+                continue
+
+            prev = manifest.get(subDir)
+            d_dir = fingerprint_dir(subDir,prev)
+            if prev is None:
+                d_dir['state'] = 'new'
+                d_dir['gained'] = d_dir['n_dicoms']
+            else:
+                d_dir['state'] = 'unchanged' if d_dir['fingerprint'] == prev.get('fingerprint') else 'changed'
+                d_dir['gained'] = d_dir['n_dicoms'] - prev.get('n_dicoms',0)
+            d_found[subDir] = d_dir
+
+            if progress and d_dir['state'] != 'unchanged':
+                print(f"\t{d_dir['state']}: {subDir} ({d_dir['n_dicoms']} images)")
+
+    return d_found
@@ -4,6 +4,10 @@
 # Copywrite: Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 26 Jan 2021
 #
+# Modified on 18 Oct 2026 - in-process fallback writes its own brain probability image, never the file the BET server writes
+# Modified on 18 Oct 2026 - finite BET server timeout (BET_TIMEOUT) before falling back to in-process extraction
+# Modified on 18 Oct 2026 - do_antspynet_bet uses the resident BET server when available
+# Modified on 18 Oct 2026 - get_total_vols reads dim4 with support_tools.nifti, fslval only as a fallback
 # Modified on 15 Nov 2024 - implementation of nipype workflow and nodes
 # Modified on 29 Sept 2023 - add support for antspynet brain segmentation
 # Modified on 28 July 2023 - add some corrections for multiple image types with difference acq parameters in same session
@@ -41,7 +45,7 @@ if "FSLDIR" in os.environ:
     FSLDIR = os.environ["FSLDIR"]
 
 
-VERSION = '4.1.0'
+VERSION = '4.1.1'
 DATE = '17 Feb 2025'
 
 
@@ -62,7 +66,7 @@ def get_total_vols(main_file: str, volume: str|int, FSLDIR: str) -> int:
     :param main_file: fullpath to a NIfTI image
     :type main_file: str
 
-    :param FSLDIR: path to the location of the FSL installation
+    :param FSLDIR: path to the location of the FSL installation, only used if the header cannot be read in-process
     :type FSLDIR: str
 
     :return: number of volumes in image main_file
@@ -70,8 +74,12 @@ def get_total_vols(main_file: str, volume: str|int, FSLDIR: str) -> int:
     """
     import os
     import subprocess
-    proc = subprocess.check_output(os.path.join(FSLDIR,'bin','fslval') + ' ' + main_file + ' dim4',shell=True,encoding='utf-8')
-    totalVols = int(proc.split(' ')[0])
+    try:
+        from wsuconnect.support_tools.nifti import get_dims
+        totalVols = get_dims(main_file,4)[3]
+    except Exception:
+        proc = subprocess.check_output(os.path.join(FSLDIR,'bin','fslval') + ' ' + main_file + ' dim4',shell=True,encoding='utf-8')
+        totalVols = int(proc.split(' ')[0])
 
     if volume == 'center':
         vols = int(totalVols/2)
@@ -113,15 +121,27 @@ def do_antspynet_bet(main_file: str, main_file_brain: str, main_file_brainmask:
     """
 
     import ants
-    import antspynet
     import os
 
-    inImg = ants.image_read(main_file)
-    brainSeg = antspynet.brain_extraction(inImg, modality=bet_params['modality'], antsxnet_cache_directory=os.path.join(REALPATH,'support_tools','antsxnet_cache'), verbose=True)
-    brainSeg.to_file(os.path.join(os.path.dirname(main_file_brain),'antspynet_brainseg.nii.gz'))
+    segFile = os.path.join(os.path.dirname(main_file_brain),'antspynet_brainseg.nii.gz')
+
+    #use the resident BET server if one is listening (run_antspynet_bet.py --socket), otherwise extract in-process
+    try:
+        from wsuconnect.support_tools.spool import socket_request, BET_SOCKET, BET_TIMEOUT
+        b_served = socket_request(BET_SOCKET,{'input': main_file, 'seg': segFile, 'modality': bet_params['modality']},timeout=BET_TIMEOUT)['ok']
+    except Exception:
+        b_served = False
+
+    #the server may still finish and replace segFile after the timeout, extract in-process to a separate file
+    if not b_served:
+        import antspynet
+        segFile = os.path.join(os.path.dirname(main_file_brain),'antspynet_brainseg_local.nii.gz')
+        inImg = ants.image_read(main_file)
+        brainSeg = antspynet.brain_extraction(inImg, modality=bet_params['modality'], antsxnet_cache_directory=os.path.join(REALPATH,'support_tools','antsxnet_cache'), verbose=True)
+        brainSeg.to_file(segFile)
 
     #create brainmask and brain image
-    os.system('fslmaths ' + os.path.join(os.path.dirname(main_file_brain),'antspynet_brainseg.nii.gz') + ' -thr 0.9 -bin ' + main_file_brainmask)
+    os.system('fslmaths ' + segFile + ' -thr 0.9 -bin ' + main_file_brainmask)
 
     os.system('fslmaths ' + main_file + ' -mas ' + main_file_brainmask + ' ' + main_file_brain)
 
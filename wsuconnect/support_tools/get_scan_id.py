@@ -4,14 +4,18 @@
 # Copywrite: Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 16 Sept 2021
 #
-# 
+# Modified on 18 Oct 2026 - compiled, per-project cached scan_id.json rule engine (ScanIdRules) and batch classify_scans
+# Modified on 18 Oct 2026 - read image dimensions with support_tools.nifti instead of four fslval processes
 
 import os
 import sys
+import copy
 import json
+import heapq
 import subprocess
 from typing import Tuple
 import traceback
+from functools import lru_cache
 
 #local import
 
@@ -34,6 +38,185 @@ if "FREESURFER_HOME" in os.environ:
 
     
 
+#sidecar fields evaluated first when checking a rule, they usually discriminate between image types
+DISCRIMINATING_FIELDS = ['SeriesDescription','ProtocolName']
+
+
+
+# ******************* RULE ENGINE ********************
+class ScanIdRules:
+    """
+    A project's scan_id.json compiled into an indexed matcher.
+
+    Rules (image types with a json_header) are bucketed by their dims, and rules with no dims
+    requirement are kept in a separate list. Each sidecar is only tested against the rules in its dims
+    bucket plus that list, in scan_id.json order. The first rule whose json_header conditions all hold
+    wins, exactly as in the original linear search. The substrings required or excluded by every rule
+    are collected per header field. Each sidecar value is stringified and scanned once per substring,
+    not once per rule. Conditions on DISCRIMINATING_FIELDS are checked first.
+
+    :param scanId: parsed contents of the project's scan_id.json file
+    :type scanId: dict
+    """
+
+    def __init__(self, scanId: dict):
+        self.scanId = scanId
+        self.rules = []
+        self._byDims = {}
+        self._anyDims = []
+        self._tokens = {}
+
+        for order, (imageType, d_rule) in enumerate(scanId.items()):
+            if not isinstance(d_rule,dict) or not 'json_header' in d_rule.keys():
+                continue
+
+            ls_cond = []
+            checkDims = False
+            possible = True
+            for headerKey, value in d_rule['json_header'].items():
+                if 'Not' in headerKey:
+                    field = headerKey.replace('Not','')
+                    tokens = tuple(str(k) for k in (value if isinstance(value,(list,tuple,str)) else [value]))
+                    ls_cond.append(('not',field,tokens))
+                elif isinstance(value,bool) or not isinstance(value,(int,list,str)):
+                    possible = False
+                elif isinstance(value,int):
+                    checkDims = True
+                    ls_cond.append(('eq',headerKey,value))
+                else:
+                    checkDims = True
+                    ls_cond.append(('all',headerKey,tuple(str(k) for k in (value if isinstance(value,list) else [value]))))
+
+            dims = tuple(d_rule['dims']) if checkDims and 'dims' in d_rule.keys() else None
+            if not possible or (checkDims and dims is None):
+                continue
+
+            ls_cond.sort(key=lambda c: 0 if c[1] in DISCRIMINATING_FIELDS else 1)
+            rule = (order, imageType, dims, ls_cond)
+            self.rules.append(rule)
+            if checkDims:
+                self._byDims.setdefault(dims,[]).append(rule)
+            else:
+                self._anyDims.append(rule)
+            for kind, field, value in ls_cond:
+                if kind != 'eq':
+                    self._tokens.setdefault(field,set()).update(value)
+
+
+    def candidates(self, dims: list) -> list:
+        """
+        Rules that can match an image of the given dims, in scan_id.json order.
+
+        :param dims: image dimensions [dim1, dim2, dim3, dim4]
+        :type dims: list
+
+        :return: list of (order, imageType, dims, conditions) tuples
+        :rtype: list
+        """
+        return list(heapq.merge(self._byDims.get(tuple(dims),[]),self._anyDims))
+
+
+    def match(self, jsonHeader: dict, dims: list) -> Tuple[str, str]:
+        """
+        Find the first rule that matches a sidecar and image dims.
+
+        :param jsonHeader: contents of the image's JSON sidecar
+        :type jsonHeader: dict
+
+        :param dims: image dimensions [dim1, dim2, dim3, dim4]
+        :type dims: list
+
+        :return: matching image type (None if no rule matched) and an explanation of the decision
+        :rtype: Tuple[str, str]
+        """
+        d_present = {}
+        def present(field):
+            if not field in d_present:
+                val = str(jsonHeader[field])
+                d_present[field] = {t for t in self._tokens.get(field,()) if t in val}
+            return d_present[field]
+
+        ls_candidates = self.candidates(dims)
+        ls_failed = []
+        for order, imageType, ruleDims, ls_cond in ls_candidates:
+            ls_explain = []
+            failed = None
+            for kind, field, value in ls_cond:
+                if not field in jsonHeader.keys():
+                    failed = f"{field} missing from sidecar"
+                elif kind == 'eq':
+                    if jsonHeader[field] == value:
+                        ls_explain.append(f"{field} == {value}")
+                    else:
+                        failed = f"{field} {jsonHeader[field]!r} != {value}"
+                elif kind == 'all':
+                    ls_missing = [t for t in value if not t in present(field)]
+                    if not ls_missing:
+                        ls_explain.append(f"{field} contains {list(value)}")
+                    else:
+                        failed = f"{field} does not contain {ls_missing}"
+                else:
+                    ls_found = [t for t in value if t in present(field)]
+                    if not ls_found:
+                        ls_explain.append(f"{field} excludes {list(value)}")
+                    else:
+                        failed = f"{field} contains excluded {ls_found}"
+                if failed:
+                    break
+
+            if not failed:
+                if ruleDims:
+                    ls_explain.insert(0,f"dims {list(ruleDims)}")
+                return imageType, f"matched '{imageType}': " + (', '.join(ls_explain) if ls_explain else 'no conditions')
+            ls_failed.append(f"'{imageType}' {failed}")
+
+        if not ls_candidates:
+            return None, f"no rule for dims {list(dims)}"
+        return None, f"no rule matched dims {list(dims)}: " + '; '.join(ls_failed)
+
+
+    def resolve(self, imageType: str) -> Tuple[str, str, dict]:
+        """
+        Scan name, bids directory and (copied) scan identifier keys of a matched image type.
+
+        :param imageType: image type key in scan_id.json
+        :type imageType: str
+
+        :return: scan name, bids directory, scan identifier keys
+        :rtype: Tuple[str, str, dict]
+        """
+        scanKeys = copy.deepcopy(self.scanId[imageType])
+        return st.bids.get_bids_filename(**scanKeys['bids_labels']), scanKeys['BidsDir'], scanKeys
+
+
+@lru_cache(maxsize=32)
+def _compile_rules(scanIdFile: str, mtime: int, size: int) -> ScanIdRules:
+    """
+    Cached rule compilation, keyed by the file's modification time and size so that edits are picked up.
+    """
+    with open(scanIdFile) as j:
+        return ScanIdRules(json.load(j))
+
+
+def load_scan_id_rules(scanIdFile: str=None) -> ScanIdRules:
+    """
+    Load a project's compiled scan_id.json rules. The file is only re-read and re-compiled when it changes.
+
+    :param scanIdFile: fullpath to a scan_id.json file, defaults to None (<dataDir>/code/<project>_scan_id.json from support_tools.creds)
+    :type scanIdFile: str, optional
+
+    :raises FileNotFoundError: the scan_id.json file does not exist
+
+    :return: compiled rules
+    :rtype: ScanIdRules
+    """
+    if not scanIdFile:
+        scanIdFile = os.path.join(st.creds.dataDir,'code',st.creds.project + '_scan_id.json')
+    s = os.stat(scanIdFile)
+    return _compile_rules(os.path.realpath(scanIdFile),s.st_mtime_ns,s.st_size)
+
+
+
 def get_scan_id(inDir: str,basename: str) -> Tuple[str, str, dict]:
     """
     Get metadata from a source NIfTI file
@@ -52,82 +235,27 @@ def get_scan_id(inDir: str,basename: str) -> Tuple[str, str, dict]:
     :rtype: Tuple[str, str, dict]
     """
 
-    #DETERMINE SCAN TYPE
-    bidsDir = '0'
-    scanName = '0'
-
-    #Point to project's sessions.tsv file
+    #Point to project's compiled scan_id.json rules
     try:
-        # if os.path.isfile(os.path.join(st.creds.dataDir,'code',st.creds.project + '_scan_id.json')):
-        with open(os.path.join(st.creds.dataDir,'code',st.creds.project + '_scan_id.json')) as j:
-            scanId = json.load(j)
+        rules = load_scan_id_rules()
     except:
         print('ERROR: project scan_id.json file not found')
         print('\tPlease create ' + os.path.join(st.creds.dataDir,'code',st.creds.project + '_scan_id.json'))
         return '0', '0', {}
-        # sys.exit()
-
 
 
     try:
         #read input image dimensions
-        dims = []
-        scanKeys = {}
-        for d in ['dim1','dim2','dim3','dim4']:
-            proc = subprocess.check_output(os.path.join(FSLDIR,'bin','fslval') + ' ' + os.path.join(inDir,basename + '.nii.gz') + ' ' + d,shell=True,encoding='utf-8')
-            dims.append(int(proc.split(' ')[0]))
+        dims = st.nifti.get_dims(os.path.join(inDir,basename + '.nii.gz'),4)
 
         #read associated JSON file
         if os.path.isfile(os.path.join(inDir,basename + '.json')):
             with open(os.path.join(inDir,basename + '.json')) as j:
                 jsonHeader = json.load(j)
 
-            # Loop over image types in project's scan_id JSON file
-            for imageType in scanId.keys():
-                stopFlag = True
-
-                if not isinstance(scanId[imageType],dict):
-                    continue
-                if not 'json_header' in scanId[imageType].keys():
-                    continue
-
-                #loop over all of the json header keys
-                for headerKey in scanId[imageType]['json_header'].keys():
-                    tmp_stopFlag = False
-
-                    #split items that should not be in the associated header key 
-                    if 'Not' in headerKey:
-                        #only proceed if values are not present
-                        if headerKey.replace('Not','') in jsonHeader.keys():
-                            if all([k not in str(jsonHeader[headerKey.replace('Not','')]) for k in scanId[imageType]['json_header'][headerKey]]):  
-                                tmp_stopFlag = True
-
-                    else:
-                        #only proceed if values are present
-                        if headerKey in jsonHeader.keys():
-                            if type(scanId[imageType]['json_header'][headerKey]) is int:
-                                if jsonHeader[headerKey] == scanId[imageType]['json_header'][headerKey] and dims == scanId[imageType]['dims']:
-                                    tmp_stopFlag = True
-                            elif type(scanId[imageType]['json_header'][headerKey]) is list:
-                                if all([k in str(jsonHeader[headerKey]) for k in scanId[imageType]['json_header'][headerKey]]) and dims == scanId[imageType]['dims']:
-                                    tmp_stopFlag = True
-                            elif type(scanId[imageType]['json_header'][headerKey]) is str:
-                                if scanId[imageType]['json_header'][headerKey] in str(jsonHeader[headerKey]) and dims == scanId[imageType]['dims']:
-                                    tmp_stopFlag = True
-                    
-                    if not tmp_stopFlag and stopFlag:
-                        stopFlag = False
-                        continue
-
-                if stopFlag:
-                    bidsDir = scanId[imageType]['BidsDir']
-                    scanName = st.bids.get_bids_filename(**scanId[imageType]['bids_labels'])
-                    # scanName = scanId[imageType]['ScanName']
-                    scanKeys = scanId[imageType]
-                    break
-
-
-
+            imageType, explanation = rules.match(jsonHeader,dims)
+            if imageType:
+                return rules.resolve(imageType)
 
     except Exception as e:
         exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -146,4 +274,54 @@ def get_scan_id(inDir: str,basename: str) -> Tuple[str, str, dict]:
         
         return '0','0',r
 
-    return scanName, bidsDir, scanKeys
\ No newline at end of file
+    return '0', '0', {}
+
+
+
+def classify_scans(niiFiles: str|list, scanIdFile: str=None, progress: bool=False) -> list:
+    """
+    Classify many NIfTI images against a project's scan_id.json rules in one call, e.g. a whole session or sourcedata tree.
+
+    :param niiFiles: fullpath to a directory (searched recursively for .nii.gz/.nii files) or list of fullpaths to NIfTI images
+    :type niiFiles: str | list
+
+    :param scanIdFile: fullpath to a scan_id.json file, defaults to None (<dataDir>/code/<project>_scan_id.json from support_tools.creds)
+    :type scanIdFile: str, optional
+
+    :param progress: flag to display command line output providing additional details on the processing status, defaults to False
+    :type progress: bool, optional
+
+    :return: one dict per image with keys file, image_type (None if not classified), scan_name, bids_dir, scan_keys, dims and explanation (which rule matched and why, or why none did)
+    :rtype: list
+    """
+    if isinstance(niiFiles,str):
+        if os.path.isdir(niiFiles):
+            niiFiles = sorted(os.path.join(root,f) for root, dirs, files in os.walk(niiFiles) for f in files if f.endswith(('.nii.gz','.nii')))
+        else:
+            niiFiles = [niiFiles]
+
+    rules = load_scan_id_rules(scanIdFile)
+
+    ls_out = []
+    for niiFile in niiFiles:
+        basename = niiFile[:-7] if niiFile.endswith('.nii.gz') else os.path.splitext(niiFile)[0]
+        d_out = {'file': niiFile, 'image_type': None, 'scan_name': '0', 'bids_dir': '0', 'scan_keys': {}, 'dims': None, 'explanation': ''}
+        try:
+            d_out['dims'] = st.nifti.get_dims(niiFile,4)
+            if not os.path.isfile(basename + '.json'):
+                d_out['explanation'] = 'no JSON sidecar'
+            else:
+                with open(basename + '.json') as j:
+                    jsonHeader = json.load(j)
+                d_out['image_type'], d_out['explanation'] = rules.match(jsonHeader,d_out['dims'])
+                if d_out['image_type']:
+                    d_out['scan_name'], d_out['bids_dir'], d_out['scan_keys'] = rules.resolve(d_out['image_type'])
+        except Exception as e:
+            d_out['image_type'] = None
+            d_out['explanation'] = f"error: {e}"
+
+        if progress:
+            print(f"\t{niiFile}\t{d_out['scan_name']}\t{d_out['explanation']}")
+        ls_out.append(d_out)
+
+    return ls_out
@@ -1,4 +1,4 @@
 # __init__.py
-from ._mysql import query_source_file, query_file, sql_query_dir_check, sql_query_dirs, sql_query, sql_multiple_query, sql_create_project_tables, sql_table_insert, sql_table_remove, sql_check_table_exists, create_mysql_connection, sql_mri_tracking_insert, sql_mri_tracking_query, sql_mri_tracking_set
+from ._mysql import ENTITY_COLUMNS, ENTITY_INDEXES, MRI_TRACKING_TIME_COLUMNS, query_source_file, query_file, sql_query_dir_check, sql_query_dirs, sql_query, sql_query_batch, sql_export_snapshot, sql_multiple_query, sql_create_project_tables, sql_add_entity_columns, sql_table_insert, sql_table_remove, sql_table_delete, sql_table_sync, sql_table_bulk_load, sql_check_table_exists, sql_get_table_columns, sql_query_entities, create_mysql_connection, sql_connection, close_mysql_connections, sql_cache_info, sql_cache_configure, sql_cache_clear, sql_mri_tracking_insert, sql_mri_tracking_query, sql_mri_tracking_set, sql_mri_tracking_upsert, generate_unique_id
 
-__all__ = ['query_source_file','query_file','sql_query_dir_check','sql_query_dirs','sql_query','sql_multiple_query','sql_create_project_tables','sql_table_insert','sql_table_remove','sql_check_table_exists','create_mysql_connection','sql_mri_tracking_insert','sql_mri_tracking_query','sql_mri_tracking_set']
\ No newline at end of file
+__all__ = ['ENTITY_COLUMNS','ENTITY_INDEXES','MRI_TRACKING_TIME_COLUMNS','query_source_file','query_file','sql_query_dir_check','sql_query_dirs','sql_query','sql_query_batch','sql_export_snapshot','sql_multiple_query','sql_create_project_tables','sql_add_entity_columns','sql_table_insert','sql_table_remove','sql_table_delete','sql_table_sync','sql_table_bulk_load','sql_check_table_exists','sql_get_table_columns','sql_query_entities','create_mysql_connection','sql_connection','close_mysql_connections','sql_cache_info','sql_cache_configure','sql_cache_clear','sql_mri_tracking_insert','sql_mri_tracking_query','sql_mri_tracking_set','sql_mri_tracking_upsert','generate_unique_id']
\ No newline at end of file
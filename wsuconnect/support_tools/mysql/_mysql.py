@@ -3,6 +3,17 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 21 Jan 2021
 #
+# v4.8.3 on 18 Oct 2026 - sql_table_remove keeps its REGEXP semantics for item['fullpath'] (exact paths: sql_table_delete)
+# v4.8.2 on 18 Oct 2026 - sql_add_entity_columns backfills existing rows; sql_query_entities validates identifiers
+# v4.8.1 on 18 Oct 2026 - snapshot freshness from a catalog version table bumped by every write (information_schema update_time is cached/NULL on MySQL 8)
+# v4.8.0 on 18 Oct 2026 - sql_table_delete: exact-path (IN) and directory-prefix (LIKE) deletes in one transaction
+# v4.7.0 on 18 Oct 2026 - bulk mri_tracking upserts (INSERT ... ON DUPLICATE KEY UPDATE with executemany)
+# v4.6.0 on 18 Oct 2026 - in-process LRU/TTL cache of query results, invalidated by table writes
+# v4.5.0 on 18 Oct 2026 - answer sql_query/sql_query_batch from a local SQLite catalog snapshot when it is current
+# v4.4.0 on 18 Oct 2026 - sql_query_batch resolves many search specs in one UNION ALL round-trip
+# v4.3.0 on 18 Oct 2026 - parameterised query builder (LIKE/equality for literal patterns) for sql_query, sql_multiple_query and sql_mri_tracking_query
+# v4.2.0 on 18 Oct 2026 - indexed BIDS entity columns in the searchTable and sql_query_entities
+# v4.1.0 on 18 Oct 2026 - pooled, health-checked connections shared by every helper (sql_connection context manager)
 # v3.0.0 on 1 April 2023
 # Modified on 20 Oct 2021 - elimination of mysql database in supplement of list bucket from boto3
 # modified on 21 Jan 2021
@@ -12,6 +23,13 @@ import os
 import pymysql
 import pymysql.cursors
 import traceback
+import time
+import atexit
+import re
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 import pandas as pd
 from datetime import timedelta, datetime
@@ -24,8 +42,163 @@ if not str(REALPATH) in sys.path:
 from wsuconnect import support_tools as st
 
 
-VERSION = '4.0.0'
-DATE = '5 April 2023'
+VERSION = '4.8.3'
+DATE = '18 Oct 2026'
+
+
+#searchTable BIDS entity column definitions (see support_tools.catalog.BIDS_COLUMNS) and secondary indexes
+#(idx_fullpath serves anchored LIKE 'prefix%' searches from the query builder)
+ENTITY_COLUMNS = {'subject': 'varchar(64)',
+                  'session': 'varchar(64)',
+                  'acquisition': 'varchar(64)',
+                  'task': 'varchar(64)',
+                  'run': 'varchar(16)',
+                  'space': 'varchar(64)',
+                  'description': 'varchar(64)',
+                  'suffix': 'varchar(64)',
+                  'pipeline': 'varchar(128)'
+                  }
+ENTITY_INDEXES = {'idx_subject_session': ['subject','session'],
+                  'idx_acquisition': ['acquisition'],
+                  'idx_task': ['task'],
+                  'idx_run': ['run'],
+                  'idx_space': ['space'],
+                  'idx_description': ['description'],
+                  'idx_suffix': ['suffix'],
+                  'idx_extension': ['extension'],
+                  'idx_pipeline': ['pipeline'],
+                  'idx_fullpath': ['fullpath']
+                  }
+
+
+# ******************* CONNECTION POOL ********************
+class _ConnectionPool:
+    """
+    Per-process pool of idle pymysql connections, keyed by database. Connections are
+    health-checked (ping with reconnect) when they have been idle for longer than
+    ping_interval seconds, and are discarded if the check fails.
+
+    The pool is fork-safe: a forked child (e.g. WorkerPool or ProcessPoolExecutor workers)
+    forgets the idle connections inherited from its parent without closing them, since
+    closing would send COM_QUIT over the parent's sockets, and opens its own.
+    """
+
+    def __init__(self, host_name: str, user_name: str, user_password: str, max_idle: int=4, ping_interval: float=30.0):
+        self.host_name = host_name
+        self.user_name = user_name
+        self.user_password = user_password
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        """
+        Drop (without closing) the connections inherited from the parent process after a fork.
+        """
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._idle = {}
+            self._pid = os.getpid()
+
+    def acquire(self, db_name: str, progress: bool=False) -> pymysql.connections.Connection:
+        self._check_pid()
+        while True:
+            with self._lock:
+                ls_idle = self._idle.get(db_name, [])
+                if not ls_idle:
+                    break
+                connection, lastUsed = ls_idle.pop()
+
+            if time.time() - lastUsed < self.ping_interval:
+                return connection
+            try:
+                connection.ping(reconnect=True)
+                return connection
+            except Exception:
+                self._discard(connection)
+
+        connection = create_mysql_connection(self.host_name,self.user_name,self.user_password,db_name,progress)
+        if connection is None:
+            raise pymysql.err.OperationalError(f"cannot connect to MySQL database {db_name} at {self.host_name}")
+        return connection
+
+    def release(self, db_name: str, connection: pymysql.connections.Connection):
+        self._check_pid()
+        with self._lock:
+            ls_idle = self._idle.setdefault(db_name, [])
+            if connection.open and len(ls_idle) < self.max_idle:
+                ls_idle.append((connection, time.time()))
+                return
+        self._discard(connection)
+
+    def close_all(self):
+        self._check_pid()
+        with self._lock:
+            ls_connections = [c for ls_idle in self._idle.values() for c, _ in ls_idle]
+            self._idle = {}
+        for connection in ls_connections:
+            self._discard(connection)
+
+    @staticmethod
+    def _discard(connection: pymysql.connections.Connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_POOL = _ConnectionPool('10.11.0.31','ubuntu','neuroscience')
+atexit.register(_POOL.close_all)
+os.register_at_fork(after_in_child=_POOL._check_pid)
+
+
+@contextmanager
+def sql_connection(db_name: str=None, progress: bool=False):
+    """
+    Context manager that borrows a connection from the module-level connection pool.
+    The transaction is committed when the block exits normally and rolled back on an
+    exception; the connection is then returned to the pool for reuse.
+
+    with st.mysql.sql_connection() as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+    Parameters
+    ----------
+    db_name : str, optional
+        MySql database, by default None (support_tools.creds.database)
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Yields
+    ------
+    pymysql.connections.Connection
+        open connection to the database
+    """
+    if db_name is None:
+        db_name = st.creds.database
+
+    connection = _POOL.acquire(db_name, progress)
+    try:
+        yield connection
+        connection.commit()
+    except Exception:
+        try:
+            connection.rollback()
+        except Exception:
+            connection.close()
+        raise
+    finally:
+        _POOL.release(db_name, connection)
+
+
+def close_mysql_connections():
+    """
+    Close every idle connection held by the module-level connection pool.
+    This is done automatically when the interpreter exits.
+    """
+    _POOL.close_all()
 
 
 def fix_time_str(x: str|timedelta|pd.Timedelta):
@@ -247,6 +420,423 @@ def sql_query_dirs(regex: str,source: bool=False,inclusion: str|list=None, exclu
 
 
 
+# ******************* QUERY BUILDER ********************
+_REGEX_META = set('.^$*+?()[]{}|\\')
+_RE_IDENTIFIER = re.compile(r'^(\*|[A-Za-z_][A-Za-z0-9_]*(\s*,\s*[A-Za-z_][A-Za-z0-9_]*)*)$')
+
+
+def _check_identifier(name: str) -> str:
+    """
+    Validate a table/column name (or comma-separated column list, or *) before it is placed in a statement.
+    Identifiers cannot be bound as parameters.
+    """
+    if not isinstance(name,str) or not _RE_IDENTIFIER.match(name):
+        raise ValueError(f"invalid MySQL identifier: {name!r}")
+    return name
+
+
+@lru_cache(maxsize=4096)
+def _compile_pattern(col: str, pattern: str, negate: bool=False) -> tuple:
+    """
+    Compile a REGEXP search string into the cheapest equivalent parameterised predicate.
+
+    Patterns containing only literal characters, '.' (any character) and escaped metacharacters
+    are rewritten as LIKE (substring '%abc%', anchored prefix 'abc%' that can use an index, or
+    suffix '%abc'), or as equality when anchored at both ends (^abc$). Anything else remains a
+    parameterised REGEXP.
+
+    Parameters
+    ----------
+    col : str
+        table column to search
+    pattern : str
+        MySQL regular expression
+    negate : bool, optional
+        exclude (True) rather than require (False) matching items, by default False
+
+    Returns
+    -------
+    tuple
+        (SQL predicate with a single %s placeholder, bound value)
+    """
+    anchorStart = pattern.startswith('^')
+    anchorEnd = pattern.endswith('$') and not pattern.endswith('\\$')
+    body = pattern[1 if anchorStart else 0:len(pattern) - 1 if anchorEnd else len(pattern)]
+
+    like = []
+    literal = []
+    wildcard = False
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c == '\\' and i + 1 < len(body) and body[i+1] in _REGEX_META:
+            c = body[i+1]
+            like.append(_escape_like(c))
+            literal.append(c)
+            i += 2
+            continue
+        if c == '.':
+            like.append('_')
+            wildcard = True
+        elif c in _REGEX_META:
+            return (f"{col} NOT REGEXP %s" if negate else f"{col} REGEXP %s"), pattern
+        else:
+            like.append(_escape_like(c))
+            literal.append(c)
+        i += 1
+
+    if anchorStart and anchorEnd and not wildcard:
+        return (f"{col} <> %s" if negate else f"{col} = %s"), ''.join(literal)
+
+    value = ('' if anchorStart else '%') + ''.join(like) + ('' if anchorEnd else '%')
+    return (f"{col} NOT LIKE %s" if negate else f"{col} LIKE %s"), value
+
+
+def _build_where(searchcol: str, regex: str=None, inclusion: list=None, exclusion: list=None, orinclusion: list=None) -> tuple:
+    """
+    Compile the search string, inclusion (AND), exclusion (AND NOT) and or-inclusion (AND (... OR ...))
+    patterns of a sql_query call into a parameterised WHERE clause.
+
+    Returns
+    -------
+    tuple
+        (list of SQL predicates, list of bound values)
+    """
+    ls_where = []
+    values = []
+    for pattern, negate in [(regex,False)] + [(inc,False) for inc in inclusion or []] + [(exc,True) for exc in exclusion or []]:
+        if pattern is None:
+            continue
+        predicate, value = _compile_pattern(searchcol,pattern,negate)
+        ls_where.append(predicate)
+        values.append(value)
+
+    if orinclusion:
+        ls_or = []
+        for pattern in orinclusion:
+            predicate, value = _compile_pattern(searchcol,pattern)
+            ls_or.append(predicate)
+            values.append(value)
+        ls_where.append('(' + ' OR '.join(ls_or) + ')')
+
+    return ls_where, values
+
+
+def _build_select(table: str, returncol: str, where: list, orderby: str=None) -> str:
+    """
+    Assemble a SELECT statement from validated identifiers and compiled predicates.
+    """
+    sqlQuery = f"SELECT {_check_identifier(returncol)} FROM {_check_identifier(table)}"
+    if where:
+        sqlQuery += " WHERE " + " AND ".join(where)
+    if orderby:
+        sqlQuery += f" ORDER BY {_check_identifier(orderby)}"
+    return sqlQuery
+
+
+# ******************* QUERY RESULT CACHE ********************
+class _QueryCache:
+    """
+    Thread-safe LRU cache of query results with a time-to-live, keyed by the compiled
+    statement and its bound values. Entries are grouped by table so that a write to a
+    table drops only that table's results.
+    """
+
+    def __init__(self, maxsize: int=1024, ttl: float=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, value):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, database: str=None, table: str=None):
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[1] == table and (database is None or k[0] == database)]:
+                del self._entries[key]
+
+    def info(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+_CACHE = _QueryCache(ttl=float(os.environ.get('CONNECT_QUERY_CACHE_TTL',300)))
+
+
+def sql_cache_info() -> dict:
+    """
+    Hit/miss counters and size of the in-process query cache used by sql_query and sql_query_batch.
+
+    Returns
+    -------
+    dict
+        {'hits': int, 'misses': int, 'size': int, 'maxsize': int, 'ttl': float}
+    """
+    return _CACHE.info()
+
+
+def sql_cache_configure(ttl: float=None, maxsize: int=None):
+    """
+    Change the lifetime or size of the in-process query cache and drop its current results.
+
+    The cache is per process: writes made in other processes, including forked worker processes
+    (e.g. support_tools.pacs.WorkerPool or ProcessPoolExecutor workers), only invalidate their own
+    copy. Long-running parents whose workers write to the catalog should disable the cache (ttl=0)
+    or clear it once the workers finish.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        seconds a cached result is served, 0 disables the cache, by default None (unchanged)
+    maxsize : int, optional
+        maximum number of cached results, by default None (unchanged)
+    """
+    if ttl is not None:
+        _CACHE.ttl = float(ttl)
+    if maxsize is not None:
+        _CACHE.maxsize = int(maxsize)
+    _CACHE.invalidate()
+
+
+def sql_cache_clear(table: str=None):
+    """
+    Drop cached query results. Writes through sql_table_insert, sql_table_remove, sql_table_sync and
+    sql_table_bulk_load do this automatically for the modified table in the writing process only;
+    writes made by other processes, including forked workers, are seen once the cached results expire
+    (environment variable CONNECT_QUERY_CACHE_TTL seconds, default 300, 0 disables the cache, see
+    sql_cache_configure).
+
+    Parameters
+    ----------
+    table : str, optional
+        only drop results for this table, by default None (all tables)
+    """
+    _CACHE.invalidate(table=table)
+
+
+def _invalidate_table(table: str):
+    """
+    Forget cached results and the cached catalog version of a table modified by this process.
+    """
+    _CACHE.invalidate(st.creds.database,table)
+    _VERSIONS.pop((st.creds.database,table), None)
+
+
+# ******************* CATALOG VERSIONS ********************
+#every write through this module bumps the version of the modified table in CATALOG_VERSION_TABLE within the
+#same transaction; information_schema.tables.update_time is cached by MySQL 8 and not persisted for InnoDB
+CATALOG_VERSION_TABLE = 'catalog_versions'
+_VERSIONS = {}
+_VERSION_TTL = float(os.environ.get('CONNECT_CATALOG_VERSION_TTL',60))
+_VERSION_DATABASES = set()
+
+
+def _ensure_version_table(database: str):
+    """
+    Create CATALOG_VERSION_TABLE if it does not exist. Run outside of the write transactions,
+    since CREATE TABLE implicitly commits.
+    """
+    if database in _VERSION_DATABASES:
+        return
+    with sql_connection(database) as sqlConnection:
+        sqlConnection.cursor().execute(f"CREATE TABLE IF NOT EXISTS {CATALOG_VERSION_TABLE} ( tablename varchar(128) PRIMARY KEY, version bigint NOT NULL DEFAULT 0, updated double )")
+    _VERSION_DATABASES.add(database)
+
+
+def _bump_table_version(sqlCursor: pymysql.cursors.Cursor, table: str):
+    """
+    Increment the catalog version of table as part of the caller's transaction.
+    """
+    sqlCursor.execute(f"INSERT INTO {CATALOG_VERSION_TABLE} (tablename, version, updated) VALUES (%s, 1, %s) ON DUPLICATE KEY UPDATE version = version + 1, updated = VALUES(updated)", (table,time.time()))
+
+
+def _read_table_version(sqlCursor: pymysql.cursors.Cursor, table: str) -> int:
+    """
+    Current catalog version of table, 0 if it has never been written through this module.
+    """
+    sqlCursor.execute(f"SELECT version FROM {CATALOG_VERSION_TABLE} WHERE tablename = %s", (table,))
+    f = sqlCursor.fetchone()
+    return int(f[0]) if f else 0
+
+
+def _get_table_version(table: str, database: str) -> int:
+    """
+    Catalog version of a MySQL table, cached for CONNECT_CATALOG_VERSION_TTL seconds (default 60). Writes made
+    by this process are seen immediately, writes made by other processes once the cached version expires.
+    """
+    cached = _VERSIONS.get((database,table))
+    if cached and time.time() - cached[1] < _VERSION_TTL:
+        return cached[0]
+
+    _ensure_version_table(database)
+    with sql_connection(database) as sqlConnection:
+        version = _read_table_version(sqlConnection.cursor(),table)
+    _VERSIONS[(database,table)] = (version, time.time())
+    return version
+
+
+# ******************* LOCAL CATALOG SNAPSHOT ********************
+#CONNECT_CATALOG_MODE: auto (use a current snapshot, else MySQL), mysql (never use a snapshot), offline (never contact MySQL)
+
+
+def _get_snapshot(table: str, database: str) -> str:
+    """
+    Select the local catalog snapshot that can answer a query on table, if any.
+
+    In auto mode the snapshot is used only when it is younger than CONNECT_CATALOG_MAX_AGE seconds
+    (default 93600, a nightly export) and the catalog version of the MySQL table still equals the
+    version recorded when the snapshot was exported. In offline mode MySQL is never contacted and a
+    stale snapshot only produces a warning.
+
+    Returns
+    -------
+    str
+        fullpath to the snapshot file, or None to query MySQL
+    """
+    mode = os.environ.get('CONNECT_CATALOG_MODE','auto').lower()
+    if mode == 'mysql' or not st.creds.project or database != st.creds.database:
+        return None
+
+    snapshotFile = st.catalog.get_snapshot_file(st.creds.dataDir,st.creds.project)
+    info = st.catalog.read_snapshot_info(snapshotFile).get(table)
+    if info is None:
+        if mode == 'offline':
+            raise FileNotFoundError(f"CONNECT_CATALOG_MODE=offline but {snapshotFile} does not contain the table {table}")
+        return None
+
+    age = time.time() - info['exported']
+    maxAge = float(os.environ.get('CONNECT_CATALOG_MAX_AGE',93600))
+    if mode == 'offline':
+        if age > maxAge:
+            print(f"WARNING: catalog snapshot {snapshotFile} is {age / 3600:.1f} hours old")
+        return snapshotFile
+    if age > maxAge:
+        return None
+
+    if info.get('version') is None or _get_table_version(table,database) != info['version']:
+        return None
+    return snapshotFile
+
+
+def _to_sqlite(sqlQuery: str) -> str:
+    """
+    Translate a statement from the query builder to SQLite: qmark placeholders and an explicit LIKE escape character.
+    """
+    return sqlQuery.replace(" LIKE %s"," LIKE %s ESCAPE '\\'").replace('%s','?')
+
+
+def _execute_query(searchtable: str, database: str, sqlQuery: str, values: list, progress: bool=False) -> list:
+    """
+    Run a statement from the query builder against the local catalog snapshot when it is current, else against MySQL.
+
+    Returns
+    -------
+    tuple
+        fetched rows, or None if the table does not exist
+    """
+    key = (database,searchtable,sqlQuery,tuple(values))
+    rows = _CACHE.get(key)
+    if rows is not None:
+        return rows
+
+    snapshotFile = _get_snapshot(searchtable,database)
+    if snapshotFile:
+        if progress:
+            print(f"{sqlQuery} {values} [snapshot {snapshotFile}]")
+        rows = tuple(st.catalog.open_snapshot(snapshotFile).execute(_to_sqlite(sqlQuery),values).fetchall())
+    else:
+        with sql_connection(database,progress) as sqlConnection:
+            sqlCursor = sqlConnection.cursor()
+            if not sql_check_table_exists(sqlCursor,searchtable):
+                return None
+
+            if progress:
+                print(sqlCursor.mogrify(sqlQuery,values))
+            sqlCursor.execute(sqlQuery,values)
+            rows = tuple(sqlCursor.fetchall())
+
+    _CACHE.put(key,rows)
+    return rows
+
+
+# ******************* EXPORT LOCAL CATALOG SNAPSHOT ********************
+def sql_export_snapshot(snapshotFile: str=None, tables: list=None, progress: bool=False) -> dict:
+    """
+    This function exports tables from the database specified in support_tools.creds object to a
+    local SQLite catalog snapshot (see support_tools.catalog.write_snapshot), which sql_query and
+    sql_query_batch use instead of MySQL while it is current.
+
+    Parameters
+    ----------
+    snapshotFile : str, optional
+        fullpath to the snapshot file, by default None (support_tools.catalog.get_snapshot_file)
+    tables : list, optional
+        tables to export, by default None (searchTable and searchSourceTable)
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    dict
+        {table: number of rows exported}
+    """
+    if snapshotFile is None:
+        snapshotFile = st.catalog.get_snapshot_file(st.creds.dataDir,st.creds.project)
+    if tables is None:
+        tables = [st.creds.searchTable,st.creds.searchSourceTable]
+
+    def iter_rows(sqlConnection, table):
+        sqlCursor = sqlConnection.cursor(pymysql.cursors.SSCursor)
+        sqlCursor.execute(f"SELECT * FROM {_check_identifier(table)}")
+        yield from sqlCursor
+        sqlCursor.close()
+
+    _ensure_version_table(st.creds.database)
+    exported = time.time()
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+        d_tables = {}
+        d_versions = {}
+        for table in tables:
+            if sql_check_table_exists(sqlCursor,table):
+                #version read before the rows, a write during the export leaves the snapshot stale
+                d_versions[table] = _read_table_version(sqlCursor,table)
+                d_tables[table] = (sql_get_table_columns(sqlCursor,table), iter_rows(sqlConnection,table))
+            else:
+                print(f"WARNING: did not export the table {table} - does not exist")
+
+        d_rows = st.catalog.write_snapshot(snapshotFile,d_tables,exported=exported,versions=d_versions)
+
+    if progress:
+        for table, nRows in d_rows.items():
+            print(f"\t{table}: exported {nRows} rows to {snapshotFile}")
+    return d_rows
+
+
 # ******************* QUERY FOR DIRECTORIES CONTAINING DICOMS ********************
 def sql_query(searchtable: str, regex: str, database: str='CoNNECT', returncol: str='fullpath', searchcol: str='filename', orderby: str='fullpath', inclusion: str|list=None, exclusion: str|list=None, orinclusion: str|list=None, progress: bool=False) -> str:
     """
@@ -289,44 +879,93 @@ def sql_query(searchtable: str, regex: str, database: str='CoNNECT', returncol:
     # if st == None or regex == None:
     #     print("ERROR: must define searchtable AND regex")
     
-    #connect to sql database
-    sqlConnection = create_mysql_connection(host_name='10.11.0.31',user_name='ubuntu',user_password='neuroscience',db_name=database,progress=progress)
-    sqlCursor = sqlConnection.cursor()
-
-
-    if sql_check_table_exists(sqlCursor,searchtable):
-
-        #create query
-        if regex == '':
-            sqlQuery ="""SELECT %s FROM %s WHERE %s ORDER BY %s;""" % (returncol,searchtable,searchcol,orderby)
-        else:
-            sqlQuery ="""SELECT %s FROM %s WHERE %s REGEXP "%s" """ % (returncol,searchtable,searchcol,regex)
-            if inclusion:
-                for inc in inclusion:
-                    sqlQuery += """AND %s REGEXP "%s" """ % (searchcol,inc)
-            if exclusion:
-                for exc in exclusion:
-                    sqlQuery += """AND %s NOT REGEXP "%s" """ % (searchcol,exc)
-            if orinclusion:
-
-                sqlQuery += """AND (%s REGEXP "%s" """% (searchcol,orinclusion[0])
-                for or_inc in orinclusion[1:]:
-                    sqlQuery += """OR %s REGEXP "%s" """ % (searchcol,or_inc)
-                sqlQuery = sqlQuery[:-1]
-                sqlQuery += """) """ 
-            sqlQuery +="ORDER BY %s;" % (orderby)
+    #create parameterised query
+    if regex == '':
+        sqlQuery = _build_select(searchtable,returncol,[_check_identifier(searchcol)],orderby)
+        values = []
     else:
-        sqlConnection.close()
+        ls_where, values = _build_where(_check_identifier(searchcol),regex,inclusion,exclusion,orinclusion)
+        sqlQuery = _build_select(searchtable,returncol,ls_where,orderby)
+
+    # run quory (local snapshot or sql database)
+    rows = _execute_query(searchtable,database,sqlQuery,values,progress)
+    if rows is None:
         return []
-    
-    # run quory
-    # print(sqlQuery)
-    sqlCursor.execute(sqlQuery)
-    sqlConnection.close()
 
     #get sql returned list
-    # tmp_fullpath = sqlCursor.fetchall()
-    return [f[0] for f in sqlCursor.fetchall()]
+    return [f[0] for f in rows]
+
+
+# ******************* BATCHED QUERY FOR MANY SEARCH SPECS ********************
+def sql_query_batch(searchtable: str, specs: dict|list, database: str=None, returncol: str='fullpath', searchcol: str='fullpath', orderby: str='fullpath', batch_size: int=250, progress: bool=False) -> dict:
+    """
+    Resolve many sql_query searches in a single round-trip. Each spec is compiled with the same
+    query builder as sql_query and the per-spec SELECTs are combined with UNION ALL (batch_size
+    specs per statement), tagged with the spec they belong to.
+
+    d_files = sql_query_batch(st.creds.searchTable,{sub: {'regex': 'zstat', 'inclusion': [sub,'nii.gz'], 'exclusion': ['space']} for sub in subjects})
+
+    Parameters
+    ----------
+    searchtable : str
+        MySql table inside of the specified database
+    specs : dict | list
+        {key: spec} or a list of specs, where each spec is a dict of sql_query arguments (regex, inclusion, exclusion, orinclusion) or a (regex, inclusion, exclusion) tuple
+    database : str, optional
+        MySql database containing table, by default None (support_tools.creds.database)
+    returncol : str, optional
+        table column to return in query, by default 'fullpath'
+    searchcol : str, optional
+        table column to perform query, by default 'fullpath'
+    orderby : str, optional
+        column to sort returns by within each spec, by default 'fullpath'
+    batch_size : int, optional
+        number of specs combined per statement, by default 250
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    dict
+        {key: list of returncol values} for every spec (an empty list when nothing matched); for a list of specs the key is the spec as a (regex, inclusion, exclusion) tuple
+    """
+    if database is None:
+        database = st.creds.database
+
+    #normalize specs to {key: dict of sql_query arguments}
+    d_specs = {}
+    for key, spec in (specs.items() if isinstance(specs,dict) else ((None,sp) for sp in specs)):
+        if not isinstance(spec,dict):
+            spec = dict(zip(['regex','inclusion','exclusion','orinclusion'],spec))
+        spec = {k: (v.split() if isinstance(v,str) and k != 'regex' else v) for k, v in spec.items()}
+        if key is None:
+            key = tuple(tuple(v) if isinstance(v,list) else v for v in [spec.get('regex'),spec.get('inclusion'),spec.get('exclusion')])
+        d_specs[key] = spec
+
+    d_out = {key: [] for key in d_specs}
+    keys = list(d_specs.keys())
+    cols = _check_identifier(returncol) if returncol == orderby else f"{_check_identifier(returncol)}, {_check_identifier(orderby)}"
+
+    for i in range(0, len(keys), batch_size):
+        ls_select = []
+        values = []
+        for idx in range(i, min(i + batch_size, len(keys))):
+            spec = d_specs[keys[idx]]
+            ls_where, tmp_values = _build_where(_check_identifier(searchcol),spec.get('regex'),spec.get('inclusion'),spec.get('exclusion'),spec.get('orinclusion'))
+            ls_select.append(f"SELECT {idx} AS spec, {cols} FROM {_check_identifier(searchtable)}" + (" WHERE " + " AND ".join(ls_where) if ls_where else ""))
+            values.extend(tmp_values)
+
+        sqlQuery = " UNION ALL ".join(ls_select) + (" ORDER BY 1, 2" if returncol == orderby else " ORDER BY 1, 3")
+        rows = _execute_query(searchtable,database,sqlQuery,values,progress)
+        if rows is None:
+            return d_out
+        for f in rows:
+            d_out[keys[f[0]]].append(f[1])
+
+        if progress:
+            print(f"\t{searchtable}: resolved specs {i + 1}-{min(i + batch_size, len(keys))} of {len(keys)}")
+
+    return d_out
 
 
 # ******************* QUERY FOR DIRECTORIES CONTAINING DICOMS ********************
@@ -361,26 +1000,22 @@ def sql_multiple_query(searchtable: str, regex: str, database: str='CoNNECT', re
         print("ERROR: must define searchtable AND regex")
     
     #connect to sql database
-    sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',database,progress)
-    sqlCursor = sqlConnection.cursor()
-
-    if sql_check_table_exists(sqlCursor,searchtable):
+    with sql_connection(database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-        #create query
-        sqlQuery ="""SELECT %s FROM %s WHERE %s REGEXP "%s" ORDER BY %s""" % (returncol,searchtable,searchcol,regex,orderby)
-        
-        #sqlConnection.query(sqlQuery)
-        sqlCursor.execute(sqlQuery)    
+        if sql_check_table_exists(sqlCursor,searchtable):
 
-    else:
-        sqlConnection.close()
-        return None
+            #create parameterised query
+            ls_where, values = _build_where(_check_identifier(searchcol),regex)
+            sqlQuery = _build_select(searchtable,returncol,ls_where,orderby)
+            
+            sqlCursor.execute(sqlQuery,values)    
 
-    #get sql returned list
-    fullpath = sqlCursor.fetchall()
+        else:
+            return None
 
-    #sqlConnection.cursor.close()
-    sqlConnection.close()
+        #get sql returned list
+        fullpath = sqlCursor.fetchall()
 
     return fullpath
 
@@ -396,32 +1031,106 @@ def sql_create_project_tables(progress: bool=False):
     """    
     
     #connect to sql database
-    sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',st.creds.database,progress)
-    sqlCursor = sqlConnection.cursor()
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-    #create table
-    if not sql_check_table_exists(sqlConnection.cursor(),st.creds.searchTable):
-        sqlCMD ="""CREATE TABLE %s ( fullpath char(255), filename varchar(255), basename varchar(255), extension varchar(48) );""" % (st.creds.searchTable)
+        #create table
+        if not sql_check_table_exists(sqlConnection.cursor(),st.creds.searchTable):
+            entityCols = ''.join(f", {c} {t}" for c, t in ENTITY_COLUMNS.items())
+            entityIdx = ''.join(f", INDEX {i} ({', '.join(c)})" for i, c in ENTITY_INDEXES.items())
+            sqlCMD ="""CREATE TABLE %s ( fullpath char(255), filename varchar(255), basename varchar(255), extension varchar(48)%s%s );""" % (st.creds.searchTable,entityCols,entityIdx)
 
-        #run command
-        sqlCursor.execute(sqlCMD)
-    else:
-        print('WARNING: table ' + st.creds.searchTable + ' already exists')
+            #run command
+            sqlCursor.execute(sqlCMD)
+        else:
+            print('WARNING: table ' + st.creds.searchTable + ' already exists')
 
-    #create sourcedata table
-    if not sql_check_table_exists(sqlConnection.cursor(),st.creds.searchSourceTable):
-        sqlCMD ="""CREATE TABLE %s ( fullpath char(255), filename varchar(255) );""" % (st.creds.searchSourceTable)
-        sqlCursor.execute(sqlCMD)
-    else:
-        print('WARNING: table ' + st.creds.searchSourceTable + ' already exists')
+        #create sourcedata table
+        if not sql_check_table_exists(sqlConnection.cursor(),st.creds.searchSourceTable):
+            sqlCMD ="""CREATE TABLE %s ( fullpath char(255), filename varchar(255) );""" % (st.creds.searchSourceTable)
+            sqlCursor.execute(sqlCMD)
+        else:
+            print('WARNING: table ' + st.creds.searchSourceTable + ' already exists')
+
+
+
+# ******************* ADD BIDS ENTITY COLUMNS TO AN EXISTING TABLE ********************
+def sql_add_entity_columns(table: str, backfill: bool=None, batch_size: int=5000, progress: bool=False) -> list:
+    """
+    This function adds any missing BIDS entity columns (ENTITY_COLUMNS) and their indexes
+    (ENTITY_INDEXES) to an existing searchTable in the database specified in support_tools.creds
+    object. Tables created by sql_create_project_tables already contain them.
+
+    Rows already in the table are backfilled with the entities parsed from their fullpath
+    (support_tools.catalog.get_bids_entry), since an incremental sync only rewrites rows of
+    changed directories. The parsed entities are staged in a temporary table and applied
+    with a single UPDATE ... JOIN.
+
+    Parameters
+    ----------
+    table : str
+        target table in the database
+    backfill : bool, optional
+        recompute the entity columns of every existing row, by default None (only when columns were added)
+    batch_size : int, optional
+        number of rows per staging INSERT statement, by default 5000
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    list
+        names of the added columns
+    """
+    table = _check_identifier(table)
+    _ensure_version_table(st.creds.database)
+
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not update the table {table} - does not exist")
+            return []
+
+        existing = sql_get_table_columns(sqlCursor,table)
+        sqlCursor.execute(f"SHOW INDEX FROM {table}")
+        existingIdx = set(f[2] for f in sqlCursor.fetchall())
+
+        ls_add = [f"ADD COLUMN {c} {t}" for c, t in ENTITY_COLUMNS.items() if c not in existing]
+        ls_add += [f"ADD INDEX {i} ({', '.join(c)})" for i, c in ENTITY_INDEXES.items() if i not in existingIdx]
+        if ls_add:
+            sqlCursor.execute(f"ALTER TABLE {table} {', '.join(ls_add)}")
+            if progress:
+                print(f"\t{table}: {', '.join(ls_add)}")
+
+        ls_added = [c for c in ENTITY_COLUMNS if c not in existing]
+        if backfill is None:
+            backfill = bool(ls_added)
+
+        if backfill:
+            sqlCursor.execute(f"SELECT DISTINCT fullpath FROM {table}")
+            ls_paths = [f[0] for f in sqlCursor.fetchall() if f[0]]
+
+            #stage the parsed entities, then apply them in one statement
+            stagingTable = table + '_entities'
+            sqlCursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {stagingTable}")
+            sqlCursor.execute(f"CREATE TEMPORARY TABLE {stagingTable} ( fullpath char(255) PRIMARY KEY{''.join(f', {c} {t}' for c, t in ENTITY_COLUMNS.items())} )")
+            sqlCMD = f"INSERT IGNORE INTO {stagingTable} (fullpath, {', '.join(ENTITY_COLUMNS)}) VALUES ({', '.join(['%s'] * (len(ENTITY_COLUMNS) + 1))})"
+            for i in range(0, len(ls_paths), batch_size):
+                sqlCursor.executemany(sqlCMD, [(f,) + st.catalog.get_bids_entry(f) for f in ls_paths[i:i+batch_size]])
 
-    sqlConnection.commit()
-    sqlConnection.close()
+            nRows = sqlCursor.execute(f"UPDATE {table} t JOIN {stagingTable} e ON t.fullpath = e.fullpath SET {', '.join(f't.{c} = e.{c}' for c in ENTITY_COLUMNS)}")
+            sqlCursor.execute(f"DROP TEMPORARY TABLE {stagingTable}")
+            _bump_table_version(sqlCursor,table)
+            if progress:
+                print(f"\t{table}: backfilled the entity columns of {nRows} rows")
 
+    _invalidate_table(table)
+    return ls_added
 
 
 # ******************* APPEND ITEM(S) TO TABLE ********************
-def sql_table_insert(table: str,item: dict,progress: bool=False):
+def sql_table_insert(table: str,item: dict,progress: bool=False,batch_size: int=1000):
     """
     This function inserts entry(ies) from item into table from the 
     database specified in support_tools.creds object. 
@@ -432,57 +1141,67 @@ def sql_table_insert(table: str,item: dict,progress: bool=False):
     ----------
     table : str
         target table in the database
-    :item : str
-        dictionary containing the table elements of the item(s) to remove
+    item : dict
+        dictionary containing the table elements of the item(s) to insert
     progress : bool
         flag to display command line output providing additional details on the processing status, by default False
-    :type progress: bool, optional
+    batch_size : int, optional
+        number of items per SELECT/INSERT statement, by default 1000
     """
-    
+    _ensure_version_table(st.creds.database)
+
     #connect to sql database
-    sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',st.creds.database,progress)
-    sqlCursor = sqlConnection.cursor()
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-    if sql_check_table_exists(sqlCursor,table):
+        if sql_check_table_exists(sqlCursor,table):
 
-        #create query
-        if 'sourcedata' in table:
+            #create rows
+            if 'sourcedata' in table:
+                columns = ['fullpath','filename']
+            else:
+                columns = ['fullpath','filename','basename','extension']
             if type(item['fullpath']) == list:
-                for r in range(len(item['fullpath'])):
-                    f = query_source_file(item['fullpath'][r])
-                    if f is None:
-                        sqlCMD ="""INSERT INTO %s (fullpath, filename) VALUES ('%s', '%s')""" % (table, item['fullpath'][r], item['filename'][r])
-                        sqlCursor.execute(sqlCMD)
-
+                rows = list(zip(*[item[c] for c in columns]))
             else:
-                f = query_source_file(item['fullpath'])
-                if f is None:
-                    sqlCMD ="""INSERT INTO %s (fullpath, filename) VALUES ('%s', '%s')""" % (table, item['fullpath'], item['filename'])
-                    sqlCursor.execute(sqlCMD)
+                rows = [tuple(item[c] for c in columns)]
 
-        else:
-            if type(item['fullpath']) == list:
-                for r in range(len(item['fullpath'])):
-                    f = query_file(item['fullpath'][r])
-                    if f is None:
-                        sqlCMD ="""INSERT INTO %s (fullpath, filename, basename, extension) VALUES ('%s', '%s', '%s', '%s')""" % (table, item['fullpath'][r], item['filename'][r], item['basename'][r], item['extension'][r])
-                        sqlCursor.execute(sqlCMD)
+            #parse BIDS entities from the fullpath when the table stores them
+            if not 'sourcedata' in table and all(c in sql_get_table_columns(sqlCursor,table) for c in ENTITY_COLUMNS):
+                columns = st.catalog.CATALOG_COLUMNS
+                rows = [r + st.catalog.get_bids_entry(r[0]) for r in rows]
 
-            else:
-                f = query_file(item['fullpath'])
-                if f is None:
-                    sqlCMD ="""INSERT INTO %s (fullpath, filename, basename, extension) VALUES ('%s', '%s', '%s', '%s')""" % (table, item['fullpath'], item['filename'], item['basename'], item['extension'])
-                    sqlCursor.execute(sqlCMD)
-    
-    # commit changes and close connection
-    sqlConnection.commit()
-    sqlConnection.close()
+            #skip items already in the table (single query per batch)
+            existing = set()
+            for i in range(0, len(rows), batch_size):
+                batch = [r[0] for r in rows[i:i+batch_size]]
+                sqlCursor.execute(f"SELECT fullpath FROM {table} WHERE fullpath IN ({','.join(['%s'] * len(batch))})", batch)
+                existing.update(f[0] for f in sqlCursor.fetchall())
+            rows = [r for r in rows if r[0] not in existing]
+
+            #insert remaining items
+            sqlCMD = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            for i in range(0, len(rows), batch_size):
+                sqlCursor.executemany(sqlCMD, rows[i:i+batch_size])
+            if rows:
+                _bump_table_version(sqlCursor,table)
+
+            if progress:
+                print(f"\tinserted {len(rows)} items into {table} ({len(existing)} already present)")
+
+    #cached results and snapshot freshness must be re-checked after this change
+    _invalidate_table(table)
 
 
 # ******************* APPEND ITEM(S) TO TABLE ********************
-def sql_table_remove(table: str,item: dict,progress: bool=False):
+def sql_table_remove(table: str,item: dict,progress: bool=False) -> int:
     """
-    This function deletes an entry table from the database specified in support_tools.creds object. 
+    This function deletes entry(ies) from a table in the database specified in support_tools.creds object.
+    As before v4.8.0, every value of item['fullpath'] is a MySQL regular expression and removes every row
+    whose fullpath matches it (unanchored); patterns are bound as parameters and literal patterns are
+    rewritten as LIKE/equality (see _compile_pattern). Directories in item['prefix'] remove everything
+    beneath them. All deletes are applied in a single transaction. Use sql_table_delete() to remove rows
+    by exact fullpath.
 
     sql_table_remove(table,item,progress=True)
 
@@ -491,47 +1210,243 @@ def sql_table_remove(table: str,item: dict,progress: bool=False):
     table : str
         target table in the database
     item : dict
-        dictionary containing the table elements of the item(s) to remove
+        dictionary containing the fullpath pattern(s) (str or list) and/or directory prefix(es) (str or list) of the item(s) to remove
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    int
+        number of deleted rows
     """
-    
-    #connect to sql database
-    sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',st.creds.database,progress)
-    sqlCursor = sqlConnection.cursor()
+    patterns = item.get('fullpath') or []
+    prefixes = item.get('prefix') or []
+    if isinstance(patterns,str):
+        patterns = [patterns]
+    if isinstance(prefixes,str):
+        prefixes = [prefixes]
+    prefixes = sorted(set(p.rstrip(os.sep) + os.sep for p in prefixes))
+    nRows = 0
+    _ensure_version_table(st.creds.database)
+
+    #connect to sql database (rolled back on any error)
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-    if sql_check_table_exists(sqlCursor,table):
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not remove from the table {table} - does not exist")
+            return 0
+        table = _check_identifier(table)
 
-        # create query
-        if 'sourcedata' in table:
-            if type(item['fullpath']) == list:
-                for r in range(len(item['fullpath'])):
-                    f = query_source_file(item['fullpath'][r])
-                    if f is not None:
-                        sqlCMD ="""DELETE FROM %s WHERE fullpath REGEXP '%s'""" % (table, item['fullpath'][r])
-                        sqlCursor.execute(sqlCMD)
+        for pattern in sorted(set(patterns)):
+            predicate, value = _compile_pattern('fullpath',pattern)
+            nRows += sqlCursor.execute(f"DELETE FROM {table} WHERE {predicate}", [value])
 
-            else:
-                f = query_source_file(item['fullpath'])
-                if f is not None:
-                    sqlCMD ="""DELETE FROM %s WHERE fullpath REGEXP '%s'""" % (table, item['fullpath'])
-                    sqlCursor.execute(sqlCMD)
+        for prefix in prefixes:
+            nRows += sqlCursor.execute(f"DELETE FROM {table} WHERE fullpath LIKE %s", [_escape_like(prefix) + '%'])
 
-        else:
-            if type(item['fullpath']) == list:
-                for r in range(len(item['fullpath'])):
-                    f = query_source_file(item['fullpath'][r])
-                    if f is not None:
-                        sqlCMD ="""DELETE FROM %s WHERE fullpath REGEXP '%s'""" % (table, item['fullpath'][r])
-                        sqlCursor.execute(sqlCMD)
+        if nRows:
+            _bump_table_version(sqlCursor,table)
+        if progress:
+            print(f"\t{table}: {nRows} rows deleted")
 
-            else:
-                f = query_source_file(item['fullpath'])
-                if f is not None:
-                    sqlCMD ="""DELETE FROM %s WHERE fullpath REGEXP '%s'""" % (table, item['fullpath'])
-                    sqlCursor.execute(sqlCMD)
-    
-    # commit changes and close connection
-    sqlConnection.commit()
-    sqlConnection.close()
+    _invalidate_table(table)
+    return nRows
+
+
+def sql_table_delete(table: str, paths: str|list=None, prefixes: str|list=None, batch_size: int=1000, progress: bool=False) -> tuple:
+    """
+    This function deletes rows from a table in the database specified in support_tools.creds object by exact
+    fullpath (batched DELETE ... WHERE fullpath IN (...)) and/or by directory prefix (DELETE ... WHERE fullpath
+    LIKE 'prefix/%', an idx_fullpath range scan). Paths are bound as parameters, so regular expression and LIKE
+    metacharacters in them are matched literally. All deletes are applied in a single transaction.
+
+    Parameters
+    ----------
+    table : str
+        target table in the database
+    paths : str | list, optional
+        fullpath(s) to remove, by default None
+    prefixes : str | list, optional
+        directory fullpath(s) whose contents are removed (a trailing separator is added, so sub-01 does not match sub-010), by default None
+    batch_size : int, optional
+        number of paths per DELETE statement, by default 1000
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    tuple
+        (number of rows deleted by exact path, number of rows deleted by prefix)
+    """
+    if isinstance(paths,str):
+        paths = [paths]
+    if isinstance(prefixes,str):
+        prefixes = [prefixes]
+    paths = sorted(set(paths or []))
+    prefixes = sorted(set(p.rstrip(os.sep) + os.sep for p in prefixes or []))
+    nPaths = 0
+    nPrefixes = 0
+    _ensure_version_table(st.creds.database)
+
+    #connect to sql database (rolled back on any error)
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not remove from the table {table} - does not exist")
+            return 0, 0
+        table = _check_identifier(table)
+
+        for i in range(0, len(paths), batch_size):
+            batch = paths[i:i+batch_size]
+            nPaths += sqlCursor.execute(f"DELETE FROM {table} WHERE fullpath IN ({','.join(['%s'] * len(batch))})", batch)
+
+        for prefix in prefixes:
+            nPrefixes += sqlCursor.execute(f"DELETE FROM {table} WHERE fullpath LIKE %s", [_escape_like(prefix) + '%'])
+        if nPaths or nPrefixes:
+            _bump_table_version(sqlCursor,table)
+
+        if progress:
+            print(f"\t{table}: {nPaths} rows deleted by path, {nPrefixes} rows deleted by prefix")
+
+    _invalidate_table(table)
+    return nPaths, nPrefixes
+
+
+# ******************* SYNCHRONIZE TABLE WITH DISK ********************
+def sql_table_sync(table: str, items: list, columns: list=['fullpath','filename','basename','extension'], batch_size: int=1000, progress: bool=False) -> tuple:
+    """
+    This function diffs the files currently on disk against the fullpath column of a
+    searchTable-formatted table (fullpath, filename, basename, extension) in the database
+    specified in support_tools.creds object, then deletes rows for files that no longer
+    exist and inserts rows for new files. All changes are applied in a single transaction,
+    so readers see the previous table contents until the commit.
+
+    Parameters
+    ----------
+    table : str
+        target table in the database
+    items : list
+        list of (fullpath, filename, basename, extension) tuples for every file on disk, see support_tools.catalog.get_catalog_entry
+    columns : list, optional
+        table columns contained in each item (fullpath first), by default ['fullpath','filename','basename','extension']
+    batch_size : int, optional
+        number of rows per INSERT/DELETE statement, by default 1000
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    tuple
+        (number of inserted rows, number of deleted rows)
+    """
+    _ensure_version_table(st.creds.database)
+
+    #connect to sql database (rolled back on any error)
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not update the table {table} - does not exist")
+            return 0, 0
+
+        sqlCursor.execute(f"SELECT fullpath FROM {table}")
+        existing = set(f[0] for f in sqlCursor.fetchall())
+
+        d_items = {i[0]: i for i in items}
+        ls_insert = [d_items[f] for f in d_items.keys() - existing]
+        ls_delete = sorted(existing - d_items.keys())
+
+        if progress:
+            print(f"\t{table}: {len(ls_insert)} rows to insert, {len(ls_delete)} rows to delete")
+
+        for i in range(0, len(ls_delete), batch_size):
+            batch = ls_delete[i:i+batch_size]
+            sqlCursor.execute(f"DELETE FROM {table} WHERE fullpath IN ({','.join(['%s'] * len(batch))})", batch)
+
+        sqlCMD = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        for i in range(0, len(ls_insert), batch_size):
+            sqlCursor.executemany(sqlCMD, ls_insert[i:i+batch_size])
+        if ls_insert or ls_delete:
+            _bump_table_version(sqlCursor,table)
+
+    _invalidate_table(table)
+    return len(ls_insert), len(ls_delete)
+
+
+# ******************* BULK LOAD TABLE ********************
+def sql_table_bulk_load(table: str, rows, columns: list=['fullpath','filename','basename','extension'], batch_size: int=5000, progress: bool=False) -> tuple:
+    """
+    This function rebuilds a table from the database specified in support_tools.creds object.
+    Rows are streamed in multi-row executemany batches into an empty staging copy of the table
+    (<table>_staging), which is then atomically swapped over the live table with RENAME TABLE.
+    The live table remains fully populated until the swap.
+
+    Parameters
+    ----------
+    table : str
+        target table in the database
+    rows : iterable
+        iterable (list or generator) of tuples ordered as columns
+    columns : list, optional
+        table columns contained in each row, by default ['fullpath','filename','basename','extension']
+    batch_size : int, optional
+        number of rows sent per INSERT statement, by default 5000
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+
+    Returns
+    -------
+    tuple
+        (number of rows loaded, rows per second)
+    """
+    t = time.time()
+    stagingTable = table + '_staging'
+    oldTable = table + '_old'
+    nRows = 0
+    _ensure_version_table(st.creds.database)
+
+    #connect to sql database
+    with sql_connection(st.creds.database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not load the table {table} - does not exist")
+            return 0, 0.0
+
+        try:
+            sqlCursor.execute(f"DROP TABLE IF EXISTS {stagingTable}, {oldTable}")
+            sqlCursor.execute(f"CREATE TABLE {stagingTable} LIKE {table}")
+
+            sqlCMD = f"INSERT INTO {stagingTable} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    sqlCursor.executemany(sqlCMD, batch)
+                    sqlConnection.commit()
+                    nRows += len(batch)
+                    batch = []
+                    if progress:
+                        print(f"\t{stagingTable}: {nRows} rows loaded ({nRows / (time.time() - t):.0f} rows/s)")
+            if batch:
+                sqlCursor.executemany(sqlCMD, batch)
+                sqlConnection.commit()
+                nRows += len(batch)
+
+            #atomic swap, then discard the previous table (the version is bumped first, so snapshots are never considered current for the new contents)
+            _bump_table_version(sqlCursor,table)
+            sqlCursor.execute(f"RENAME TABLE {table} TO {oldTable}, {stagingTable} TO {table}")
+            sqlCursor.execute(f"DROP TABLE {oldTable}")
+            sqlConnection.commit()
+        except Exception:
+            sqlCursor.execute(f"DROP TABLE IF EXISTS {stagingTable}")
+            raise
+
+    _invalidate_table(table)
+    rate = nRows / max(time.time() - t, 1e-6)
+    return nRows, rate
 
 
 def sql_check_table_exists(sqlCursor: pymysql.cursors.Cursor, table: str) -> bool:
@@ -559,6 +1474,127 @@ def sql_check_table_exists(sqlCursor: pymysql.cursors.Cursor, table: str) -> boo
     return False
 
 
+def sql_get_table_columns(sqlCursor: pymysql.cursors.Cursor, table: str) -> list:
+    """
+    This function lists the columns of a table in the database pointed to by the
+    pymysql.cursors.Cursor object.
+
+    Parameters
+    ----------
+    sqlCursor : pymysql.cursors.Cursor
+        open cursor opbject to the database
+    table : str
+        target table in the database
+
+    Returns
+    -------
+    list
+        column names in table order
+    """
+
+    sqlCursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position", (table,))
+    return [f[0] for f in sqlCursor.fetchall()]
+
+
+# ******************* QUERY BY BIDS ENTITIES ********************
+def sql_query_entities(searchtable: str=None, database: str=None, returncol: str|list='fullpath', orderby: str='fullpath', derivatives: bool=None, inclusion: str|list=None, exclusion: str|list=None, progress: bool=False, **entities) -> list:
+    """
+    Find all items in a searchTable by their indexed BIDS entity columns (ENTITY_COLUMNS plus extension).
+    Entity values are matched for equality (a list matches any of its values), so the lookup is an index
+    seek rather than the REGEXP scan over every fullpath performed by sql_query.
+
+    sql_query_entities(subject='001',session='01',suffix='T1w',extension='nii.gz',derivatives=False)
+    sql_query_entities(pipeline='aslprep',space='MNI152NLin2009cAsym',suffix='cbf',extension='nii.gz',description=['basil','score'])
+
+    Parameters
+    ----------
+    searchtable : str, optional
+        MySql table to search, by default None (support_tools.creds.searchTable)
+    database : str, optional
+        MySql database, by default None (support_tools.creds.database)
+    returncol : str | list, optional
+        column(s) to return, by default 'fullpath'
+    orderby : str, optional
+        column to order the query by, by default 'fullpath'
+    derivatives : bool, optional
+        restrict the query to derivatives (True) or to non-derivative files (False), by default None
+    inclusion : str | list, optional
+        literal string or list of strings that are additionally required in the fullpath, by default None
+    exclusion : str | list, optional
+        literal string or list of strings that will exclude items by their fullpath, by default None
+    progress : bool, optional
+        flag to display command line output providing additional details on the processing status, by default False
+    **entities
+        column=value pairs for subject, session, acquisition, task, run, space, description, suffix, pipeline and extension; None values are ignored
+
+    Returns
+    -------
+    list
+        values of returncol for every matching item (tuples if returncol is a list)
+    """
+    if searchtable is None:
+        searchtable = st.creds.searchTable
+    if database is None:
+        database = st.creds.database
+    if isinstance(inclusion,str):
+        inclusion = [inclusion]
+    if isinstance(exclusion,str):
+        exclusion = [exclusion]
+
+    unknown = [k for k in entities if k not in ENTITY_COLUMNS and k != 'extension']
+    if unknown:
+        raise ValueError(f"sql_query_entities: unknown entity column(s) {', '.join(unknown)}")
+
+    #build parameterised WHERE clause
+    ls_where = []
+    values = []
+    for k, v in entities.items():
+        if v is None:
+            continue
+        if isinstance(v,(list,tuple,set)):
+            v = list(v)
+            ls_where.append(f"{k} IN ({','.join(['%s'] * len(v))})")
+            values.extend(str(i) for i in v)
+        else:
+            ls_where.append(f"{k} = %s")
+            values.append(str(v))
+    if derivatives is not None:
+        ls_where.append('pipeline IS NOT NULL' if derivatives else 'pipeline IS NULL')
+    for inc in inclusion or []:
+        ls_where.append("fullpath LIKE %s")
+        values.append('%' + _escape_like(inc) + '%')
+    for exc in exclusion or []:
+        ls_where.append("fullpath NOT LIKE %s")
+        values.append('%' + _escape_like(exc) + '%')
+
+    cols = _check_identifier(returncol if isinstance(returncol,str) else ', '.join(returncol))
+    sqlQuery = f"SELECT {cols} FROM {_check_identifier(searchtable)}"
+    if ls_where:
+        sqlQuery += " WHERE " + " AND ".join(ls_where)
+    if orderby:
+        sqlQuery += f" ORDER BY {_check_identifier(orderby)}"
+
+    with sql_connection(database,progress) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+        if not sql_check_table_exists(sqlCursor,searchtable):
+            return []
+
+        if progress:
+            print(sqlCursor.mogrify(sqlQuery,values))
+        sqlCursor.execute(sqlQuery,values)
+
+        if isinstance(returncol,str):
+            return [f[0] for f in sqlCursor.fetchall()]
+        return [tuple(f) for f in sqlCursor.fetchall()]
+
+
+def _escape_like(value: str) -> str:
+    """
+    Escape the LIKE wildcards (and the escape character) in a literal string.
+    """
+    return value.replace('\\','\\\\').replace('%','\\%').replace('_','\\_')
+
+
 # ******************* CREATE CONNECTION TO MYSQL DATABASE ********************
 def create_mysql_connection(host_name: str, user_name:str , user_password: str, db_name: str = "CoNNECT", progress: bool = False) -> pymysql.connections.Connection:
     """
@@ -679,26 +1715,105 @@ def sql_mri_tracking_insert(subject: str, session: str, project: str, date: str,
     
     #connect to sql database
     try:
-        sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',st.creds.database,False)
-        sqlCursor = sqlConnection.cursor()
-
-        if sql_check_table_exists(sqlCursor,table):
-            uid = generate_unique_id(subject, session, date)
-            sqlCMD =f"INSERT INTO `{table}` (uuid, subject, session, project, date, all_data, number_checks, scan_start_time, scan_end_time, arrival_time, departure_time, scheduled_duration, scan_duration, charged_time, direct_fee) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
-            # print(sqlCMD)
-            sqlCursor.execute(sqlCMD, (uid, subject, session, project, date, all_data, number_checks, scan_start_time, scan_end_time, arrival_time, departure_time, scheduled_duration, scan_duration, charged_time, direct_fee))
-        
-        # commit changes and close connection
-        sqlConnection.commit()
-        sqlConnection.close()
+        with sql_connection(st.creds.database) as sqlConnection:
+            sqlCursor = sqlConnection.cursor()
+
+            if sql_check_table_exists(sqlCursor,table):
+                uid = generate_unique_id(subject, session, date)
+                sqlCMD =f"INSERT INTO `{table}` (uuid, subject, session, project, date, all_data, number_checks, scan_start_time, scan_end_time, arrival_time, departure_time, scheduled_duration, scan_duration, charged_time, direct_fee) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+                # print(sqlCMD)
+                sqlCursor.execute(sqlCMD, (uid, subject, session, project, date, all_data, number_checks, scan_start_time, scan_end_time, arrival_time, departure_time, scheduled_duration, scan_duration, charged_time, direct_fee))
     except pymysql.err.IntegrityError as e:
         print(f"ERROR: Skipping duplicate: {e}")
     
     
+# ******************* MRI TRACKING TIME COLUMNS ********************
+MRI_TRACKING_TIME_COLUMNS = ['scan_start_time','scan_end_time','arrival_time','departure_time','scheduled_duration','scan_duration','charged_time']
+
+
+def _mri_tracking_rows(entries: pd.DataFrame, columns: list) -> list:
+    """
+    Convert an mri_tracking DataFrame into parameter tuples: time columns formatted as 'HH:MM:SS'
+    and missing values (NaN/NaT) as NULL.
+    """
+    entries = entries[columns].copy()
+    for col in MRI_TRACKING_TIME_COLUMNS:
+        if col in entries.columns:
+            entries[col] = entries[col].astype(object).apply(fix_time_str)
+    entries = entries.astype(object).where(pd.notna(entries), None)
+    return [tuple(r) for r in entries.itertuples(index=False, name=None)]
+
+
+# ******************* UPSERT ITEM(S) INTO TABLE ********************
+def sql_mri_tracking_upsert(entries: pd.DataFrame, update_cols: list=None, table: str='mri_tracking', batch_size: int=1000) -> int:
+    """
+    Insert or update many mri_tracking rows in one statement per batch_size rows
+    (INSERT ... ON DUPLICATE KEY UPDATE, sent with executemany as multi-row inserts).
+
+    Rows are keyed by uuid. When entries has no uuid column it is computed from the subject,
+    session and date columns with generate_unique_id(). Columns that are not in the table are ignored.
+
+    Parameters
+    ----------
+    entries : pd.DataFrame
+        one row per subject/session/date, containing uuid or subject, session and date (YYYY-MM-DD)
+        plus any other mri_tracking columns to write
+    update_cols : list, optional
+        columns overwritten when the uuid already exists, by default None (every column in entries).
+        An empty list only inserts rows that do not exist yet.
+    table : str, optional
+        target table in the database, by default 'mri_tracking'
+    batch_size : int, optional
+        number of rows per INSERT statement, by default 1000
+
+    Returns
+    -------
+    int
+        number of affected rows as reported by MySQL (1 per inserted row, 2 per updated row)
+    """
+    if entries is None or entries.empty:
+        return 0
+
+    entries = entries.copy()
+    if not 'uuid' in entries.columns:
+        entries['date'] = entries['date'].astype(str)
+        entries['uuid'] = [generate_unique_id(r.subject, r.session, r.date) for r in entries[['subject','session','date']].itertuples(index=False)]
+
+    nAffected = 0
+    with sql_connection(st.creds.database) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
+
+        if not sql_check_table_exists(sqlCursor,table):
+            print(f"WARNING: did not update the table {table} - does not exist")
+            return 0
+
+        tableColumns = sql_get_table_columns(sqlCursor,table)
+        columns = ['uuid'] + [c for c in entries.columns if c in tableColumns and c != 'uuid']
+        if update_cols is None:
+            update_cols = columns[1:]
+        update_cols = [c for c in update_cols if c in columns and c != 'uuid']
+
+        sqlCMD = f"INSERT INTO `{_check_identifier(table)}` ({', '.join('`' + _check_identifier(c) + '`' for c in columns)}) VALUES ({','.join(['%s'] * len(columns))}) "
+        if update_cols:
+            sqlCMD += "ON DUPLICATE KEY UPDATE " + ', '.join(f"`{c}` = VALUES(`{c}`)" for c in update_cols)
+        else:
+            sqlCMD += "ON DUPLICATE KEY UPDATE `uuid` = `uuid`"
+
+        rows = _mri_tracking_rows(entries.drop_duplicates(subset='uuid', keep='last'), columns)
+        for i in range(0, len(rows), batch_size):
+            nAffected += sqlCursor.executemany(sqlCMD, rows[i:i+batch_size])
+
+    return nAffected
+
+
 # ******************* APPEND ITEM(S) TO TABLE ********************
 def sql_mri_tracking_set(entries: pd.DataFrame, table: str='mri_tracking'):
     """
-    This function inserts entry(ies) into the specified table.
+    This function updates existing entry(ies) in the specified table, matched by uuid.
+
+    Complete rows (as returned by sql_mri_tracking_query, containing subject, session, project and date)
+    are written with a single bulk upsert, see sql_mri_tracking_upsert(). Partial rows are updated with
+    one UPDATE per row, sent in a single transaction.
 
     Parameters
     ----------
@@ -706,43 +1821,30 @@ def sql_mri_tracking_set(entries: pd.DataFrame, table: str='mri_tracking'):
         dataframe containing the table elements of the item(s) to update
     table : str, optional
         target table in the database, by default 'mri_tracking'
-    """    
-    #connect to sql database
-    sqlConnection = create_mysql_connection('10.11.0.31','ubuntu','neuroscience',st.creds.database,False)
-    sqlCursor = sqlConnection.cursor()
+    """
+    if not 'uuid' in entries.columns:
+        print(f"WARNING: did not update the table {table} - uuid not in entries")
+        return
+    if entries.empty:
+        return
 
-    cols_to_fix = ['scan_start_time','scan_end_time','arrival_time','departure_time','scheduled_duration','scan_duration','charged_time']
-    entries = entries.copy()  # make sure it’s independent
+    if all(c in entries.columns for c in ['subject','session','project','date']):
+        sql_mri_tracking_upsert(entries, table=table)
+        return
 
-    for col in cols_to_fix:
-        # cast column to object so it can hold strings
-        if col in entries.columns:
-            entries[col] = entries[col].astype(object).apply(fix_time_str)
-    
+    #connect to sql database
+    with sql_connection(st.creds.database) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-    if sql_check_table_exists(sqlCursor,table) and 'uuid' in entries.columns:
-        for _, row in entries.iterrows():
+        if sql_check_table_exists(sqlCursor,table):
             # Columns to update (exclude UUID)
             update_cols = [col for col in entries.columns if col != 'uuid']
-            
-            # Build the SET clause dynamically
-            set_clause = ', '.join([f"{col} = %s" for col in update_cols])
-            
-            # Values to update, plus the UUID for the WHERE clause
-            values = tuple(row[col] for col in update_cols) + (row['uuid'],)
-            
-            sqlCmd = f"UPDATE {table} SET {set_clause} WHERE uuid = %s"
-            # parts = sqlCmd.split(", ")
-            # for part in parts:
-            #     print(part + ",")  # keep commas
-            sqlCursor.execute(sqlCmd, values)
+            set_clause = ', '.join([f"`{_check_identifier(col)}` = %s" for col in update_cols])
+            sqlCmd = f"UPDATE `{_check_identifier(table)}` SET {set_clause} WHERE uuid = %s"
+            sqlCursor.executemany(sqlCmd, _mri_tracking_rows(entries, update_cols + ['uuid']))
 
-    else:
-        print(f"WARNING: did not update the table {table} - does not exists or uuid not in entries")    
-    
-    # commit changes and close connection
-    sqlConnection.commit()
-    sqlConnection.close()
+        else:
+            print(f"WARNING: did not update the table {table} - does not exists or uuid not in entries")
 
 
 def generate_unique_id(subject: str, session: str, date: str) -> str:
@@ -770,7 +1872,7 @@ def generate_unique_id(subject: str, session: str, date: str) -> str:
 
 
 # ******************* QUERY FOR DIRECTORIES CONTAINING DICOMS ********************
-def sql_mri_tracking_query(returncol: str='*', searchcol: str='date', orderby: str='date', subject: str=None, session: str=None, project: str=None, regex: str=None, year: str=None, month: str=None, day: str=None, table: str='mri_tracking') -> pd.DataFrame:
+def sql_mri_tracking_query(returncol: str='*', searchcol: str='date', orderby: str='date', subject: str=None, session: str=None, project: str=None, regex: str=None, year: str=None, month: str=None, day: str=None, uuid: str|list=None, table: str='mri_tracking') -> pd.DataFrame:
     """
     Find all items in a MySql table that match the specified search string regex.
 
@@ -797,6 +1899,8 @@ def sql_mri_tracking_query(returncol: str='*', searchcol: str='date', orderby: s
         restrict the query in date column to a specific month, by default None
     day : str
         restrict the query in date column to a specific day of the month, by default None
+    uuid : str | list
+        restrict the query to one or more uuids (see generate_unique_id), by default None
     table : str
         mysql table to query, by default 'mri_tracking'
 
@@ -807,68 +1911,54 @@ def sql_mri_tracking_query(returncol: str='*', searchcol: str='date', orderby: s
     """
     
     #connect to sql database
-    sqlConnection = create_mysql_connection(host_name='10.11.0.31',user_name='ubuntu',user_password='neuroscience',db_name=st.creds.database,progress=False)
-    sqlCursor = sqlConnection.cursor()
-
-
-    if sql_check_table_exists(sqlCursor,table):
-
-        #create query
-        if regex:
-            sqlQuery = """SELECT %s FROM %s WHERE %s REGEXP "%s" """ % (returncol,table,searchcol,regex)
-            if subject:
-                sqlQuery +=  """and subject = "%s" """ % (subject)
-            if session:
-                sqlQuery +=  """and session = "%s" """ % (session)
-            if project:
-                sqlQuery +=  """and project = "%s" """ % (project)
-
-            sqlQuery += "ORDER BY %s;" % (orderby)
-        elif year or month:
-            sqlQuery = """SELECT %s FROM %s WHERE """ % (returncol,table)
-            if year:
-                sqlQuery +=  "YEAR(date) = %s " % (year)
-            if month:
-                if year:
-                    sqlQuery += "and "
-                sqlQuery +=  "MONTH(date) = %s " % (month)
-            if day:
-                if year or month:
-                    sqlQuery += "and "
-                sqlQuery +=  "DAY(date) = %s " % (day)
-            if subject:
-                sqlQuery +=  """and subject = "%s" """ % (subject)
-            if session:
-                sqlQuery +=  """and session = "%s" """ % (session)
-            if project:
-                sqlQuery +=  """and project = "%s" """ % (project)
-            sqlQuery += "ORDER BY %s;" % (orderby)
-        elif isinstance(regex, bool):
-            sqlQuery = "SELECT %s FROM %s WHERE %s = %s and number_checks > 5 " % (returncol,table,searchcol,regex)
-            if subject:
-                sqlQuery +=  """and subject = "%s" """ % (subject)
-            if session:
-                sqlQuery +=  """and session = "%s" """ % (session)
-            if project:
-                sqlQuery +=  """and project = "%s" """ % (project)
-            sqlQuery += "ORDER BY %s;" % (orderby)
+    with sql_connection(st.creds.database) as sqlConnection:
+        sqlCursor = sqlConnection.cursor()
 
-    else:
-        sqlConnection.close()
-        columns = [desc[0] for desc in sqlCursor.description]
-        df = pd.DataFrame(columns=columns)
-        return df
+
+        if sql_check_table_exists(sqlCursor,table):
+
+            #create parameterised query
+            if regex:
+                ls_where, values = _build_where(_check_identifier(searchcol),regex)
+            elif year or month:
+                ls_where = []
+                values = []
+                for f, v in [('YEAR',year),('MONTH',month),('DAY',day)]:
+                    if v:
+                        ls_where.append(f"{f}(date) = %s")
+                        values.append(v)
+            elif isinstance(regex, bool):
+                ls_where = [f"{_check_identifier(searchcol)} = %s", "number_checks > 5"]
+                values = [regex]
+            else:
+                ls_where = []
+                values = []
+
+            if uuid:
+                if isinstance(uuid, str):
+                    uuid = [uuid]
+                ls_where.append(f"uuid IN ({','.join(['%s'] * len(uuid))})")
+                values.extend(uuid)
+
+            for k, v in [('subject',subject),('session',session),('project',project)]:
+                if v:
+                    ls_where.append(f"{k} = %s")
+                    values.append(v)
+            sqlQuery = _build_select(table,returncol,ls_where,orderby)
+
+        else:
+            columns = [desc[0] for desc in sqlCursor.description]
+            df = pd.DataFrame(columns=columns)
+            return df
     
-    # run quory
-    # print(sqlQuery)
-    sqlCursor.execute(sqlQuery)
-    # Get column names
-    columns = [desc[0] for desc in sqlCursor.description]
+        # run quory
+        sqlCursor.execute(sqlQuery,values)
+        # Get column names
+        columns = [desc[0] for desc in sqlCursor.description]
 
-    # Convert to DataFrame
-    rows = sqlCursor.fetchall()
-    df = pd.DataFrame(rows, columns=columns)
-    sqlConnection.close()
+        # Convert to DataFrame
+        rows = sqlCursor.fetchall()
+        df = pd.DataFrame(rows, columns=columns)
 
-    #get sql returned list
-    return df
\ No newline at end of file
+        #get sql returned list
+        return df
\ No newline at end of file
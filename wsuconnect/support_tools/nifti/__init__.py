@@ -0,0 +1,4 @@
+# __init__.py
+from ._nifti import DATATYPES, read_nifti_header, get_dims, header_cache_info, header_cache_clear
+
+__all__ = ['DATATYPES','read_nifti_header','get_dims','header_cache_info','header_cache_clear']
\ No newline at end of file
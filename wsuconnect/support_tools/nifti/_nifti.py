@@ -0,0 +1,188 @@
+# _nifti.py
+
+# Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
+# Created on 18 Oct 2026
+#
+# v1.0.0 on 18 Oct 2026 - in-process, cached NIfTI-1/NIfTI-2 header reader (replaces fslval subprocess calls)
+
+import os
+import gzip
+import struct
+from functools import lru_cache
+
+
+VERSION = '1.0.0'
+DATE = '18 Oct 2026'
+
+
+#NIfTI datatype codes (nifti1.h)
+DATATYPES = {0: 'unknown',
+             1: 'binary',
+             2: 'uint8',
+             4: 'int16',
+             8: 'int32',
+             16: 'float32',
+             32: 'complex64',
+             64: 'float64',
+             128: 'rgb24',
+             256: 'int8',
+             512: 'uint16',
+             768: 'uint32',
+             1024: 'int64',
+             1280: 'uint64',
+             1536: 'float128',
+             1792: 'complex128',
+             2048: 'complex256',
+             2304: 'rgba32'}
+
+#xyzt_units time codes, scale to seconds
+_TIME_UNITS = {8: ('sec', 1.0),
+               16: ('msec', 1e-3),
+               24: ('usec', 1e-6)}
+_SPACE_UNITS = {1: 'meter',
+                2: 'mm',
+                3: 'micron'}
+
+#header sizes, the largest is read from every file
+_NIFTI1_SIZE = 348
+_NIFTI2_SIZE = 540
+
+
+# ******************* READ HEADER ********************
+def _read_bytes(niiFile: str, n: int) -> bytes:
+    """
+    Read the first n bytes of a (optionally gzip compressed) NIfTI file. Only the start of the
+    compressed stream is inflated.
+    """
+    with open(niiFile,'rb') as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b'\x1f\x8b':
+            with gzip.GzipFile(fileobj=f) as g:
+                return g.read(n)
+        return f.read(n)
+
+
+def _parse_header(buf: bytes) -> dict:
+    """
+    Parse a NIfTI-1 or NIfTI-2 header of either byte order.
+    """
+    if len(buf) < _NIFTI1_SIZE:
+        raise ValueError('file is too short to contain a NIfTI header')
+
+    for endian in '<>':
+        sizeof_hdr = struct.unpack_from(endian + 'i',buf,0)[0]
+        if sizeof_hdr in (_NIFTI1_SIZE,_NIFTI2_SIZE):
+            break
+    else:
+        raise ValueError('not a NIfTI-1 or NIfTI-2 header')
+
+    if sizeof_hdr == _NIFTI1_SIZE:
+        dim = struct.unpack_from(endian + '8h',buf,40)
+        datatype, bitpix = struct.unpack_from(endian + '2h',buf,70)
+        pixdim = struct.unpack_from(endian + '8f',buf,76)
+        vox_offset = int(struct.unpack_from(endian + 'f',buf,108)[0])
+        xyzt_units = buf[123]
+        magic = buf[344:348].split(b'\x00')[0].decode('latin-1')
+        version = 1
+    else:
+        if len(buf) < _NIFTI2_SIZE:
+            raise ValueError('file is too short to contain a NIfTI-2 header')
+        magic = buf[4:12].split(b'\x00')[0].decode('latin-1')
+        datatype, bitpix = struct.unpack_from(endian + '2h',buf,12)
+        dim = struct.unpack_from(endian + '8q',buf,16)
+        pixdim = struct.unpack_from(endian + '8d',buf,104)
+        vox_offset = struct.unpack_from(endian + 'q',buf,168)[0]
+        xyzt_units = struct.unpack_from(endian + 'i',buf,500)[0]
+        version = 2
+
+    #dimensions beyond ndim are reported as 1 (as fslval does)
+    ndim = max(0,min(int(dim[0]),7))
+    dims = [int(dim[i]) if i <= ndim else 1 for i in range(1,8)]
+    pixdims = [float(pixdim[i]) if i <= ndim else 1.0 for i in range(1,8)]
+
+    timeUnits, scale = _TIME_UNITS.get(xyzt_units & 0x38,('unknown',1.0))
+    return {'version': version,
+            'magic': magic,
+            'byteorder': endian,
+            'ndim': ndim,
+            'dims': dims,
+            'pixdims': pixdims,
+            'tr': pixdims[3] * scale if ndim >= 4 else None,
+            'datatype': int(datatype),
+            'datatype_name': DATATYPES.get(int(datatype),'unknown'),
+            'bitpix': int(bitpix),
+            'vox_offset': int(vox_offset),
+            'space_units': _SPACE_UNITS.get(xyzt_units & 0x07,'unknown'),
+            'time_units': timeUnits}
+
+
+@lru_cache(maxsize=4096)
+def _cached_header(niiFile: str, mtime: int, size: int) -> dict:
+    """
+    Cached header read, keyed by the file's modification time and size so that rewritten images are re-read.
+    """
+    return _parse_header(_read_bytes(niiFile,_NIFTI2_SIZE))
+
+
+def read_nifti_header(niiFile: str) -> dict:
+    """
+    Read the header of a NIfTI-1 or NIfTI-2 image (.nii, .nii.gz or .hdr) directly, without starting
+    an FSL process. Only the first 540 bytes are read (inflated for gzip compressed images). Headers
+    are cached per file and re-read if the file's size or modification time changes.
+
+    Parameters
+    ----------
+    niiFile : str
+        fullpath to a NIfTI image
+
+    Returns
+    -------
+    dict
+        version (1 or 2), ndim, dims (dim1-dim7, dimensions beyond ndim are 1), pixdims (pixdim1-pixdim7),
+        tr (pixdim4 in seconds, None for images with fewer than 4 dimensions), datatype (code), datatype_name,
+        bitpix, vox_offset, space_units, time_units, magic and byteorder. The returned dict is a copy
+        and may be modified.
+
+    Raises
+    ------
+    ValueError
+        the file does not start with a NIfTI header
+    """
+    niiFile = os.path.realpath(niiFile)
+    s = os.stat(niiFile)
+    d_hdr = _cached_header(niiFile,s.st_mtime_ns,s.st_size)
+    return dict(d_hdr,dims=list(d_hdr['dims']),pixdims=list(d_hdr['pixdims']))
+
+
+def get_dims(niiFile: str, n: int=4) -> list:
+    """
+    Image dimensions dim1 to dimN, equivalent to calling fslval for each of dim1 ... dimN.
+
+    Parameters
+    ----------
+    niiFile : str
+        fullpath to a NIfTI image
+    n : int, optional
+        number of dimensions to return, by default 4
+
+    Returns
+    -------
+    list
+        [dim1, ..., dimN]
+    """
+    return read_nifti_header(niiFile)['dims'][:n]
+
+
+def header_cache_info():
+    """
+    Hit/miss statistics of the header cache (functools.lru_cache info).
+    """
+    return _cached_header.cache_info()
+
+
+def header_cache_clear():
+    """
+    Forget every cached header.
+    """
+    _cached_header.cache_clear()
@@ -0,0 +1,239 @@
+#!/resshare/python3_venv/bin/python
+# the command above ^^^ sets python 3.10.9 as the interpreter for this program
+
+# Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
+# Created on 18 Oct 2026
+#
+# Modified on 18 Oct 2026 - report entries whose ownership could not be changed (unknown group) as skipped
+
+import os
+import sys
+import grp
+import time
+import argparse
+import datetime
+from functools import lru_cache
+
+
+#versioning
+VERSION = '1.0.1'
+DATE = '18 Oct 2026'
+
+
+#input argument parser
+parser = argparse.ArgumentParser('normalize_permissions.py: set files and directories to mode 770, owned by root and the share group, and write a report of every change. Replaces the per-file chmod/chown previously performed during connect_neuro_db_update.py.')
+parser.add_argument('-p','--project', action='store', dest='PROJECT', help="normalize the project's data directory (excluding *_work directories) and write the report to <project>/code/processing_logs/normalize_permissions", default=None)
+parser.add_argument('-i','--in-dir', nargs='+', dest='INDIR', help='fullpath to directory(ies) to normalize instead of a project data directory', default=None)
+parser.add_argument('-o','--output', action='store', dest='OUTPUT', help='fullpath to the output report (tsv)', default=None)
+parser.add_argument('-g','--group', action='store', dest='GROUP', help='target group name, defaults to the top-level mount of each path (e.g. resshare)', default=None)
+parser.add_argument('--full', action='store_true', dest='FULL', help='check every file, even in directories that were already correct and unchanged since the previous run', default=False)
+parser.add_argument('-t','--threads', action='store', type=int, dest='THREADS', help='number of worker threads (default 8)', default=8)
+parser.add_argument('--progress', action='store_true', dest='PROGRESS', help='(bool) run in verbose mode', default=False)
+
+
+
+@lru_cache(maxsize=None)
+def _get_gid(group: str) -> int:
+    """
+    Cached group id lookup.
+
+    :param group: group name
+    :type group: str
+
+    :return: group id, or None if the group does not exist
+    :rtype: int
+    """
+    try:
+        return grp.getgrnam(group).gr_gid
+    except KeyError:
+        return None
+
+
+def _fix_entry(path: str, st_mode: int, st_uid: int, st_gid: int, mode: int, gid: int) -> list:
+    """
+    Set mode and ownership (root:gid) of a single path if they differ from the target.
+
+    When the target group could not be resolved (gid is None) ownership is left unchanged; entries that
+    only deviate in ownership are then reported as 'skipped' rather than 'fixed'.
+
+    :return: report row [path, old mode, new mode, old uid:gid, new uid:gid, status], or None if nothing changed
+    :rtype: list
+    """
+    b_modeOk = (st_mode & 0o777) == mode
+    b_ownerOk = st_uid == 0 and (gid is None or st_gid == gid)
+    if b_modeOk and b_ownerOk:
+        if gid is None and st_uid != 0:
+            return [path, oct(st_mode & 0o777), oct(mode), f"{st_uid}:{st_gid}", f"{st_uid}:{st_gid}", 'skipped']
+        return None
+
+    status = 'fixed'
+    newOwner = f"0:{gid}"
+    try:
+        if not b_modeOk:
+            os.chmod(path, mode)
+        if gid is not None:
+            if not b_ownerOk:
+                os.chown(path, 0, gid)
+        else:
+            newOwner = f"{st_uid}:{st_gid}"
+            if st_uid != 0:
+                status = 'skipped'
+    except OSError as e:
+        status = f"error: {e.strerror}"
+
+    return [path, oct(st_mode & 0o777), oct(mode), f"{st_uid}:{st_gid}", newOwner, status]
+
+
+def _normalize_dir(d: str, mode: int, group: str, since: float) -> tuple:
+    """
+    Normalize a single directory and the files directly inside of it.
+
+    Files are only checked when the directory itself needed fixing, has changed (mtime) since
+    the previous run, or no previous run is known. Creating, removing or renaming a file updates
+    its directory's mtime, so an unchanged, correctly-owned directory only holds files that were
+    already checked.
+
+    :return: (list of report rows, list of sub-directory fullpaths, number of checked files)
+    :rtype: tuple
+    """
+    rows = []
+    dirs = []
+    nChecked = 0
+    gid = _get_gid(group if group else d.split(os.sep)[1])
+
+    try:
+        dirStat = os.stat(d)
+    except OSError:
+        return rows, dirs, nChecked
+
+    r = _fix_entry(d, dirStat.st_mode, dirStat.st_uid, dirStat.st_gid, mode, gid)
+    if r:
+        rows.append(r)
+    checkFiles = since is None or (r is not None and r[-1] != 'skipped') or dirStat.st_mtime > since
+
+    try:
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_symlink():
+                    continue
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(e.path)
+                elif checkFiles:
+                    s = e.stat(follow_symlinks=False)
+                    nChecked += 1
+                    r = _fix_entry(e.path, s.st_mode, s.st_uid, s.st_gid, mode, gid)
+                    if r:
+                        rows.append(r)
+    except OSError:
+        pass
+
+    return rows, dirs, nChecked
+
+
+# *******************  MAIN  ********************
+def normalize_permissions(INDIR: str|list, output: str=None, group: str=None, mode: int=0o770, since: float=None, max_workers: int=8, progress: bool=False) -> list:
+    """
+    Set every directory and file beneath INDIR to mode 770, owned by root and the share group, and optionally
+    write a tab-separated report of every change. Directories are processed concurrently by a pool of threads
+    and group ids are looked up once per group.
+
+    :param INDIR: fullpath to a directory or list of directories
+    :type INDIR: str | list
+
+    :param output: fullpath to the output report (tsv), defaults to None
+    :type output: str, optional
+
+    :param group: target group name, defaults to None (top-level mount of each path, e.g. /resshare -> resshare)
+    :type group: str, optional
+
+    :param mode: target permission bits, defaults to 0o770
+    :type mode: int, optional
+
+    :param since: epoch time of the previous run; files in directories that are already correct and unchanged since then are skipped, defaults to None (check every file)
+    :type since: float, optional
+
+    :param max_workers: number of worker threads, defaults to 8
+    :type max_workers: int, optional
+
+    :param progress: flag to display command line output providing additional details on the processing status, defaults to False
+    :type progress: bool, optional
+
+    :return: report rows [path, old mode, new mode, old uid:gid, new uid:gid, status]
+    :rtype: list
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if isinstance(INDIR,str):
+        INDIR = [INDIR]
+
+    t = time.time()
+    rows = []
+    nDirs = 0
+    nChecked = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_normalize_dir,d,mode,group,since) for d in INDIR}
+        while pending:
+            done, pending = wait(pending,return_when=FIRST_COMPLETED)
+            for future in done:
+                tmp_rows, dirs, tmp_nChecked = future.result()
+                nDirs += 1
+                nChecked += tmp_nChecked
+                rows.extend(tmp_rows)
+                pending.update(executor.submit(_normalize_dir,d,mode,group,since) for d in dirs)
+                if progress:
+                    for r in tmp_rows:
+                        print('\t' + '\t'.join(r))
+
+    if output:
+        if not os.path.isdir(os.path.dirname(output)):
+            os.makedirs(os.path.dirname(output))
+        with open(output,'w') as txtFile:
+            txtFile.write('path\told_mode\tnew_mode\told_owner\tnew_owner\tstatus\n')
+            txtFile.writelines('\t'.join(r) + '\n' for r in rows)
+
+    print(f"normalize_permissions: {nDirs} directories, {nChecked} files checked, {len([r for r in rows if r[-1] == 'fixed'])} fixed, {len([r for r in rows if r[-1] == 'skipped'])} skipped (group not found), {len([r for r in rows if r[-1].startswith('error')])} errors in {time.time() - t:.1f} seconds")
+    return rows
+
+
+if __name__ == '__main__':
+    """
+    The entry point of this program for command-line utilization.
+    """
+    options = parser.parse_args()
+
+    output = options.OUTPUT
+    since = None
+    stateFile = None
+    if options.PROJECT:
+        REALPATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        if not REALPATH in sys.path:
+            sys.path.append(REALPATH)
+        from wsuconnect import support_tools as st
+
+        if not st.creds.read(options.PROJECT):
+            sys.exit(1)
+        inDirs = options.INDIR
+        if not inDirs:
+            inDirs = [os.path.join(st.creds.dataDir,d) for d in os.listdir(st.creds.dataDir) if not any(s in d for s in ['fmriprep_work','aslprep_work'])]
+        base = os.path.join(st.creds.dataDir,'code','processing_logs','normalize_permissions')
+        if not output:
+            output = os.path.join(base,st.creds.project + '_normalize_permissions_' + datetime.datetime.today().strftime('%Y%m%d_%H%M') + '.tsv')
+        stateFile = os.path.join(base,st.creds.project + '_normalize_permissions.last_run')
+        if not options.FULL and os.path.isfile(stateFile):
+            since = os.path.getmtime(stateFile)
+    elif options.INDIR:
+        inDirs = options.INDIR
+    else:
+        parser.error('one of -p/--project or -i/--in-dir is required')
+
+    t = time.time()
+    normalize_permissions(inDirs,output=output,group=options.GROUP,since=since,max_workers=options.THREADS,progress=options.PROGRESS)
+
+    #record the start of this run for the next incremental pass
+    if stateFile:
+        if not os.path.isdir(os.path.dirname(stateFile)):
+            os.makedirs(os.path.dirname(stateFile))
+        with open(stateFile,'w') as txtFile:
+            txtFile.write(datetime.datetime.fromtimestamp(t).strftime('%Y%m%d %H:%M:%S') + '\n')
+        os.utime(stateFile,(t,t))
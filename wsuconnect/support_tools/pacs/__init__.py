@@ -0,0 +1,4 @@
+# __init__.py
+from ._pacs import PacsWatcher, SeriesTracker, WorkerPool, same_filesystem, stage_files, SERIES_STATES, IngestJournal
+
+__all__ = ['PacsWatcher','SeriesTracker','WorkerPool','same_filesystem','stage_files','SERIES_STATES','IngestJournal']
@@ -0,0 +1,1067 @@
+# _pacs.py
+
+# Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
+# Created on 18 Oct 2026
+#
+# v1.4.2 on 18 Oct 2026 - only remove partial staging directories whose owning process is gone
+# v1.4.1 on 18 Oct 2026 - per-patient arrival times for the patient quiet period
+# v1.4.0 on 18 Oct 2026 - journal key/value store (e.g. the Orthanc /changes cursor)
+# v1.3.0 on 18 Oct 2026 - persistent SQLite ingest journal
+# v1.2.0 on 18 Oct 2026 - hard link/rename staging with a checksummed copy across filesystems
+# v1.1.0 on 18 Oct 2026 - bounded conversion worker pool with per-stage timing
+# v1.0.0 on 18 Oct 2026 - inotify/scandir drop-folder watcher and per-series quiet period tracking
+
+import os
+import time
+import json
+import errno
+import shutil
+import socket
+import sqlite3
+import hashlib
+import select
+import struct
+import threading
+
+
+VERSION = '1.4.2'
+DATE = '18 Oct 2026'
+
+#partial staging directories created on another host are removed once unmodified for this many seconds
+STALE_PARTIAL_AGE = 24 * 3600
+
+#inotify event masks (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """
+    Load the inotify functions from the C library.
+
+    Returns
+    -------
+    ctypes.CDLL
+        C library with inotify_init1/inotify_add_watch/inotify_rm_watch, or None if inotify is not available
+    """
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+# ******************* DROP FOLDER WATCHER ********************
+class PacsWatcher:
+    """
+    Report new, completely written files beneath a drop folder (e.g. /PACS_m2).
+
+    In inotify mode a file is reported once it is closed after writing (IN_CLOSE_WRITE) or moved into
+    the tree (IN_MOVED_TO); new sub-directories are watched as they are created. inotify does not see
+    writes made by other hosts to network filesystems, so a scandir polling mode is also available,
+    where a file is reported once its size and modification time have not changed for `settle` seconds.
+    Both modes perform a full rescan on the first poll and every `rescan_interval` seconds after, to pick
+    up files that were already present and anything that was missed (e.g. an inotify queue overflow).
+
+    Each file is reported once until forget() is called for it.
+
+    Parameters
+    ----------
+    dcmPath : str
+        fullpath to the drop folder
+    mode : str, optional
+        'inotify', 'poll', or 'auto' (inotify when available), by default 'auto'
+    poll_interval : float, optional
+        seconds between directory scans in poll mode, by default 2.0
+    settle : float, optional
+        seconds a file must be unchanged before it is reported in poll mode, by default 2.0
+    rescan_interval : float, optional
+        seconds between full rescans, by default 300.0
+    """
+
+    def __init__(self, dcmPath: str, mode: str='auto', poll_interval: float=2.0, settle: float=2.0, rescan_interval: float=300.0):
+        self.dcmPath = dcmPath
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.rescan_interval = rescan_interval
+
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._pending = {}
+        self._dirMtimes = {}
+        self._lastScan = 0.0
+        self._lastRescan = 0.0
+        self._fd = None
+        self._libc = None
+        self._wds = {}
+
+        if mode in ['auto','inotify']:
+            self._libc = _load_inotify()
+            if self._libc is not None:
+                fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+                if fd >= 0:
+                    self._fd = fd
+            if self._fd is None and mode == 'inotify':
+                raise OSError('inotify is not available on this system')
+        elif mode != 'poll':
+            raise ValueError(f"unknown watch mode {mode}, expected auto, inotify or poll")
+
+        self.mode = 'inotify' if self._fd is not None else 'poll'
+        if self._fd is not None:
+            self._pending.update((p, None) for p in self._add_watch_tree(self.dcmPath))
+
+
+    def close(self):
+        """
+        Release the inotify file descriptor.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._wds = {}
+
+
+    def forget(self, ls_files: list):
+        """
+        Forget files that were handled (moved or removed) so the seen set does not grow without bound.
+        A forgotten file that still exists is reported again on the next scan. Thread safe.
+
+        Parameters
+        ----------
+        ls_files : list
+            fullpaths of previously reported files
+        """
+        with self._lock:
+            self._seen.difference_update(ls_files)
+
+
+    def poll(self, timeout: float=1.0) -> list:
+        """
+        Wait up to `timeout` seconds and return the files that became complete.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait, by default 1.0
+
+        Returns
+        -------
+        list
+            fullpaths of newly completed files
+        """
+        ls_new = []
+        if self._fd is not None:
+            ls_new.extend(self._read_events(timeout))
+            if self._pending:
+                ls_new.extend(self._check_pending())
+        else:
+            wait = self._lastScan + self.poll_interval - time.time()
+            if wait > 0:
+                time.sleep(min(wait,timeout))
+            if time.time() - self._lastScan >= self.poll_interval:
+                ls_new.extend(self._scan(full=False))
+
+        if time.time() - self._lastRescan >= self.rescan_interval:
+            ls_new.extend(self._scan(full=True))
+            self._lastRescan = time.time()
+
+        return ls_new
+
+
+    def _report(self, path: str) -> bool:
+        """
+        Mark a file as seen, returning False if it was already reported.
+        """
+        with self._lock:
+            if path in self._seen:
+                return False
+            self._seen.add(path)
+            return True
+
+
+    def _add_watch_tree(self, d: str) -> list:
+        """
+        Watch a directory and all of its sub-directories, returning the files already inside of them.
+        Files created before the watch was in place would otherwise never generate an event.
+        """
+        ls_files = []
+        ls_dirs = [d]
+        while ls_dirs:
+            d = ls_dirs.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), _WATCH_MASK)
+            if wd >= 0:
+                self._wds[wd] = d
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            ls_dirs.append(e.path)
+                        elif e.is_file(follow_symlinks=False):
+                            ls_files.append(e.path)
+            except OSError:
+                pass
+        return ls_files
+
+
+    def _read_events(self, timeout: float) -> list:
+        """
+        Read pending inotify events and return newly completed files.
+        """
+        ls_new = []
+        r, _, _ = select.select([self._fd],[],[],timeout)
+        if not r:
+            return ls_new
+
+        try:
+            buf = os.read(self._fd, 1 << 16)
+        except OSError as e:
+            if e.errno in [errno.EAGAIN, errno.EINTR]:
+                return ls_new
+            raise
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            name = buf[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + length
+
+            if mask & _IN_Q_OVERFLOW:
+                ls_new.extend(self._scan(full=True))
+                continue
+            if mask & _IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+            if not wd in self._wds.keys() or not name:
+                continue
+
+            path = os.path.join(self._wds[wd], os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    for p in self._add_watch_tree(path):
+                        self._pending.setdefault(p, None)
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                if self._report(path):
+                    ls_new.append(path)
+
+        return ls_new
+
+
+    def _scan(self, full: bool) -> list:
+        """
+        Scan the drop folder with os.scandir and return newly completed files.
+
+        Directories whose modification time has not changed since the previous scan are not listed
+        again unless `full` is set, since creating or renaming a file updates its directory's mtime.
+        Files that were still changing on the previous scan are re-checked regardless.
+        """
+        now = time.time()
+        d_dirMtimes = {}
+        ls_dirs = [self.dcmPath]
+        while ls_dirs:
+            d = ls_dirs.pop()
+            try:
+                dirStat = os.stat(d)
+            except OSError:
+                continue
+            d_dirMtimes[d] = dirStat.st_mtime
+            listFiles = full or self._dirMtimes.get(d) != dirStat.st_mtime
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            ls_dirs.append(e.path)
+                            if self._fd is not None and full and not e.path in self._wds.values():
+                                for p in self._add_watch_tree(e.path):
+                                    self._pending.setdefault(p, None)
+                        elif listFiles and e.is_file(follow_symlinks=False) and not e.path in self._seen:
+                            self._pending.setdefault(e.path, None)
+            except OSError:
+                continue
+
+        self._dirMtimes = d_dirMtimes
+        self._lastScan = now
+        return self._check_pending()
+
+
+    def _check_pending(self) -> list:
+        """
+        Report pending files that have settled. In poll mode the size and mtime must also be unchanged
+        since the previous check; in inotify mode files that are still open are reported by IN_CLOSE_WRITE.
+        """
+        ls_new = []
+        now = time.time()
+        for path, prevStat in list(self._pending.items()):
+            try:
+                s = os.stat(path)
+            except OSError:
+                self._pending.pop(path)
+                continue
+            curStat = (s.st_size, s.st_mtime)
+            if (self._fd is not None or curStat == prevStat) and now - s.st_mtime >= self.settle:
+                self._pending.pop(path)
+                if self._report(path):
+                    ls_new.append(path)
+            else:
+                self._pending[path] = curStat
+
+        return ls_new
+
+
+
+# ******************* STAGING ********************
+def _existing_parent(path: str) -> str:
+    """
+    Nearest existing ancestor of path (path itself if it exists).
+    """
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def same_filesystem(src: str, destDir: str) -> bool:
+    """
+    Check if a file and a (possibly not yet created) directory are on the same filesystem.
+
+    Parameters
+    ----------
+    src : str
+        fullpath to an existing file
+    destDir : str
+        fullpath to the destination directory
+
+    Returns
+    -------
+    bool
+        True if both are on the same device, i.e. os.link and os.rename can be used
+    """
+    try:
+        return os.stat(src).st_dev == os.stat(_existing_parent(destDir)).st_dev
+    except OSError:
+        return False
+
+
+def _copy_checksummed(src: str, dest: str, chunk_size: int=1 << 20):
+    """
+    Copy a file, computing its sha1 while reading, then re-read the copy and compare checksums.
+
+    Raises
+    ------
+    OSError
+        the copy does not match the source
+    """
+    h_src = hashlib.sha1()
+    with open(src,'rb') as fsrc, open(dest,'wb') as fdest:
+        for chunk in iter(lambda: fsrc.read(chunk_size), b''):
+            h_src.update(chunk)
+            fdest.write(chunk)
+        fdest.flush()
+        os.fsync(fdest.fileno())
+    shutil.copystat(src,dest)
+
+    h_dest = hashlib.sha1()
+    with open(dest,'rb') as fdest:
+        for chunk in iter(lambda: fdest.read(chunk_size), b''):
+            h_dest.update(chunk)
+    if h_src.digest() != h_dest.digest():
+        raise OSError(errno.EIO, f"checksum mismatch copying {src}", dest)
+
+
+def _fsync_dir(d: str):
+    """
+    Flush a directory's entries to disk.
+    """
+    fd = os.open(d, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _pid_alive(pid: int) -> bool:
+    """
+    Check if a process with this id exists on this host.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_stale_partials(destDir: str, max_age: float=STALE_PARTIAL_AGE):
+    """
+    Remove the partial staging directories of destDir left behind by processes that no longer exist.
+
+    Partial directories are named .<name>.partial-<host>-<pid>. A directory created on this host is
+    removed once its process is gone, one created on another host (shared filesystem) once it has not
+    been modified for `max_age` seconds. Partial directories of live workers are never touched.
+    """
+    from glob import glob
+
+    host = socket.gethostname()
+    for stale in glob(os.path.join(os.path.dirname(destDir), '.' + os.path.basename(destDir) + '.partial-*')):
+        owner = stale.rsplit('.partial-', 1)[1]
+        ownerHost, _, pid = owner.rpartition('-')
+        try:
+            if not pid.isdigit():
+                continue
+            if ownerHost in ['', host]:
+                if int(pid) != os.getpid() and _pid_alive(int(pid)):
+                    continue
+            elif time.time() - os.stat(stale).st_mtime < max_age:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def stage_files(ls_files: list, destDir: str, mode: str='auto', batch_size: int=64) -> tuple:
+    """
+    Stage a series of files into destDir without ever exposing a partially written series.
+
+    Files are first placed in a hidden sibling directory (.<name>.partial-<host>-<pid>) which is renamed to
+    destDir once every file is in place, so after a crash destDir either holds the whole series or does
+    not exist; partial directories left by a process that no longer exists are removed the next time the
+    series is staged, while those of workers still staging the series are left alone. When destDir
+    already exists (files that arrived after the series was staged), each file is renamed into it
+    individually, which is atomic per file. Source files are never removed, see the caller.
+
+    Modes:
+        link: hard link each file (same filesystem only, no data is copied)
+        move: os.rename each file directly into destDir (same filesystem only, atomic per file)
+        copy: sha1-checksummed copy, fsync'd in batches of `batch_size` files
+        auto: link when source and destination share a filesystem (move if hard links are not permitted), otherwise copy
+
+    File names have spaces replaced by underscores.
+
+    Parameters
+    ----------
+    ls_files : list
+        fullpaths of the source files
+    destDir : str
+        fullpath to the destination directory
+    mode : str, optional
+        'auto', 'link', 'move' or 'copy', by default 'auto'
+    batch_size : int, optional
+        number of copied files between directory fsyncs, by default 64
+
+    Returns
+    -------
+    tuple
+        (list of destination fullpaths, mode used)
+    """
+    if not ls_files:
+        return [], mode
+    if not mode in ['auto','link','move','copy']:
+        raise ValueError(f"unknown staging mode {mode}, expected auto, link, move or copy")
+    if mode == 'auto':
+        mode = 'link' if same_filesystem(ls_files[0], destDir) else 'copy'
+
+    #move is only atomic per file, it cannot be undone by discarding a partial directory
+    if mode == 'move':
+        if not os.path.isdir(destDir):
+            os.makedirs(destDir)
+        ls_dest = []
+        for src in ls_files:
+            dest = os.path.join(destDir, os.path.basename(src).replace(' ','_'))
+            os.rename(src, dest)
+            ls_dest.append(dest)
+        _fsync_dir(destDir)
+        return ls_dest, mode
+
+    parentDir = os.path.dirname(destDir)
+    if not os.path.isdir(parentDir):
+        os.makedirs(parentDir)
+    _remove_stale_partials(destDir)
+    partialDir = os.path.join(parentDir, '.' + os.path.basename(destDir) + f".partial-{socket.gethostname()}-{os.getpid()}")
+    os.makedirs(partialDir)
+
+    try:
+        ls_names = []
+        for i, src in enumerate(ls_files):
+            name = os.path.basename(src).replace(' ','_')
+            dest = os.path.join(partialDir, name)
+            if mode == 'link':
+                try:
+                    os.link(src, dest)
+                except OSError as e:
+                    if not e.errno in [errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP] or ls_names:
+                        raise
+                    #hard links not permitted here, fall back for the whole series
+                    shutil.rmtree(partialDir, ignore_errors=True)
+                    return stage_files(ls_files, destDir, mode='move' if e.errno != errno.EXDEV else 'copy', batch_size=batch_size)
+            else:
+                _copy_checksummed(src, dest)
+                if (i + 1) % batch_size == 0:
+                    _fsync_dir(partialDir)
+            ls_names.append(name)
+        _fsync_dir(partialDir)
+
+        #publish the series
+        if not os.path.isdir(destDir):
+            try:
+                os.rename(partialDir, destDir)
+                _fsync_dir(parentDir)
+                return [os.path.join(destDir, n) for n in ls_names], mode
+            except OSError as e:
+                if not e.errno in [errno.EEXIST, errno.ENOTEMPTY]:
+                    raise
+        for name in ls_names:
+            os.rename(os.path.join(partialDir, name), os.path.join(destDir, name))
+        _fsync_dir(destDir)
+        return [os.path.join(destDir, n) for n in ls_names], mode
+
+    finally:
+        if os.path.isdir(partialDir):
+            shutil.rmtree(partialDir, ignore_errors=True)
+
+
+
+# ******************* SERIES ARRIVAL STATE ********************
+class SeriesTracker:
+    """
+    Track file arrivals per series and declare a series complete once no new file has arrived for
+    its patient's quiet period.
+
+    Parameters
+    ----------
+    quiet_period : float, optional
+        default number of seconds without a new file before a series is complete, by default 30.0
+    d_quietPeriods : dict, optional
+        quiet period overrides keyed by patient (PatientName family name) or project, by default None
+    """
+
+    def __init__(self, quiet_period: float=30.0, d_quietPeriods: dict=None):
+        self.quiet_period = quiet_period
+        self.d_quietPeriods = d_quietPeriods if d_quietPeriods else {}
+        self._d_series = {}
+        self._d_patients = {}
+
+
+    def get_quiet_period(self, patient: str, project: str=None) -> float:
+        """
+        Quiet period for a patient, falling back to the project and then the default.
+        """
+        if patient in self.d_quietPeriods.keys():
+            return float(self.d_quietPeriods[patient])
+        if project in self.d_quietPeriods.keys():
+            return float(self.d_quietPeriods[project])
+        return self.quiet_period
+
+
+    def update(self, seriesUID: str, patient: str, project: str=None, n: int=1):
+        """
+        Record the arrival of `n` files for a series.
+
+        Parameters
+        ----------
+        seriesUID : str
+            SeriesInstanceUID
+        patient : str
+            patient identifier (PatientName family name)
+        project : str, optional
+            project identifier used for quiet period overrides, by default None
+        n : int, optional
+            number of files that arrived, by default 1
+        """
+        now = time.time()
+        if not seriesUID in self._d_series.keys():
+            self._d_series[seriesUID] = {'patient': patient,
+                                         'project': project,
+                                         'nFiles': 0,
+                                         'first': now,
+                                         'last': now,
+                                         'quiet_period': self.get_quiet_period(patient, project)}
+        self._d_series[seriesUID]['nFiles'] += n
+        self._d_series[seriesUID]['last'] = now
+        self._d_patients[patient] = now
+
+
+    def complete(self) -> list:
+        """
+        Return and stop tracking the series whose quiet period has elapsed.
+
+        Returns
+        -------
+        list
+            (seriesUID, arrival state dict) tuples
+        """
+        now = time.time()
+        ls_complete = [(k, v) for k, v in self._d_series.items() if now - v['last'] >= v['quiet_period']]
+        for k, _ in ls_complete:
+            self._d_series.pop(k)
+        return ls_complete
+
+
+    def has_patient(self, patient: str) -> bool:
+        """
+        Check if any series of a patient is still receiving files.
+        """
+        return any(v['patient'] == patient for v in self._d_series.values())
+
+
+    def patient_idle(self, patient: str) -> float:
+        """
+        Seconds since the last file of any series of a patient arrived, None if no file was seen.
+        """
+        if not patient in self._d_patients.keys():
+            return None
+        return time.time() - self._d_patients[patient]
+
+
+    def forget_patient(self, patient: str):
+        """
+        Stop tracking the arrival time of a finalized patient.
+        """
+        self._d_patients.pop(patient, None)
+
+
+    def __len__(self):
+        return len(self._d_series)
+
+
+
+# ******************* CONVERSION WORKER POOL ********************
+class WorkerPool:
+    """
+    Process pool with a bounded queue for the PACS conversion pipeline.
+
+    submit() blocks once `max_workers + queue_size` tasks are queued or running, so a large session
+    cannot pile up unbounded work. Each task runs in its own process, which keeps the global
+    st.creds/st.subject state of one project from leaking into another and lets dcm2niix and the BIDS
+    stage of several series run on separate cores. A task that raises, or a worker process that dies,
+    only fails that task's future; a broken pool is replaced on the next submit().
+
+    Tasks that return a dict containing 'd_timing' ({stage: seconds}) are accumulated into per-stage
+    timing statistics, see stats().
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        number of worker processes, by default half of the available cores
+    queue_size : int, optional
+        number of tasks that may wait for a free worker, by default 2 * max_workers
+    """
+
+    def __init__(self, max_workers: int=None, queue_size: int=None):
+        self.max_workers = max_workers if max_workers else max(1, (os.cpu_count() or 2) // 2)
+        self.queue_size = queue_size if queue_size is not None else 2 * self.max_workers
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._d_stats = {}
+        self._nFailed = 0
+        self._executor = None
+        self._new_executor()
+
+
+    def _new_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs), blocking while the queue is full.
+
+        Parameters
+        ----------
+        fn : callable
+            module-level function to run in a worker process
+
+        Returns
+        -------
+        concurrent.futures.Future
+            future of the task
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        self._slots.acquire()
+        try:
+            try:
+                future = self._executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False)
+                self._new_executor()
+                future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+
+    def _done(self, future):
+        """
+        Release the queue slot of a finished task and record its stage timing.
+        """
+        self._slots.release()
+        try:
+            result = future.result()
+        except BaseException:
+            with self._lock:
+                self._nFailed += 1
+            return
+
+        if isinstance(result, dict):
+            with self._lock:
+                if result.get('error'):
+                    self._nFailed += 1
+                for stage, seconds in result.get('d_timing', {}).items():
+                    d = self._d_stats.setdefault(stage, {'n': 0, 'total': 0.0, 'max': 0.0})
+                    d['n'] += 1
+                    d['total'] += seconds
+                    d['max'] = max(d['max'], seconds)
+
+
+    def stats(self) -> dict:
+        """
+        Per-stage timing of the finished tasks.
+
+        Returns
+        -------
+        dict
+            {stage: {'n', 'total', 'mean', 'max'}} in seconds, plus 'failed': number of failed tasks
+        """
+        with self._lock:
+            d_stats = {k: dict(v, mean=v['total'] / v['n']) for k, v in self._d_stats.items()}
+            d_stats['failed'] = self._nFailed
+        return d_stats
+
+
+    def shutdown(self, wait: bool=True):
+        """
+        Stop the worker processes.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+
+# ******************* INGEST JOURNAL ********************
+#series stages in processing order, each is recorded once it has finished
+SERIES_STATES = ['complete','staged','converted','bids','catalogued','done']
+
+_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    series_uid TEXT,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_series ON files (series_uid);
+CREATE TABLE IF NOT EXISTS series (
+    series_uid TEXT PRIMARY KEY,
+    patient TEXT,
+    project TEXT,
+    dcmDir TEXT,
+    n_files INTEGER,
+    state TEXT NOT NULL,
+    error TEXT,
+    info TEXT,
+    outputs TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_series_state ON series (state);
+CREATE TABLE IF NOT EXISTS patients (
+    patient TEXT PRIMARY KEY,
+    project TEXT,
+    sourcedataDir TEXT,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    series_uid TEXT,
+    state TEXT NOT NULL,
+    seconds REAL,
+    n_files INTEGER,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_time ON events (time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+
+class IngestJournal:
+    """
+    Durable record of the PACS ingest: the state of every file and series, the patients waiting to be
+    finalized, and a log of series state transitions (with the time spent in each stage).
+
+    The journal is a local SQLite database in WAL mode, so it can be written by the daemon and its
+    worker processes at the same time. Each process opens its own connection on first use, so the
+    object can be passed to WorkerPool tasks.
+
+    File states: seen (routed to a series), staged (in sourcedata), removed (deleted from the drop folder), rejected (unroutable).
+    Series states: see SERIES_STATES; a series with an error stopped after its recorded state.
+
+    Parameters
+    ----------
+    journalFile : str
+        fullpath to the SQLite journal, created if it does not exist
+    """
+
+    def __init__(self, journalFile: str):
+        self.journalFile = journalFile
+        self._conn = None
+        self._pid = None
+        if not os.path.isdir(os.path.dirname(journalFile)):
+            os.makedirs(os.path.dirname(journalFile))
+        self._connect().executescript(_JOURNAL_SCHEMA)
+
+
+    def __getstate__(self):
+        return {'journalFile': self.journalFile, '_conn': None, '_pid': None}
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connection for the current process, opened on first use.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.journalFile, timeout=60, isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+
+    def _write(self, sqlCMD: str, values=(), many: bool=False):
+        """
+        Execute a write statement in its own transaction.
+        """
+        sqlConnection = self._connect()
+        with sqlConnection:
+            if many:
+                sqlConnection.executemany(sqlCMD, values)
+            else:
+                sqlConnection.execute(sqlCMD, values)
+
+
+    # files
+    def set_file_states(self, ls_files: list, state: str, seriesUID: str=None):
+        """
+        Record the state of one or more drop folder files.
+
+        Parameters
+        ----------
+        ls_files : list
+            fullpaths of the files
+        state : str
+            seen, staged, removed or rejected
+        seriesUID : str, optional
+            SeriesInstanceUID of the files, by default None (unchanged)
+        """
+        now = time.time()
+        self._write("INSERT INTO files (path, series_uid, state, updated) VALUES (?,?,?,?) "
+                    "ON CONFLICT(path) DO UPDATE SET state=excluded.state, updated=excluded.updated, series_uid=COALESCE(excluded.series_uid, files.series_uid)",
+                    [(f, seriesUID, state, now) for f in ls_files], many=True)
+
+
+    def get_file_states(self, ls_files: list) -> dict:
+        """
+        Recorded state of drop folder files.
+
+        Returns
+        -------
+        dict
+            {fullpath: state} for the files found in the journal
+        """
+        d_states = {}
+        sqlConnection = self._connect()
+        for i in range(0, len(ls_files), 500):
+            batch = ls_files[i:i+500]
+            sqlCMD = f"SELECT path, state FROM files WHERE path IN ({','.join('?' * len(batch))})"
+            d_states.update(sqlConnection.execute(sqlCMD, batch).fetchall())
+        return d_states
+
+
+    # series
+    def start_series(self, seriesUID: str, d_info: dict):
+        """
+        Record a complete series that is about to be processed, resetting any previous state (e.g. a
+        series that received more files after it was processed).
+
+        Parameters
+        ----------
+        seriesUID : str
+            SeriesInstanceUID
+        d_info : dict
+            JSON serializable series information, including family_name, project, dcmDir and ls_files
+        """
+        now = time.time()
+        self._write("INSERT INTO series (series_uid, patient, project, dcmDir, n_files, state, error, info, outputs, created, updated) VALUES (?,?,?,?,?,'complete',NULL,?,NULL,?,?) "
+                    "ON CONFLICT(series_uid) DO UPDATE SET n_files=excluded.n_files, state='complete', error=NULL, info=excluded.info, outputs=NULL, updated=excluded.updated",
+                    (seriesUID, d_info.get('family_name'), d_info.get('project'), d_info.get('dcmDir'), len(d_info.get('ls_files', [])), json.dumps(d_info), now, now))
+        self._write("INSERT INTO events (series_uid, state, seconds, n_files, time) VALUES (?,'complete',NULL,?,?)",
+                    (seriesUID, len(d_info.get('ls_files', [])), now))
+        self._write("INSERT INTO patients (patient, project, sourcedataDir, state, updated) VALUES (?,?,?,'open',?) "
+                    "ON CONFLICT(patient) DO UPDATE SET state='open', updated=excluded.updated",
+                    (d_info.get('family_name'), d_info.get('project'), os.path.dirname(d_info.get('dcmDir', '')), now))
+
+
+    def set_series_state(self, seriesUID: str, state: str, seconds: float=None, outputs: list=None, error: str=None):
+        """
+        Record that a series finished a stage (or failed after its last recorded stage when error is set).
+
+        Parameters
+        ----------
+        seriesUID : str
+            SeriesInstanceUID
+        state : str
+            one of SERIES_STATES
+        seconds : float, optional
+            time spent in the stage, by default None
+        outputs : list, optional
+            rawdata files created for the series, by default None (unchanged)
+        error : str, optional
+            error message, by default None
+        """
+        now = time.time()
+        self._write("UPDATE series SET state=?, error=?, outputs=COALESCE(?, outputs), updated=? WHERE series_uid=?",
+                    (state, error, json.dumps(outputs) if outputs is not None else None, now, seriesUID))
+        self._write("INSERT INTO events (series_uid, state, seconds, n_files, time) VALUES (?,?,?,(SELECT n_files FROM series WHERE series_uid=?),?)",
+                    (seriesUID, 'failed' if error else state, seconds, seriesUID, now))
+
+
+    def get_series(self, seriesUID: str) -> dict:
+        """
+        Recorded state of a series.
+
+        Returns
+        -------
+        dict
+            series row with info/outputs decoded, or None if the series is not in the journal
+        """
+        sqlConnection = self._connect()
+        sqlConnection.row_factory = sqlite3.Row
+        try:
+            row = sqlConnection.execute("SELECT * FROM series WHERE series_uid=?", (seriesUID,)).fetchone()
+        finally:
+            sqlConnection.row_factory = None
+        if row is None:
+            return None
+        d = dict(row)
+        d['info'] = json.loads(d['info']) if d['info'] else {}
+        d['outputs'] = json.loads(d['outputs']) if d['outputs'] else []
+        return d
+
+
+    def unfinished_series(self, include_failed: bool=False) -> list:
+        """
+        Series that were not fully processed, e.g. because the daemon stopped.
+
+        Parameters
+        ----------
+        include_failed : bool, optional
+            include series that stopped with an error, by default False
+
+        Returns
+        -------
+        list
+            (seriesUID, series information dict) tuples in the order they completed
+        """
+        sqlCMD = "SELECT series_uid, info FROM series WHERE state != 'done'"
+        if not include_failed:
+            sqlCMD += " AND error IS NULL"
+        sqlCMD += " ORDER BY created"
+        return [(uid, json.loads(info) if info else {}) for uid, info in self._connect().execute(sqlCMD).fetchall()]
+
+
+    # patients
+    def finalize_patient(self, patient: str):
+        """
+        Record that a patient was removed from the PACS and its transfer evaluated.
+        """
+        self._write("UPDATE patients SET state='finalized', updated=? WHERE patient=?", (time.time(), patient))
+
+
+    def open_patients(self) -> dict:
+        """
+        Patients with processed series that were not finalized.
+
+        Returns
+        -------
+        dict
+            {patient: {'project', 'sourcedataDir'}}
+        """
+        rows = self._connect().execute("SELECT patient, project, sourcedataDir FROM patients WHERE state='open'").fetchall()
+        return {r[0]: {'project': r[1], 'sourcedataDir': r[2]} for r in rows}
+
+
+    # key/value
+    def get_meta(self, key: str, default=None):
+        """
+        Stored value of a key (JSON decoded), e.g. the Orthanc /changes sequence number.
+        """
+        row = self._connect().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+
+    def set_meta(self, key: str, value):
+        """
+        Store a JSON serializable value under a key.
+        """
+        self._write("INSERT INTO meta (key, value, updated) VALUES (?,?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated=excluded.updated",
+                    (key, json.dumps(value), time.time()))
+
+
+    # metrics
+    def metrics(self, window: float=3600.0) -> dict:
+        """
+        Throughput and backlog of the ingest.
+
+        Parameters
+        ----------
+        window : float, optional
+            number of seconds to compute throughput over, by default 3600.0
+
+        Returns
+        -------
+        dict
+            {'window': seconds,
+             'series_done': series finished in the window,
+             'files_done': files in those series,
+             'files_per_hour': file throughput,
+             'series_failed': series that failed in the window,
+             'backlog': {state: number of unfinished series stopped after that stage, 'failed': total series with an error},
+             'files_pending': drop folder files seen but not staged,
+             'patients_open': patients not yet finalized,
+             'stage_seconds': {stage: {'n', 'mean', 'max'}} over the window, 'done' being the total per series}
+        """
+        sqlConnection = self._connect()
+        since = time.time() - window
+        nSeries, nFiles = sqlConnection.execute("SELECT COUNT(*), COALESCE(SUM(n_files),0) FROM events WHERE state='done' AND time >= ?", (since,)).fetchone()
+        nFailed = sqlConnection.execute("SELECT COUNT(*) FROM events WHERE state='failed' AND time >= ?", (since,)).fetchone()[0]
+        d_backlog = dict(sqlConnection.execute("SELECT state, COUNT(*) FROM series WHERE state != 'done' AND error IS NULL GROUP BY state").fetchall())
+        d_backlog['failed'] = sqlConnection.execute("SELECT COUNT(*) FROM series WHERE error IS NOT NULL").fetchone()[0]
+        d_stages = {r[0]: {'n': r[1], 'mean': r[2], 'max': r[3]} for r in sqlConnection.execute(
+            "SELECT state, COUNT(*), AVG(seconds), MAX(seconds) FROM events WHERE seconds IS NOT NULL AND state != 'failed' AND time >= ? GROUP BY state", (since,)).fetchall()}
+        return {'window': window,
+                'series_done': nSeries,
+                'files_done': nFiles,
+                'files_per_hour': nFiles * 3600.0 / window if window else None,
+                'series_failed': nFailed,
+                'backlog': d_backlog,
+                'files_pending': sqlConnection.execute("SELECT COUNT(*) FROM files WHERE state='seen'").fetchone()[0],
+                'patients_open': sqlConnection.execute("SELECT COUNT(*) FROM patients WHERE state='open'").fetchone()[0],
+                'stage_seconds': d_stages}
@@ -4,11 +4,22 @@
 # Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
 # Created on 1 October 2025
 #
-# Modified on 
+# Modified on 18 Oct 2026 - write output images under a temporary name and rename them into place
+# Modified on 18 Oct 2026 - --batch-size renamed --claim-size: requests are claimed in groups but each image is extracted on its own
+# Modified on 18 Oct 2026 - keep the brain-extraction networks (architecture and weights) resident in each server process
+# Modified on 18 Oct 2026 - resident BET server: unix socket and/or spool queue, CPU batches, intra/inter-op threads, per-image latency
+# Modified on 18 Oct 2026 - --queue mode: a pool of long-lived workers consumes brain-extraction requests from a spool queue
 
 import os
 import sys
+import json
+import time
+import queue
+import signal
+import socket
 import argparse
+import threading
+from collections import deque
 import ants
 import antspynet
 import traceback
@@ -18,38 +29,421 @@ sys.path.append(REALPATH)
 
 
 #versioning
-VERSION = '1.0.0'
-DATE = '1 October 2025'
+VERSION = '1.2.3'
+DATE = '18 Oct 2026'
 
 # 
 
 #input argument parser
 parser = argparse.ArgumentParser('Performs antspynet.brain_extraction (runs in docker wsuconnect/neuro image).')
-parser.add_argument('-i','--input', required=True,action='store', dest="INPUT", help="input directories to copy", default=None)
-parser.add_argument('-o','--output', required=True,action='store', dest="OUTPUT", help="input directories to copy", default=None)
-   
+parser.add_argument('-i','--input', action='store', dest="INPUT", help="fullpath to the input NIfTI image", default=None)
+parser.add_argument('-o','--output', action='store', dest="OUTPUT", help="fullpath to the output brain-extracted NIfTI image", default=None)
+parser.add_argument('--queue', action='store', dest="QUEUE", help="instead of a single image, serve brain-extraction requests from this spool queue (name under $CONNECT_SPOOL_DIR or fullpath), e.g. bet", default=None)
+parser.add_argument('--socket', action='store', dest="SOCKET", help="instead of a single image, serve synchronous brain-extraction requests on this unix socket (see support_tools.spool.BET_SOCKET)", default=None)
+parser.add_argument('-n','--workers', action='store', type=int, dest="WORKERS", help="number of server processes, only the first listens on --socket (default 1)", default=1)
+parser.add_argument('--claim-size','--batch-size', action='store', type=int, dest="CLAIM_SIZE", help="number of requests collected from the socket or claimed from the spool queue at a time (default 4). Each image is still brain-extracted on its own, antspynet.brain_extraction preprocesses and predicts one image per call. --batch-size is the old name of this option", default=4)
+parser.add_argument('--intra-op-threads', action='store', type=int, dest="INTRA_OP", help="TensorFlow intra-op threads per server process (default: TensorFlow's choice)", default=None)
+parser.add_argument('--inter-op-threads', action='store', type=int, dest="INTER_OP", help="TensorFlow inter-op threads per server process (default: TensorFlow's choice)", default=None)
+parser.add_argument('--poll-interval', action='store', type=float, dest="POLL_INTERVAL", help="seconds between checks of an empty queue (default 5)", default=5.0)
+parser.add_argument('--stats-interval', action='store', type=int, dest="STATS_INTERVAL", help="print latency statistics every N images (default 20)", default=20)
+parser.add_argument('--drain', action='store_true', dest="DRAIN", help="exit once the queue is empty instead of waiting for new requests (--queue without --socket)", default=False)
 
 
-# *******************  MAIN  ********************    
-def run_antspynet_bet(input: str, output: str): 
+
+def _write_image(img, filename: str):
+    """
+    Write an ANTs image to a temporary file in the same directory and rename it to filename.
+    """
+    tmpFile = os.path.join(os.path.dirname(filename), '.tmp-' + str(os.getpid()) + '-' + os.path.basename(filename))
+    try:
+        img.to_file(tmpFile)
+        os.replace(tmpFile, filename)
+    finally:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
+
+# *******************  MAIN  ********************
+def run_antspynet_bet(input: str, output: str=None, modality: str='t1', seg: str=None) -> bool:
     """
-    Applies an fMRIprep-generated brainmask to preprocessed T1w image.
+    Performs antspynet brain extraction and writes the brain-extracted image and/or the brain probability image.
+    Each image is written under a temporary name and renamed into place, so a reader never sees a partial file.
 
-    :param INDIR: fullpath to input (source) directory(ies)
-    :type INDIR: str
+    :param input: fullpath to the input NIfTI image
+    :type input: str
 
-    :raises Exception: generic error from attenpted deletion
-    """    
+    :param output: fullpath to the output brain-extracted NIfTI image, defaults to None
+    :type output: str, optional
+
+    :param modality: antspynet.brain_extraction modality, defaults to 't1'
+    :type modality: str, optional
+
+    :param seg: fullpath to the output brain probability NIfTI image, defaults to None
+    :type seg: str, optional
+
+    :return: True if the requested images were written
+    :rtype: bool
+    """
     try:
         inImg = ants.image_read(input)
-        brainSeg = antspynet.brain_extraction(inImg, modality="t1", verbose=True)
-        # ants.image_write(brainSeg, output)
-        brain = inImg * brainSeg
-        brain.to_file(output)
+        brainSeg = antspynet.brain_extraction(inImg, modality=modality, verbose=True)
+        if seg:
+            _write_image(brainSeg, seg)
+        if output:
+            brain = inImg * brainSeg
+            _write_image(brain, output)
         print("\tBrain Extraction completed sucessfully")
+        return True
     except Exception as e:
         print('ERROR: brain extraction')
         traceback.print_exc()
+        return False
+
+
+def configure_threads(intra_op: int=None, inter_op: int=None):
+    """
+    Set TensorFlow's intra-op and inter-op thread pools. Must be called before the first brain extraction in a process.
+
+    :param intra_op: threads used within a single operation, defaults to None (unchanged)
+    :type intra_op: int, optional
+
+    :param inter_op: operations run in parallel, defaults to None (unchanged)
+    :type inter_op: int, optional
+    """
+    import tensorflow as tf
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def keep_models_resident() -> int:
+    """
+    Make antspynet.brain_extraction reuse its networks. brain_extraction builds the U-net and loads its
+    weights on every call; the model factories it uses are replaced with caching versions that build each
+    architecture once per process and only reload weights when a different weights file is requested.
+    Called once by every BET server process.
+
+    :return: number of model factories made resident (0 if this antspynet version could not be patched)
+    :rtype: int
+    """
+    #brain_extraction imports the factories either at module level or from antspynet.architectures when called
+    ls_modules = [m for m in [sys.modules.get(getattr(antspynet.brain_extraction,'__module__','')),sys.modules.get('antspynet.architectures')] if m is not None]
+
+    def caching_factory(factory):
+        d_models = {}
+
+        def create(*args, **kwargs):
+            key = repr((args,sorted(kwargs.items())))
+            if key not in d_models:
+                model = factory(*args, **kwargs)
+                loadWeights = model.load_weights
+                d_loaded = {'weights': None}
+
+                def load_weights(filepath, *a, **k):
+                    if d_loaded['weights'] != filepath:
+                        loadWeights(filepath, *a, **k)
+                        d_loaded['weights'] = filepath
+
+                model.load_weights = load_weights
+                d_models[key] = model
+            return d_models[key]
+
+        create._connect_resident = True
+        return create
+
+    d_wrapped = {}
+    for module in ls_modules:
+        for name in dir(module):
+            factory = getattr(module,name)
+            if name.startswith('create_') and 'model' in name and callable(factory) and not getattr(factory,'_connect_resident',False):
+                if factory not in d_wrapped:
+                    d_wrapped[factory] = caching_factory(factory)
+                setattr(module,name,d_wrapped[factory])
+    n = len(d_wrapped)
+    if not n:
+        print('WARNING: cannot keep antspynet models resident, networks are rebuilt for every image')
+    return n
+
+
+# ******************* BET SERVER ********************
+class BetServer:
+    """
+    A resident brain-extraction server. TensorFlow and ANTsPyNet are loaded once, the networks are built
+    and their weights loaded on the first request only (see keep_models_resident), and requests are
+    processed one at a time, in the order they arrive. Requests (dicts with input, output and/or seg,
+    and an optional modality) are accepted from:
+
+    - a unix socket (one JSON line per connection, answered with a JSON line containing ok, error,
+      seconds and wait_seconds once the images are written, see support_tools.spool.socket_request)
+    - a spool queue (see support_tools.spool.SpoolQueue), checked whenever no socket requests are waiting
+
+    Up to claim_size requests are collected from the socket or claimed from the spool queue at once, which
+    saves spool round-trips but does not batch the inference: antspynet.brain_extraction registers,
+    predicts and resamples one image per call.
+
+    :param queueName: spool queue name or fullpath, defaults to None (no spool queue)
+    :type queueName: str, optional
+
+    :param socketPath: fullpath to the unix socket to listen on, defaults to None (no socket)
+    :type socketPath: str, optional
+
+    :param claim_size: number of requests collected or claimed at a time, defaults to 4
+    :type claim_size: int, optional
+
+    :param poll_interval: seconds between checks of an empty spool queue, defaults to 5.0
+    :type poll_interval: float, optional
+
+    :param stats_interval: print latency statistics every N images, defaults to 20
+    :type stats_interval: int, optional
+    """
+
+    def __init__(self, queueName: str=None, socketPath: str=None, claim_size: int=4, poll_interval: float=5.0, stats_interval: int=20):
+        from support_tools.spool import SpoolQueue
+
+        self.spool = SpoolQueue(queueName) if queueName else None
+        self.socketPath = socketPath
+        self.claim_size = max(1,claim_size)
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.latency = deque(maxlen=1000)
+        self.nImages = 0
+        self.nFailed = 0
+        self._jobs = queue.Queue()
+        self._sock = None
+
+
+    # ---- socket requests ----
+    def _listen(self):
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socketPath)
+        os.chmod(self.socketPath,0o770)
+        self._sock.listen(64)
+        threading.Thread(target=self._accept,daemon=True).start()
+
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle,args=(conn,),daemon=True).start()
+
+
+    def _handle(self, conn):
+        """
+        Read one request from a socket connection, queue it and reply when it is done.
+        """
+        with conn:
+            try:
+                buf = b''
+                while not buf.endswith(b'\n'):
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        break
+                    buf += chunk
+                d_request = json.loads(buf)
+            except Exception as e:
+                conn.sendall(json.dumps({'ok': False, 'error': f"bad request: {e}"}).encode() + b'\n')
+                return
+
+            d_job = {'request': d_request, 'received': time.time(), 'done': threading.Event(), 'result': None}
+            self._jobs.put(d_job)
+            d_job['done'].wait()
+            try:
+                conn.sendall(json.dumps(d_job['result']).encode() + b'\n')
+            except OSError:
+                pass
+
+
+    # ---- claims ----
+    def _next_claim(self) -> list:
+        """
+        Collect up to claim_size socket requests (waiting up to poll_interval for the first), or claim up to claim_size from the spool queue.
+        """
+        ls_jobs = []
+        try:
+            ls_jobs.append(self._jobs.get(timeout=self.poll_interval if not self.spool or self.socketPath else 0.01))
+            while len(ls_jobs) < self.claim_size:
+                ls_jobs.append(self._jobs.get_nowait())
+        except queue.Empty:
+            pass
+        if ls_jobs or not self.spool:
+            return ls_jobs
+
+        return [{'request': d, 'received': d.get('queued',time.time()), 'spool': True} for d in self.spool.claim(self.claim_size)]
+
+
+    def _process(self, d_job: dict):
+        d_request = d_job['request']
+        t = time.time()
+        wait = t - d_job['received']
+        error = None
+        try:
+            for f in [d_request.get('output'),d_request.get('seg')]:
+                if f and not os.path.isdir(os.path.dirname(f)):
+                    os.makedirs(os.path.dirname(f))
+            if not (d_request.get('output') or d_request.get('seg')):
+                error = 'request has neither output nor seg'
+            elif not run_antspynet_bet(d_request['input'],d_request.get('output'),d_request.get('modality','t1'),d_request.get('seg')):
+                error = 'brain extraction failed'
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e)
+        seconds = time.time() - t
+
+        self.nImages += 1
+        if error:
+            self.nFailed += 1
+        self.latency.append((seconds,wait))
+        print(f"\t{d_request.get('input')}: {'FAILED ' + error if error else 'done'} in {seconds:.1f} s (waited {wait:.1f} s)")
+
+        if d_job.get('spool'):
+            self.spool.complete(d_request,error=error,seconds=seconds,wait_seconds=wait)
+        else:
+            d_job['result'] = {'ok': error is None, 'error': error, 'seconds': seconds, 'wait_seconds': wait}
+            d_job['done'].set()
+
+        if self.stats_interval and self.nImages % self.stats_interval == 0:
+            self.report()
+
+
+    def stats(self) -> dict:
+        """
+        Latency statistics over the most recent (up to 1000) images.
+
+        :return: images, failed, and mean/p50/p95/max of processing seconds and waiting seconds
+        :rtype: dict
+        """
+        d_stats = {'images': self.nImages, 'failed': self.nFailed}
+        for i, k in enumerate(['seconds','wait_seconds']):
+            ls = sorted(l[i] for l in self.latency)
+            if ls:
+                d_stats[k] = {'mean': sum(ls) / len(ls), 'p50': ls[len(ls) // 2], 'p95': ls[min(len(ls) - 1,int(len(ls) * 0.95))], 'max': ls[-1]}
+        return d_stats
+
+
+    def report(self):
+        """
+        Print latency statistics.
+        """
+        d_stats = self.stats()
+        msg = f"BET server {os.getpid()}: {d_stats['images']} images, {d_stats['failed']} failed"
+        for k in ['seconds','wait_seconds']:
+            if k in d_stats:
+                msg += f"; {k} mean {d_stats[k]['mean']:.1f} p50 {d_stats[k]['p50']:.1f} p95 {d_stats[k]['p95']:.1f} max {d_stats[k]['max']:.1f}"
+        print(msg)
+
+
+    def serve_forever(self, drain: bool=False):
+        """
+        Process requests until interrupted (or, with drain and no socket, until the spool queue is empty).
+
+        :param drain: exit once the spool queue is empty (ignored when listening on a socket), defaults to False
+        :type drain: bool, optional
+        """
+        if self.socketPath:
+            self._listen()
+        try:
+            while True:
+                ls_jobs = self._next_claim()
+                if not ls_jobs:
+                    if drain and not self.socketPath:
+                        return
+                    if self.spool and not self.socketPath:
+                        time.sleep(self.poll_interval)
+                    continue
+                for d_job in ls_jobs:
+                    self._process(d_job)
+        finally:
+            self.close()
+
+
+    def close(self):
+        """
+        Stop listening on the socket and print the final latency statistics.
+        """
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.remove(self.socketPath)
+            except OSError:
+                pass
+        if self.nImages:
+            self.report()
+
+
+def _server_process(queueName: str, socketPath: str, claim_size: int, poll_interval: float, stats_interval: int, intra_op: int, inter_op: int, drain: bool):
+    """
+    Entry point of one server process.
+    """
+    configure_threads(intra_op,inter_op)
+    keep_models_resident()
+    BetServer(queueName,socketPath,claim_size,poll_interval,stats_interval).serve_forever(drain)
+
+
+def serve(queueName: str=None, socketPath: str=None, workers: int=1, claim_size: int=4, intra_op: int=None, inter_op: int=None, poll_interval: float=5.0, stats_interval: int=20, drain: bool=False):
+    """
+    Run a pool of resident BET server processes (see BetServer). The first process listens on socketPath,
+    every process serves the spool queue. Requests left running for over an hour (by a worker that died)
+    are returned to the queue at start-up.
+
+    :param queueName: spool queue name or fullpath, defaults to None
+    :type queueName: str, optional
+
+    :param socketPath: fullpath to the unix socket, defaults to None
+    :type socketPath: str, optional
+
+    :param workers: number of server processes, defaults to 1
+    :type workers: int, optional
+
+    :param claim_size: number of requests collected or claimed at a time by each process, defaults to 4
+    :type claim_size: int, optional
+
+    :param intra_op: TensorFlow intra-op threads per process, defaults to None
+    :type intra_op: int, optional
+
+    :param inter_op: TensorFlow inter-op threads per process, defaults to None
+    :type inter_op: int, optional
+
+    :param poll_interval: seconds between checks of an empty spool queue, defaults to 5.0
+    :type poll_interval: float, optional
+
+    :param stats_interval: print latency statistics every N images, defaults to 20
+    :type stats_interval: int, optional
+
+    :param drain: exit once the spool queue is empty (only without socketPath), defaults to False
+    :type drain: bool, optional
+    """
+    import multiprocessing as mp
+    from support_tools.spool import SpoolQueue
+
+    if queueName:
+        n = SpoolQueue(queueName).requeue_stale()
+        print(f"serving spool queue {SpoolQueue(queueName).spoolDir}, {n} interrupted request(s) requeued")
+    if socketPath:
+        print(f"serving unix socket {socketPath}")
+    workers = max(1,workers) if queueName else 1
+
+    ls_procs = [mp.Process(target=_server_process,args=(queueName,socketPath if i == 0 else None,claim_size,poll_interval,stats_interval,intra_op,inter_op,drain),daemon=True) for i in range(workers)]
+    for p in ls_procs:
+        p.start()
+
+    def stop(signum, frame):
+        for p in ls_procs:
+            p.terminate()
+        sys.exit(0)
+    signal.signal(signal.SIGTERM,stop)
+
+    try:
+        for p in ls_procs:
+            p.join()
+    except KeyboardInterrupt:
+        stop(None,None)
 
 
 if __name__ == '__main__':
@@ -58,4 +452,10 @@ if __name__ == '__main__':
     """
 
     options = parser.parse_args()
-    run_antspynet_bet(options.INPUT, options.OUTPUT)
\ No newline at end of file
+    if options.QUEUE or options.SOCKET:
+        serve(options.QUEUE,options.SOCKET,workers=options.WORKERS,claim_size=options.CLAIM_SIZE,intra_op=options.INTRA_OP,inter_op=options.INTER_OP,
+              poll_interval=options.POLL_INTERVAL,stats_interval=options.STATS_INTERVAL,drain=options.DRAIN)
+    elif options.INPUT and options.OUTPUT:
+        run_antspynet_bet(options.INPUT, options.OUTPUT)
+    else:
+        parser.error('-i/--input and -o/--output are required unless --queue or --socket is given')
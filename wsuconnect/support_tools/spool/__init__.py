@@ -0,0 +1,4 @@
+# __init__.py
+from ._spool import SPOOL_ROOT, SPOOL_STATES, BET_SOCKET, BET_TIMEOUT, SpoolQueue, socket_request
+
+__all__ = ['SPOOL_ROOT','SPOOL_STATES','BET_SOCKET','BET_TIMEOUT','SpoolQueue','socket_request']
\ No newline at end of file
@@ -0,0 +1,254 @@
+# _spool.py
+
+# Copywrite Matthew Sherwood (matt.sherwood@wright.edu, matthew.sherwood.7.ctr@us.af.mil)
+# Created on 18 Oct 2026
+#
+# v1.1.1 on 18 Oct 2026 - BET_TIMEOUT: clients give up on an unresponsive BET server and extract in-process
+# v1.1.0 on 18 Oct 2026 - socket_request: synchronous JSON-line requests to a local service socket (e.g. the BET server)
+# v1.0.0 on 18 Oct 2026 - file-based spool queue for deferred derivative requests (brain extraction)
+
+import os
+import json
+import time
+import uuid
+import socket
+
+
+VERSION = '1.1.1'
+DATE = '18 Oct 2026'
+
+
+#root of all spool queues, each queue is a sub-directory holding one directory per request state
+SPOOL_ROOT = os.environ.get('CONNECT_SPOOL_DIR', os.path.join('/resshare','wsuconnect','spool'))
+SPOOL_STATES = ['pending','running','done','failed']
+
+#unix socket of the resident brain-extraction server (run_antspynet_bet.py --socket)
+BET_SOCKET = os.environ.get('CONNECT_BET_SOCKET', os.path.join('/tmp','connect_bet.sock'))
+#seconds a client waits for the BET server's reply (queueing and extraction) before falling back to in-process extraction
+BET_TIMEOUT = float(os.environ.get('CONNECT_BET_TIMEOUT', 600))
+
+
+class SpoolQueue:
+    """
+    A directory-backed work queue that can be shared by any number of producer and consumer processes
+    (and containers) on the same filesystem.
+
+    Every request is a JSON file. Producers write it to a hidden temporary file and rename it into
+    pending/. Consumers claim a request by renaming it from pending/ to running/, so only one consumer
+    can win. Finished requests are written to done/ or failed/ with their results. Request filenames
+    sort by priority and then by submission time.
+
+    Parameters
+    ----------
+    name : str
+        queue name (sub-directory of spoolRoot), or fullpath to the queue directory
+    spoolRoot : str, optional
+        root directory of all queues, by default SPOOL_ROOT ($CONNECT_SPOOL_DIR or /resshare/wsuconnect/spool)
+    """
+
+    def __init__(self, name: str, spoolRoot: str=None):
+        self.spoolDir = name if os.path.isabs(name) else os.path.join(spoolRoot or SPOOL_ROOT, name)
+        for state in SPOOL_STATES:
+            os.makedirs(os.path.join(self.spoolDir,state), exist_ok=True)
+
+
+    def _path(self, state: str, reqId: str) -> str:
+        return os.path.join(self.spoolDir,state,reqId + '.json')
+
+
+    def _write(self, state: str, d_request: dict):
+        """
+        Atomically write a request file into a state directory.
+        """
+        tmpFile = os.path.join(self.spoolDir,state,f".{d_request['id']}.{os.getpid()}.tmp")
+        with open(tmpFile,'w') as j:
+            json.dump(d_request, j, indent='\t')
+        os.replace(tmpFile,self._path(state,d_request['id']))
+
+
+    def put(self, d_request: dict, priority: int=5) -> str:
+        """
+        Add a request to the queue.
+
+        Parameters
+        ----------
+        d_request : dict
+            JSON-serialisable request
+        priority : int, optional
+            0 (first) to 9 (last), by default 5
+
+        Returns
+        -------
+        str
+            request id
+        """
+        reqId = f"{min(max(int(priority),0),9)}-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        self._write('pending',dict(d_request,id=reqId,queued=time.time()))
+        return reqId
+
+
+    def claim(self, n: int=1) -> list:
+        """
+        Claim up to n pending requests, highest priority and oldest first.
+
+        Parameters
+        ----------
+        n : int, optional
+            maximum number of requests to claim, by default 1
+
+        Returns
+        -------
+        list
+            claimed request dicts
+        """
+        ls_claimed = []
+        pendingDir = os.path.join(self.spoolDir,'pending')
+        for f in sorted(f for f in os.listdir(pendingDir) if f.endswith('.json') and not f.startswith('.')):
+            if len(ls_claimed) >= n:
+                break
+            runningFile = os.path.join(self.spoolDir,'running',f)
+            try:
+                os.rename(os.path.join(pendingDir,f),runningFile)
+            except FileNotFoundError:
+                #claimed by another consumer
+                continue
+            os.utime(runningFile)
+            try:
+                with open(runningFile) as j:
+                    d_request = json.load(j)
+            except ValueError:
+                os.replace(runningFile,os.path.join(self.spoolDir,'failed',f))
+                continue
+            d_request['claimed'] = time.time()
+            d_request['worker'] = os.getpid()
+            ls_claimed.append(d_request)
+        return ls_claimed
+
+
+    def complete(self, d_request: dict, error: str=None, **results):
+        """
+        Record the outcome of a claimed request in done/ (or failed/ if error is given).
+
+        Parameters
+        ----------
+        d_request : dict
+            request returned by claim()
+        error : str, optional
+            error message, by default None (success)
+        **results
+            additional result fields stored with the request
+        """
+        d_request = dict(d_request,finished=time.time(),error=error,**results)
+        self._write('failed' if error else 'done',d_request)
+        try:
+            os.remove(self._path('running',d_request['id']))
+        except FileNotFoundError:
+            pass
+
+
+    def requeue_stale(self, max_age: float=3600.0) -> int:
+        """
+        Return running requests claimed more than max_age seconds ago (e.g. by a consumer that died) to pending.
+
+        Parameters
+        ----------
+        max_age : float, optional
+            seconds, by default 3600
+
+        Returns
+        -------
+        int
+            number of requeued requests
+        """
+        n = 0
+        runningDir = os.path.join(self.spoolDir,'running')
+        for f in os.listdir(runningDir):
+            if not f.endswith('.json') or f.startswith('.'):
+                continue
+            try:
+                if time.time() - os.path.getmtime(os.path.join(runningDir,f)) > max_age:
+                    os.rename(os.path.join(runningDir,f),os.path.join(self.spoolDir,'pending',f))
+                    n += 1
+            except FileNotFoundError:
+                continue
+        return n
+
+
+    def purge(self, state: str='done', max_age: float=7*86400.0) -> int:
+        """
+        Delete finished requests older than max_age seconds.
+
+        Parameters
+        ----------
+        state : str, optional
+            done or failed, by default 'done'
+        max_age : float, optional
+            seconds, by default 7 days
+
+        Returns
+        -------
+        int
+            number of deleted request files
+        """
+        n = 0
+        stateDir = os.path.join(self.spoolDir,state)
+        for f in os.listdir(stateDir):
+            try:
+                if time.time() - os.path.getmtime(os.path.join(stateDir,f)) > max_age:
+                    os.remove(os.path.join(stateDir,f))
+                    n += 1
+            except FileNotFoundError:
+                continue
+        return n
+
+
+    def status(self) -> dict:
+        """
+        Number of requests in each state.
+
+        Returns
+        -------
+        dict
+            {state: count}
+        """
+        return {state: len([f for f in os.listdir(os.path.join(self.spoolDir,state)) if f.endswith('.json') and not f.startswith('.')]) for state in SPOOL_STATES}
+
+
+# ******************* SOCKET REQUESTS ********************
+def socket_request(socketPath: str, d_request: dict, timeout: float=None) -> dict:
+    """
+    Send one JSON request to a local service listening on a unix socket and wait for its JSON reply.
+    Requests and replies are single lines of JSON.
+
+    Parameters
+    ----------
+    socketPath : str
+        fullpath to the service's unix socket, e.g. BET_SOCKET
+    d_request : dict
+        JSON-serialisable request
+    timeout : float, optional
+        seconds to wait for the reply, by default None (wait indefinitely)
+
+    Returns
+    -------
+    dict
+        the service's reply
+
+    Raises
+    ------
+    OSError
+        no service is listening on socketPath, or the connection failed or timed out
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socketPath)
+        sock.sendall(json.dumps(d_request).encode() + b'\n')
+        buf = b''
+        while not buf.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    if not buf:
+        raise ConnectionError(f"no reply from {socketPath}")
+    return json.loads(buf)